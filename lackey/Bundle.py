@@ -0,0 +1,160 @@
+""" Precompiled image bundles
+
+A script bundle (e.g. ``foo.sikuli``) can hold hundreds of images, and decoding them
+all as Patterns are created adds seconds to start-up. Compiling the bundle packs every
+image, with the grayscale and pyramid forms the template matcher uses, into a single
+file (``images.lkbundle``) next to them::
+
+    python -m lackey.Bundle compile foo.sikuli
+
+At runtime, images in a directory with a compiled bundle are read from the
+memory-mapped file as zero-copy numpy views, so nothing is decoded. An image that was
+changed after the bundle was compiled is decoded from its file as usual. (Images are
+matched on modification time and size, or, if the bundle was copied elsewhere, on a
+checksum of the file.)
+
+The file starts with a magic number and the offset and length of a JSON index; the
+arrays follow, each aligned to ``_ALIGNMENT`` bytes, and the index comes last.
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+import numpy
+import cv2
+
+from .ImageCache import DecodedImage, PYRAMID_LEVELS
+from .SettingsDebug import Debug
+from .ImageResolver import IMAGE_EXTENSIONS
+
+BUNDLE_FILENAME = "images.lkbundle"
+
+_MAGIC = b"LKBUNDL1"
+_HEADER = struct.Struct("<8sQQ") # magic, index offset, index length
+_ALIGNMENT = 64
+
+class ImageBundle(object):
+    """ A compiled bundle, memory-mapped read-only """
+    def __init__(self, path):
+        self.path = path
+        self._data = numpy.memmap(path, dtype=numpy.uint8, mode="r")
+        magic, index_offset, index_length = _HEADER.unpack(self._data[:_HEADER.size].tobytes())
+        if magic != _MAGIC:
+            raise ValueError("Not a compiled image bundle: " + path)
+        self._index = json.loads(self._data[index_offset:index_offset + index_length].tobytes().decode("utf-8"))
+
+    def getNames(self):
+        """ Returns the names of the images in the bundle """
+        return list(self._index)
+    def get(self, name, path=None, info=None):
+        """ Returns a DecodedImage backed by the bundle for the image ``name``, or None if
+        it's not in the bundle. If the source file's ``path`` and ``os.stat()`` result
+        ``info`` are given, returns None unless it's the file the bundle was compiled
+        from. """
+        entry = self._index.get(name)
+        if entry is None:
+            return None
+        if info is not None and (entry["mtime"], entry["size"]) != (info.st_mtime_ns, info.st_size):
+            # Copied (new mtime) or changed since the bundle was compiled
+            if entry["size"] != info.st_size:
+                return None
+            with open(path, "rb") as image_file:
+                if zlib.crc32(image_file.read()) != entry["digest"][1]:
+                    return None
+        arrays = [self._view(*array) for array in entry["arrays"]]
+        return DecodedImage(tuple(entry["digest"]), arrays[0], pyramid=arrays[1:], mapped=True)
+
+    def _view(self, offset, shape):
+        return numpy.ndarray(shape, dtype=numpy.uint8, buffer=self._data, offset=offset)
+
+def compileBundle(directory):
+    """ Packs the images in ``directory`` into its bundle file (``BUNDLE_FILENAME``).
+    Returns the bundle's path and the number of images packed. """
+    output = os.path.join(directory, BUNDLE_FILENAME)
+    # Written to a temporary file and moved into place, so a bundle that's already
+    # memory-mapped (by this or another process) is never changed under it
+    temp_output = "{}.{}.tmp".format(output, os.getpid())
+    index = {}
+    with open(temp_output, "wb") as bundle:
+        bundle.write(_HEADER.pack(_MAGIC, 0, 0))
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            info = os.stat(path)
+            with open(path, "rb") as image_file:
+                data = image_file.read()
+            image = cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            decoded = DecodedImage((len(data), zlib.crc32(data)), image)
+            arrays = []
+            for array in [decoded.image] + decoded.pyramid(PYRAMID_LEVELS):
+                bundle.write(b"\0" * (-bundle.tell() % _ALIGNMENT))
+                arrays.append((bundle.tell(), list(array.shape)))
+                bundle.write(numpy.ascontiguousarray(array).tobytes())
+            index[name] = {
+                "mtime": info.st_mtime_ns,
+                "size": info.st_size,
+                "digest": list(decoded.digest),
+                "arrays": arrays,
+            }
+        index_data = json.dumps(index).encode("utf-8")
+        index_offset = bundle.tell()
+        bundle.write(index_data)
+        bundle.seek(0)
+        bundle.write(_HEADER.pack(_MAGIC, index_offset, len(index_data)))
+    os.replace(temp_output, output)
+    return (output, len(index))
+
+_bundles = {} # directory -> (bundle file's stat key, ImageBundle or None)
+_bundlesLock = threading.Lock()
+def getBundle(directory):
+    """ Returns the compiled ImageBundle in ``directory``, or None if there isn't one.
+    Bundles are kept open, and opened again if the file is replaced (e.g. recompiled). """
+    path = os.path.join(directory, BUNDLE_FILENAME)
+    try:
+        info = os.stat(path)
+        key = (info.st_mtime_ns, info.st_size, info.st_ino)
+    except OSError:
+        key = None
+    with _bundlesLock:
+        cached = _bundles.get(directory)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        bundle = None
+        if key is not None:
+            try:
+                bundle = ImageBundle(path)
+            except (ValueError, OSError) as e:
+                Debug.error("Could not open image bundle {}: {!r}".format(path, e))
+        _bundles[directory] = (key, bundle)
+        return bundle
+def findBundledImage(path, info):
+    """ Returns a DecodedImage for the image file at ``path`` (with ``os.stat()`` result
+    ``info``) from a compiled bundle in the same directory, or None """
+    bundle = getBundle(os.path.dirname(path))
+    if bundle is None:
+        return None
+    return bundle.get(os.path.basename(path), path, info)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m lackey.Bundle", description="Compiles image bundles")
+    commands = parser.add_subparsers(dest="command")
+    compile_parser = commands.add_parser("compile", help="pack a directory's images into " + BUNDLE_FILENAME)
+    compile_parser.add_argument("directory", help="e.g. foo.sikuli")
+    args = parser.parse_args(argv)
+    if args.command != "compile":
+        parser.print_help()
+        return 2
+    if not os.path.isdir(args.directory):
+        parser.error("not a directory: " + args.directory)
+    output, count = compileBundle(args.directory)
+    print("Packed {} images into {} ({} bytes)".format(count, output, os.path.getsize(output)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+""" Shares screen captures between many regions
+
+Capturing is one of the most expensive steps of a search. When several regions need
+a fresh bitmap at the same time, their rectangles are merged into as few captures as
+possible and each region gets a view into the shared capture.
+
+Bitmaps returned from here are views: they must be treated as read-only.
+"""
+
+def rectArea(rect):
+    """ Returns the area of an ``(x, y, w, h)`` rectangle """
+    return rect[2] * rect[3]
+
+def unionRect(a, b):
+    """ Returns the smallest ``(x, y, w, h)`` rectangle containing both ``a`` and ``b`` """
+    x = min(a[0], b[0])
+    y = min(a[1], b[1])
+    w = max(a[0] + a[2], b[0] + b[2]) - x
+    h = max(a[1] + a[3], b[1] + b[3]) - y
+    return (x, y, w, h)
+
+def mergeRects(rects, max_waste=0.5):
+    """ Groups ``rects`` into capture rectangles.
+
+    Two groups are merged when the rectangle around both is no more than ``max_waste``
+    larger than the area they already cover, so neighbouring and overlapping regions
+    share a capture while distant ones don't drag in the whole screen between them.
+
+    Returns a list of ``(capture_rect, [indices into rects])``.
+    """
+    groups = {}
+    for index, rect in enumerate(rects):
+        # Identical rectangles (e.g. many waits on one region) always share a capture
+        groups.setdefault(tuple(rect), []).append(index)
+    groups = [(rect, indices) for rect, indices in groups.items()]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(groups)):
+            for j in range(i + 1, len(groups)):
+                union = unionRect(groups[i][0], groups[j][0])
+                covered = rectArea(groups[i][0]) + rectArea(groups[j][0])
+                if rectArea(union) <= covered * (1 + max_waste):
+                    groups[i] = (union, groups[i][1] + groups[j][1])
+                    del groups[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return groups
+
+def cropRect(frame, frame_rect, rect):
+    """ Returns the part of ``frame`` (captured at ``frame_rect``) covered by ``rect`` """
+    x = rect[0] - frame_rect[0]
+    y = rect[1] - frame_rect[1]
+    return frame[y:y+rect[3], x:x+rect[2]]
+
+def captureRects(grab, rects):
+    """ Captures each of ``rects`` using as few calls to ``grab(x, y, w, h)`` as possible.
+
+    Returns a list of bitmaps in the same order as ``rects``.
+    """
+    bitmaps = [None] * len(rects)
+    for capture_rect, indices in mergeRects(rects):
+        frame = grab(*capture_rect)
+        for index in indices:
+            bitmaps[index] = cropRect(frame, capture_rect, rects[index])
+    return bitmaps
+
+class AsyncFrameBroker(object):
+    """ Batches capture requests from coroutines running on one event loop
+
+    Requests made during the same loop iteration (e.g. waits that wake up on the same
+    tick) are captured together, in the loop's default executor.
+    """
+    def __init__(self, grab, loop):
+        self._grab = grab
+        self._loop = loop
+        self._pending = []
+        self._captures = 0
+        self._requests = 0
+
+    async def capture(self, rect):
+        """ Returns a bitmap of ``rect`` (as ``(x, y, w, h)``) """
+        future = self._loop.create_future()
+        self._pending.append((tuple(rect), future))
+        self._requests += 1
+        if len(self._pending) == 1:
+            # Give every other coroutine woken on this tick a chance to join in
+            self._loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        rects = [rect for rect, _ in pending]
+        task = self._loop.run_in_executor(None, captureRects, self._countingGrab, rects)
+        def resolve(task):
+            for index, (_, future) in enumerate(pending):
+                if future.done():
+                    continue # Cancelled while waiting
+                if task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result()[index])
+        task.add_done_callback(resolve)
+    def _countingGrab(self, x, y, w, h):
+        self._captures += 1
+        return self._grab(x, y, w, h)
+
+    def getCaptureCount(self):
+        """ Returns the number of screen captures taken """
+        return self._captures
+    def getRequestCount(self):
+        """ Returns the number of bitmaps handed out """
+        return self._requests
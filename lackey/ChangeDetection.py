@@ -0,0 +1,140 @@
+""" Detects which parts of a region changed between two captures
+
+Used to skip (or narrow) template matching and OCR in wait loops when the screen is
+static, and for ``onChange()`` observers. Frames are first compared tile by tile; only
+the tiles that differ are compared pixel by pixel.
+"""
+import numpy
+import cv2
+
+from .SettingsDebug import Settings
+
+def _wordRows(bitmap, tile_bytes):
+    """ Returns ``bitmap`` as a 2D array of rows of machine words (the widest that
+    evenly divides both a row and a tile), and the number of words per tile row """
+    rows = numpy.ascontiguousarray(bitmap)
+    rows = rows.reshape(rows.shape[0], -1)
+    for dtype in (numpy.uint64, numpy.uint32, numpy.uint16):
+        size = numpy.dtype(dtype).itemsize
+        if rows.shape[1] % size == 0 and tile_bytes % size == 0:
+            return rows.view(dtype), tile_bytes // size
+    return rows, tile_bytes
+
+def tileChangeMask(previous, current, tile_size):
+    """ Compares two bitmaps of the same shape and returns a boolean array with one
+    entry per ``tile_size`` x ``tile_size`` tile, True where any pixel in the tile differs.
+
+    Pixels are compared a machine word at a time, so this never computes a per-pixel
+    difference; that only happens for dirty tiles, in ``tilePixelCounts()``.
+    """
+    channels = 1 if current.ndim == 2 else current.shape[2]
+    previous_rows, tile_words = _wordRows(previous, tile_size * channels)
+    current_rows, _ = _wordRows(current, tile_size * channels)
+    different = previous_rows != current_rows
+    bands = numpy.logical_or.reduceat(different, numpy.arange(0, different.shape[0], tile_size), axis=0)
+    return numpy.logical_or.reduceat(bands, numpy.arange(0, bands.shape[1], tile_words), axis=1)
+
+def changedPixelMask(previous, current):
+    """ Returns a uint8 array with one entry per pixel: 1 where any channel differs, else 0 """
+    different = cv2.compare(previous, current, cv2.CMP_NE) # 255 per differing channel
+    if different.ndim == 3 and different.shape[2] in (3, 4):
+        # Every channel has a non-zero weight, so this is non-zero if any channel is
+        # (and is much faster than different.max(axis=2))
+        code = cv2.COLOR_BGR2GRAY if different.shape[2] == 3 else cv2.COLOR_BGRA2GRAY
+        different = cv2.cvtColor(different, code)
+        if code == cv2.COLOR_BGRA2GRAY:
+            different = cv2.max(different, numpy.ascontiguousarray(cv2.compare(previous[:, :, 3], current[:, :, 3], cv2.CMP_NE)))
+    elif different.ndim == 3:
+        different = different.max(axis=2)
+    return cv2.threshold(different, 0, 1, cv2.THRESH_BINARY)[1]
+
+def tilePixelCounts(previous, current, rect, tile_size):
+    """ Compares the ``(x, y, w, h)`` rectangle ``rect`` (aligned to the tile grid) of two
+    bitmaps pixel by pixel, and returns the number of changed pixels in each of its tiles.
+    """
+    x, y, w, h = rect
+    sums = cv2.integral(changedPixelMask(previous[y:y+h, x:x+w], current[y:y+h, x:x+w]))
+    rows = numpy.minimum(numpy.arange(0, h + tile_size, tile_size), h)
+    cols = numpy.minimum(numpy.arange(0, w + tile_size, tile_size), w)
+    corners = sums[rows][:, cols]
+    return corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+
+def maskToRects(mask, tile_size, shape):
+    """ Converts a tile mask into a list of ``(x, y, w, h)`` rectangles (in pixels),
+    one per group of touching dirty tiles, clipped to ``shape`` (the bitmap shape).
+    """
+    if not mask.any():
+        return []
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(numpy.uint8), connectivity=8)
+    return [_tileRect(stats[label], tile_size, shape) for label in range(1, count)] # Label 0 is the unchanged background
+
+def findChanges(previous, current, tile_size):
+    """ Returns a list of ``((x, y, w, h), changed_pixels)``, one per group of touching
+    tiles that differ between ``previous`` and ``current``.
+
+    Only the groups' bounding rectangles are compared pixel by pixel, so the cost
+    follows the size of the change rather than the size of the bitmap.
+    """
+    mask = tileChangeMask(previous, current, tile_size)
+    if not mask.any():
+        return []
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(numpy.uint8), connectivity=8)
+    changes = []
+    for label in range(1, count):
+        col, row, cols, rows, _ = stats[label]
+        rect = _tileRect(stats[label], tile_size, current.shape)
+        counts = tilePixelCounts(previous, current, rect, tile_size)
+        # The bounding rectangle may take in tiles of a neighbouring group
+        changed = int(counts[labels[row:row+rows, col:col+cols] == label].sum())
+        if changed:
+            changes.append((rect, changed))
+    return changes
+
+def _tileRect(stats, tile_size, shape):
+    """ Converts connected component stats (in tiles) to a pixel rectangle clipped to ``shape`` """
+    col, row, cols, rows, _ = stats
+    x = col * tile_size
+    y = row * tile_size
+    w = min(cols * tile_size, shape[1] - x)
+    h = min(rows * tile_size, shape[0] - y)
+    return (int(x), int(y), int(w), int(h))
+
+def expandRect(rect, dx, dy, shape):
+    """ Grows ``rect`` by ``dx``/``dy`` pixels on each side, clipped to ``shape`` """
+    x, y, w, h = rect
+    x1 = max(0, x - dx)
+    y1 = max(0, y - dy)
+    x2 = min(shape[1], x + w + dx)
+    y2 = min(shape[0], y + h + dy)
+    return (x1, y1, x2 - x1, y2 - y1)
+
+def rectsIntersect(a, b):
+    """ Returns True if the ``(x, y, w, h)`` rectangles ``a`` and ``b`` overlap """
+    return (a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and
+            a[1] < b[1] + b[3] and b[1] < a[1] + a[3])
+
+class ChangeDetector(object):
+    """ Remembers the last capture of a region and reports what changed since then
+
+    ``update()`` returns None for the first frame (or if the region changed size),
+    meaning "everything is new"; otherwise it returns a (possibly empty) list of
+    changed rectangles in bitmap coordinates.
+    """
+    def __init__(self, tile_size=None):
+        self._tile_size = tile_size
+        self._last_frame = None
+
+    def getTileSize(self):
+        """ Returns the tile size in pixels (defaults to ``Settings.ChangeTileSize``) """
+        return self._tile_size or Settings.ChangeTileSize
+    def reset(self):
+        """ Forgets the last frame, so the next update reports a full change """
+        self._last_frame = None
+    def update(self, bitmap):
+        """ Compares ``bitmap`` with the previous capture and stores it for next time """
+        previous = self._last_frame
+        self._last_frame = bitmap
+        if previous is None or previous.shape != bitmap.shape:
+            return None
+        tile_size = self.getTileSize()
+        return maskToRects(tileChangeMask(previous, bitmap, tile_size), tile_size, bitmap.shape)
@@ -0,0 +1,201 @@
+""" Process-wide cache of decoded pattern images
+
+Every Pattern built from a filename (including the copies made by ``similar()``,
+``exact()`` and ``targetOffset()``) used to decode its PNG again. Decoded images are
+kept here instead, in a size-bounded LRU, and shared by every Pattern that uses them.
+The arrays are read-only, so sharing them is safe.
+
+Files are keyed on their resolved path, modification time and size, so an edited
+image is decoded again. Entries themselves are keyed on the file's content, so the
+same image under two names is only held once. The needle's grayscale and pyramid
+forms (used by the template matcher) are computed once and kept with it.
+"""
+import collections
+import os
+import threading
+import zlib
+import numpy
+import cv2
+
+from .SettingsDebug import Settings, Debug
+
+PYRAMID_LEVELS = 3 # Levels in the template matcher's search pyramid
+
+class DecodedImage(object):
+    """ A decoded image and its preprocessed forms
+
+    ``pyramid`` optionally provides the ``PYRAMID_LEVELS`` search pyramid up front
+    (smallest level first). ``mapped`` images are views of a memory-mapped file (see
+    ``Bundle``), and don't count towards the cache's size.
+    """
+    def __init__(self, digest, image, pyramid=None, mapped=False):
+        image.flags.writeable = False
+        self.digest = digest
+        self.image = image
+        self.mapped = mapped
+        self.nbytes = 0 if mapped else image.nbytes
+        self._gray = None
+        self._pyramids = {}
+        if pyramid:
+            self._gray = pyramid[-1]
+            self._pyramids[PYRAMID_LEVELS] = pyramid
+
+    def gray(self):
+        """ Returns the image in grayscale (read-only) """
+        if self._gray is None:
+            gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            gray.flags.writeable = False
+            self._gray = gray
+            self.nbytes += 0 if self.mapped else gray.nbytes
+        return self._gray
+    def pyramid(self, levels):
+        """ Returns the grayscale image's search pyramid (see
+        ``PyramidTemplateMatcher._build_pyramid()``), smallest level first """
+        if levels not in self._pyramids:
+            pyramid = [self.gray()]
+            for _ in range(levels-1):
+                if any(x < 20 for x in pyramid[-1].shape[:2]):
+                    break
+                pyramid.append(cv2.pyrDown(pyramid[-1]))
+            for level in pyramid[1:]:
+                level.flags.writeable = False
+                self.nbytes += 0 if self.mapped else level.nbytes
+            self._pyramids[levels] = list(reversed(pyramid))
+        return self._pyramids[levels]
+
+class DecodedImageCache(object):
+    """ Size-bounded LRU of decoded images
+
+    The limit is ``Settings.ImageCacheSize`` megabytes (0 disables the cache), counting
+    the decoded images and their preprocessed forms.
+
+    Sources added with ``addSource()`` are asked for an image before its file is
+    decoded.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = []
+        self._entries = collections.OrderedDict() # digest -> DecodedImage
+        self._files = {} # (path, mtime, size) -> digest
+        self._arrays = {} # id(image) -> DecodedImage
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def load(self, path):
+        """ Returns the decoded (BGR, read-only) image at ``path``, or None if it can't be
+        read """
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        file_key = (path, info.st_mtime_ns, info.st_size)
+        with self._lock:
+            digest = self._files.get(file_key)
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                self._hits += 1
+                return self._entries[digest].image
+            self._misses += 1
+        for source in self._sources:
+            entry = source(path, info)
+            if entry is not None:
+                break
+        else:
+            entry = self._decode(path)
+        if entry is None:
+            return None
+        if self._getMaxBytes() <= 0:
+            return entry.image
+        with self._lock:
+            if entry.digest not in self._entries:
+                self._entries[entry.digest] = entry
+                self._arrays[id(entry.image)] = entry
+                self._bytes += entry.nbytes
+            else:
+                # Already cached (decoded by another thread, or another file with the
+                # same content): counted once
+                entry = self._entries[entry.digest]
+            self._files[file_key] = entry.digest
+            self._evict()
+        return entry.image
+    def addSource(self, source):
+        """ Adds ``source(path, stat_result)``, which returns a DecodedImage for the image
+        file at ``path`` without decoding it (or None) """
+        self._sources.append(source)
+    def getPyramid(self, image, levels):
+        """ Returns the grayscale search pyramid of ``image`` (see ``DecodedImage.pyramid()``)
+        if it is an array returned by ``load()`` that is still cached, or None """
+        entry = self._arrays.get(id(image))
+        if entry is None or entry.image is not image:
+            return None
+        with self._lock:
+            before = entry.nbytes
+            pyramid = entry.pyramid(levels)
+            if entry.nbytes != before and self._entries.get(entry.digest) is entry:
+                self._bytes += entry.nbytes - before
+                self._evict(keep=entry.digest)
+        return pyramid
+    def clear(self):
+        """ Removes all cached images and resets the counters """
+        with self._lock:
+            self._entries.clear()
+            self._files.clear()
+            self._arrays.clear()
+            self._bytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def getStats(self):
+        """ Returns a dict with the number of cached ``images``, the ``bytes`` they use
+        (including preprocessed forms), ``max_bytes``, and the ``hits``, ``misses`` and
+        ``evictions`` counts """
+        with self._lock:
+            return {
+                "images": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self._getMaxBytes(),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    def _decode(self, path):
+        try:
+            with open(path, "rb") as image_file:
+                data = image_file.read()
+        except OSError:
+            return None
+        digest = (len(data), zlib.crc32(data))
+        with self._lock:
+            if digest in self._entries:
+                # Same content as an image that's already decoded
+                return self._entries[digest]
+        image = cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        return DecodedImage(digest, image)
+    def _getMaxBytes(self):
+        return int(Settings.ImageCacheSize * 1024 * 1024)
+    def _evict(self, keep=None):
+        max_bytes = self._getMaxBytes()
+        evicted = 0
+        while self._bytes > max_bytes and self._entries:
+            digest, entry = next(iter(self._entries.items()))
+            if digest == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(digest)
+                continue
+            del self._entries[digest]
+            self._arrays.pop(id(entry.image), None)
+            self._bytes -= entry.nbytes
+            evicted += 1
+        if evicted:
+            self._evictions += evicted
+            # Forget files whose image was evicted
+            self._files = {key: digest for key, digest in self._files.items() if digest in self._entries}
+            Debug.log(3, "Evicted {} decoded image(s); {} images, {} bytes cached".format(
+                evicted, len(self._entries), self._bytes))
+
+DecodedImages = DecodedImageCache()
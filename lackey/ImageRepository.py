@@ -0,0 +1,179 @@
+""" Image paths served over HTTP
+
+``addImagePath("http://...")`` registers a remote image repository. Images that aren't
+found locally are downloaded from it into a cache directory, and Patterns load them from
+there like any other file. Each repository keeps one ``requests.Session``, so downloads
+reuse pooled connections.
+
+A downloaded image is used as-is for ``Settings.HttpImageRevalidateInterval`` seconds.
+After that, the next lookup asks the server whether it changed (with ``If-None-Match``
+/ ``If-Modified-Since``), and only downloads it again if it did. If the server can't be
+reached, the cached copy is used. ``prefetch()`` downloads a list of images (or the
+repository's manifest) in parallel ahead of time.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, quote
+import requests
+from requests.adapters import HTTPAdapter
+
+from .SettingsDebug import Settings, Debug
+
+def isHttpPath(path):
+    """ Returns True if ``path`` is an http(s) URL """
+    return isinstance(path, str) and path.lower().startswith(("http://", "https://"))
+
+class HttpImageRepository(object):
+    """ A remote directory of images, cached on disk
+
+    Files are cached in a directory named after the repository's URL, under
+    ``Settings.HttpImageCachePath`` (a "lackey-images" directory in the system's temp
+    directory by default). Each cached file has a ``.meta`` file beside it with its
+    ``ETag`` and ``Last-Modified`` headers and when it was last checked.
+    """
+    def __init__(self, base_url):
+        if not base_url.endswith("/"):
+            base_url += "/"
+        self.base_url = base_url
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=Settings.HttpImageWorkers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._missing = {} # name -> time of the last 404
+        self._downloads = 0
+        self._revalidations = 0
+        self._hits = 0
+
+    def check(self):
+        """ Raises OSError if the repository's URL can't be reached """
+        try:
+            response = self._session.get(self.base_url, timeout=Settings.HttpImageTimeout)
+        except requests.RequestException as e:
+            raise OSError("Unable to connect to {}: {}".format(self.base_url, e))
+        if response.status_code >= 400:
+            raise OSError("Unable to connect to " + self.base_url)
+    def getCacheDirectory(self):
+        """ Returns the directory this repository's images are cached in """
+        root = Settings.HttpImageCachePath or os.path.join(tempfile.gettempdir(), "lackey-images")
+        return os.path.join(root, hashlib.sha1(self.base_url.encode("utf-8")).hexdigest()[:16])
+
+    def fetch(self, name):
+        """ Returns the local path of the image ``name``, downloading it (or checking that
+        the cached copy is current) if needed. Returns None if the server doesn't have
+        it. """
+        if os.path.isabs(name) or os.path.normpath(name).startswith(os.pardir):
+            return None # Outside the repository
+        path = os.path.join(self.getCacheDirectory(), name)
+        with self._fileLock(name):
+            meta = self._readMeta(path)
+            now = time.time()
+            if meta is not None and now - meta["checked"] < Settings.HttpImageRevalidateInterval:
+                self._hits += 1
+                return path
+            missing_since = self._missing.get(name)
+            if meta is None and missing_since is not None and now - missing_since < Settings.HttpImageRevalidateInterval:
+                return None
+            headers = {}
+            if meta is not None:
+                if meta.get("etag"):
+                    headers["If-None-Match"] = meta["etag"]
+                if meta.get("last_modified"):
+                    headers["If-Modified-Since"] = meta["last_modified"]
+            url = urljoin(self.base_url, quote(name.replace(os.path.sep, "/")))
+            try:
+                response = self._session.get(url, headers=headers, timeout=Settings.HttpImageTimeout)
+            except requests.RequestException as e:
+                if meta is not None:
+                    Debug.log(3, "Could not check {} ({!r}); using the cached copy".format(url, e))
+                    return path
+                Debug.error("Could not download {}: {!r}".format(url, e))
+                return None
+            if response.status_code == 304 and meta is not None:
+                self._revalidations += 1
+                meta["checked"] = now
+                self._writeMeta(path, meta)
+                return path
+            if response.status_code != 200:
+                if response.status_code == 404:
+                    self._missing[name] = now
+                if meta is not None and response.status_code != 404:
+                    return path
+                Debug.log(3, "Image {} not available ({})".format(url, response.status_code))
+                return None
+            self._missing.pop(name, None)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written to a temporary file first, so a reader never sees a partial image
+            temp_path = "{}.{}.tmp".format(path, threading.get_ident())
+            with open(temp_path, "wb") as image_file:
+                image_file.write(response.content)
+            os.replace(temp_path, path)
+            self._writeMeta(path, {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "checked": now,
+            })
+            self._downloads += 1
+            Debug.log(3, "Downloaded {} ({} bytes)".format(url, len(response.content)))
+            return path
+    def prefetch(self, names=None):
+        """ Downloads the images ``names`` (or, if None, every image listed in the
+        repository's ``Settings.HttpImageManifest``) in parallel, on
+        ``Settings.HttpImageWorkers`` threads. The manifest is a JSON list of names or a
+        text file with one name per line.
+
+        Returns the number of images available locally afterwards.
+        """
+        if names is None:
+            names = self._readManifest()
+        with ThreadPoolExecutor(max_workers=Settings.HttpImageWorkers) as pool:
+            paths = list(pool.map(self.fetch, names))
+        return sum(1 for path in paths if path is not None)
+
+    def getStats(self):
+        """ Returns a dict with the number of ``downloads``, ``revalidations`` (answered
+        with "not modified") and cache ``hits`` (used without asking the server) """
+        return {"downloads": self._downloads, "revalidations": self._revalidations, "hits": self._hits}
+
+    def _readManifest(self):
+        url = urljoin(self.base_url, Settings.HttpImageManifest)
+        response = self._session.get(url, timeout=Settings.HttpImageTimeout)
+        if response.status_code != 200:
+            raise OSError("Could not download image manifest {} ({})".format(url, response.status_code))
+        try:
+            return [str(name) for name in json.loads(response.text)]
+        except ValueError:
+            return [line.strip() for line in response.text.splitlines() if line.strip() and not line.startswith("#")]
+    def _fileLock(self, name):
+        with self._lock:
+            if name not in self._locks:
+                self._locks[name] = threading.Lock()
+            return self._locks[name]
+    @staticmethod
+    def _readMeta(path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path + ".meta", "r") as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+    @staticmethod
+    def _writeMeta(path, meta):
+        with open(path + ".meta", "w") as meta_file:
+            json.dump(meta, meta_file)
+
+_repositories = {}
+_repositoriesLock = threading.Lock()
+def getImageRepository(url):
+    """ Returns the HttpImageRepository for ``url`` (one per URL, created on first use) """
+    with _repositoriesLock:
+        if url not in _repositories:
+            _repositories[url] = HttpImageRepository(url)
+        return _repositories[url]
@@ -0,0 +1,161 @@
+""" Resolves image filenames (e.g. "button.png") against the image search path
+
+The search path is ``sys.path``, the bundle path, the working directory and
+``Settings.ImagePaths``, in that order. Checking each of those for every Pattern
+costs dozens of ``stat`` calls per find, so instead the directories are listed once
+into a filename-to-path index. The index is rebuilt when the search path changes
+(``addImagePath()``, ``setBundlePath()``) or when one of the directories is modified.
+
+Image files that aren't found locally are looked up in the http(s) image paths (see
+``ImageRepository``), in order, and downloaded into a local cache.
+"""
+import os
+import stat
+import sys
+import threading
+import time
+
+from .SettingsDebug import Settings, Debug
+from .ImageRepository import isHttpPath, getImageRepository
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff")
+
+# Filenames are matched without case where the file system usually ignores it
+_CASE_INSENSITIVE = sys.platform in ("win32", "darwin")
+
+def _nameKey(name):
+    return name.lower() if _CASE_INSENSITIVE else name
+
+def getImageSearchPath():
+    """ Returns the directories searched for images, in order """
+    return sys.path + [Settings.BundlePath, os.getcwd()] + Settings.ImagePaths
+
+class ImageResolver(object):
+    """ Index of the image files in the image search path
+
+    Filenames are looked up in a map built from one listing of each directory; the
+    first directory containing the file wins, as it did with a linear search. Names
+    with a directory part ("icons/ok.png") are checked against each directory
+    directly. Directory modification times are checked at most every
+    ``Settings.ImageIndexRecheckInterval`` seconds.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._search_path = None
+        self._index = {}
+        self._mtimes = {}
+        self._checked = 0
+        self._lookups = 0
+        self._found = 0
+        self._missing = 0
+        self._scans = 0
+        self._rebuilds = 0
+
+    def resolve(self, filename):
+        """ Returns the full path of ``filename`` in the image search path, or None if it
+        isn't found """
+        with self._lock:
+            self._lookups += 1
+            if os.path.isabs(filename):
+                path = filename if os.path.isfile(filename) else None
+            elif os.path.basename(filename) != filename:
+                path = self._scan(filename)
+            else:
+                self._refresh()
+                path = self._index.get(_nameKey(filename))
+        if path is None and not os.path.isabs(filename) and filename.lower().endswith(IMAGE_EXTENSIONS):
+            # Downloads happen outside the lock, so local lookups don't wait on them
+            for image_path in Settings.ImagePaths:
+                if isHttpPath(image_path):
+                    path = getImageRepository(image_path).fetch(filename)
+                    if path is not None:
+                        break
+        with self._lock:
+            if path is None:
+                self._missing += 1
+            else:
+                self._found += 1
+        return path
+    def invalidate(self):
+        """ Drops the index, so it's rebuilt on the next lookup """
+        with self._lock:
+            self._search_path = None
+
+    def getStats(self):
+        """ Returns a dict of lookup statistics: ``lookups``, ``found``, ``missing``,
+        ``scans`` (lookups of names with a directory part, which bypass the index),
+        ``rebuilds``, and the number of ``directories`` and ``files`` indexed """
+        with self._lock:
+            return {
+                "lookups": self._lookups,
+                "found": self._found,
+                "missing": self._missing,
+                "scans": self._scans,
+                "rebuilds": self._rebuilds,
+                "directories": len(self._mtimes),
+                "files": len(self._index),
+            }
+    def resetStats(self):
+        """ Resets the lookup counters """
+        with self._lock:
+            self._lookups = self._found = self._missing = self._scans = self._rebuilds = 0
+
+    def _scan(self, filename):
+        self._scans += 1
+        for image_path in getImageSearchPath():
+            full_path = os.path.join(image_path, filename)
+            if os.path.isfile(full_path):
+                return full_path
+        return None
+    def _refresh(self):
+        """ Rebuilds the index if the search path or any of its directories changed """
+        search_path = getImageSearchPath()
+        now = time.monotonic()
+        if search_path == self._search_path:
+            if now - self._checked < Settings.ImageIndexRecheckInterval:
+                return
+            self._checked = now
+            if all(self._mtime(directory) == mtime for directory, mtime in self._mtimes.items()):
+                return
+        self._build(search_path)
+        self._checked = now
+    def _build(self, search_path):
+        started = time.perf_counter()
+        index = {}
+        mtimes = {}
+        for directory in search_path:
+            if directory in mtimes:
+                continue
+            mtime = self._mtime(directory)
+            if mtime is None:
+                continue # Not a directory (a zip on sys.path, a URL, a missing path)
+            mtimes[directory] = mtime
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                # Earlier directories take precedence
+                index.setdefault(_nameKey(entry.name), os.path.join(directory, entry.name))
+        self._search_path = list(search_path)
+        self._index = index
+        self._mtimes = mtimes
+        self._rebuilds += 1
+        Debug.log(3, "Indexed {} files in {} image directories in {:.1f} ms".format(
+            len(index), len(mtimes), (time.perf_counter() - started) * 1000))
+    @staticmethod
+    def _mtime(directory):
+        try:
+            info = os.stat(directory)
+        except (OSError, TypeError, ValueError):
+            return None
+        if not stat.S_ISDIR(info.st_mode):
+            return None
+        return info.st_mtime_ns
+
+ImageIndex = ImageResolver()
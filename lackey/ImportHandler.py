@@ -1,6 +1,9 @@
 import sys
 import os.path
 
+from .SettingsDebug import Settings
+from .Prewarm import prewarm
+
 if sys.version_info[0] == 3:
     from importlib.abc import MetaPathFinder
     from importlib.util import spec_from_file_location
@@ -22,6 +25,9 @@ if sys.version_info[0] == 3:
             
                 # Found what we're looking for. Add to path.
                 sys.path.append(sikuli_path)
+                if Settings.PrewarmImports:
+                    # Load the script's images in the background while it starts
+                    prewarm(filename)
 
                 return spec_from_file_location(fullname, filename, loader=SourceFileLoader(fullname, filename),
                     submodule_search_locations=None)
@@ -0,0 +1,101 @@
+""" Caches search results for screen frames that have already been searched
+
+Repeatedly polling a static screen (``exists()``, ``wait()``, observers) captures the
+same pixels over and over. Results are keyed on a fingerprint of the captured frame,
+so a search for the same pattern on an unchanged frame returns immediately.
+"""
+import collections
+import threading
+import zlib
+import numpy
+
+from .SettingsDebug import Settings
+
+def frameFingerprint(bitmap):
+    """ Returns a hashable fingerprint of the pixels in ``bitmap``
+
+    Uses a CRC over the whole buffer rather than a downsampled hash: it is only a few
+    milliseconds even for a 4K frame, and it can't miss a small change (e.g. a caret or
+    a checkbox) the way an averaged thumbnail could.
+    """
+    bitmap = numpy.ascontiguousarray(bitmap)
+    return (bitmap.shape, zlib.crc32(bitmap))
+
+class MatchCache(object):
+    """ Size-bounded LRU cache of matcher results
+
+    Entries are keyed on ``(frame fingerprint, search key)``, where the search key
+    identifies the needle and the matcher settings (similarity, find-all, etc.).
+    A new frame produces a new fingerprint, so lookups on it simply miss and the
+    caller falls through to a real search.
+
+    If ``max_size`` is None, the size limit follows the ``size_setting`` attribute of
+    ``Settings`` (``Settings.MatchCacheSize`` by default).
+    """
+    def __init__(self, max_size=None, size_setting="MatchCacheSize"):
+        self._max_size = max_size
+        self._size_setting = size_setting
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, fingerprint, key):
+        """ Returns a tuple of ``(found, result)`` for the given frame and search key """
+        if self.getMaxSize() <= 0:
+            return (False, None)
+        with self._lock:
+            entry_key = (fingerprint, key)
+            if entry_key in self._entries:
+                self._entries.move_to_end(entry_key)
+                self._hits += 1
+                return (True, self._entries[entry_key])
+            self._misses += 1
+            return (False, None)
+    def put(self, fingerprint, key, result):
+        """ Stores ``result`` for the given frame and search key, evicting the least
+        recently used entry if the cache is full """
+        max_size = self.getMaxSize()
+        if max_size <= 0:
+            return
+        with self._lock:
+            self._entries[(fingerprint, key)] = result
+            self._entries.move_to_end((fingerprint, key))
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+    def clear(self):
+        """ Removes all cached results and resets the hit/miss counters """
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def setMaxSize(self, max_size):
+        """ Sets the maximum number of cached results (0 disables the cache) """
+        with self._lock:
+            self._max_size = int(max_size)
+            while len(self._entries) > max(self._max_size, 0):
+                self._entries.popitem(last=False)
+    def getMaxSize(self):
+        """ Returns the maximum number of cached results """
+        if self._max_size is None:
+            return getattr(Settings, self._size_setting)
+        return self._max_size
+    def getSize(self):
+        """ Returns the number of cached results """
+        return len(self._entries)
+    def getHits(self):
+        """ Returns the number of lookups answered from the cache """
+        return self._hits
+    def getMisses(self):
+        """ Returns the number of lookups that required a new search """
+        return self._misses
+    def getHitRate(self):
+        """ Returns the fraction of lookups answered from the cache (0.0 - 1.0) """
+        total = self._hits + self._misses
+        if total == 0:
+            return 0.0
+        return self._hits / float(total)
+
+FindCache = MatchCache()
+OcrCache = MatchCache(size_setting="OcrCacheSize")
@@ -0,0 +1,122 @@
+""" Runs the background observers of many regions from a single thread
+
+Instead of one capture loop per observed region, every region observed in the
+background is registered here. On each tick, the regions that are due are captured
+together (overlapping and neighbouring rectangles share one capture, see
+``Capture.mergeRects``) and their events are checked in priority order.
+"""
+import math
+import threading
+import time
+
+from .Capture import captureRects
+from .SettingsDebug import Debug
+
+class _Entry(object):
+    def __init__(self, region, deadline):
+        self.region = region
+        self.deadline = deadline
+        self.next_due = 0
+
+class ObserverScheduler(object):
+    """ Schedules background observers on a shared thread
+
+    ``grab(x, y, w, h)`` captures a rectangle of the screen; ``dispatch(handler, event)``
+    is passed on to ``Observer.check_events`` to call event handlers.
+
+    Each region is checked at its own ``getObserveScanRate()``. Due times are aligned
+    to multiples of the scan interval, so regions with the same scan rate come due on
+    the same tick and share captures. When several regions are due at once, those with
+    a higher ``getObservePriority()`` are checked first.
+    """
+    def __init__(self, grab, dispatch=None):
+        self._grab = grab
+        self._dispatch = dispatch
+        self._entries = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._captures = 0
+        self._ticks = 0
+
+    def register(self, region, seconds=None):
+        """ Starts observing ``region`` for ``seconds`` (or until unregistered) """
+        deadline = None if seconds is None else time.monotonic() + seconds
+        with self._condition:
+            region._observer.isRunning = True
+            self._entries[id(region)] = _Entry(region, deadline)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="lackey-observer")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+    def unregister(self, region):
+        """ Stops observing ``region`` (if it is registered) """
+        with self._condition:
+            entry = self._entries.pop(id(region), None)
+            if entry is not None:
+                region._observer.isRunning = False
+            self._condition.notify()
+    def isRegistered(self, region):
+        """ Returns True if ``region`` is being observed by this scheduler """
+        with self._condition:
+            return id(region) in self._entries
+
+    def getCaptureCount(self):
+        """ Returns the number of screen captures taken """
+        return self._captures
+    def getTickCount(self):
+        """ Returns the number of ticks on which at least one region was checked """
+        return self._ticks
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due = self._collectDue(time.monotonic())
+                while not due:
+                    if not self._entries:
+                        # Nothing left to observe; a new registration restarts the thread
+                        self._thread = None
+                        return
+                    next_due = min(entry.next_due for entry in self._entries.values())
+                    self._condition.wait(max(0, next_due - time.monotonic()))
+                    due = self._collectDue(time.monotonic())
+            self._tick(due)
+    def _collectDue(self, now):
+        """ Drops finished observers and returns the entries due at ``now`` """
+        due = []
+        for key, entry in list(self._entries.items()):
+            observer = entry.region._observer
+            if observer.isStopped or (entry.deadline is not None and now >= entry.deadline):
+                del self._entries[key]
+                observer.isRunning = False
+            elif now >= entry.next_due:
+                interval = 1.0 / entry.region.getObserveScanRate()
+                entry.next_due = (math.floor(now / interval) + 1) * interval
+                if entry.deadline is not None:
+                    entry.next_due = min(entry.next_due, entry.deadline)
+                due.append(entry)
+        due.sort(key=lambda entry: entry.region.getObservePriority(), reverse=True)
+        return due
+    def _tick(self, due):
+        started = time.monotonic()
+        regions = []
+        rects = []
+        for entry in due:
+            r = entry.region.clipRegionToScreen()
+            if r is None:
+                Debug.error("Observed region outside all visible screens: {}".format(entry.region))
+                continue
+            regions.append(entry.region)
+            rects.append(r.getTuple())
+        bitmaps = captureRects(self._countingGrab, rects)
+        for region, bitmap in zip(regions, bitmaps):
+            try:
+                region._observer.check_events(bitmap, dispatch=self._dispatch)
+            except Exception as e:
+                Debug.error("Observer failed for {}: {!r}".format(region, e))
+        self._ticks += 1
+        Debug.log(3, "Observer tick: {} regions in {:.1f} ms".format(
+            len(regions), (time.monotonic() - started) * 1000))
+    def _countingGrab(self, x, y, w, h):
+        self._captures += 1
+        return self._grab(x, y, w, h)
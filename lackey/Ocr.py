@@ -1,8 +1,439 @@
 import pytesseract
-import csv
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import numpy
+import time
+import os
 import re
+import cv2
+from PIL import Image
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
 
-from .SettingsDebug import Debug
+from .SettingsDebug import Settings, Debug
+from .MatchCache import OcrCache, frameFingerprint
+from .TextDetection import findTextRegions, mergeBoxes
+from .ChangeDetection import ChangeDetector
+
+# Text-shape hints: what we know about the text in an image, as Tesseract settings.
+# "psm" is the page segmentation mode; "whitelist" limits the characters recognized.
+OCR_HINTS = {
+    "block": {"psm": 6}, # A single uniform block of text
+    "line": {"psm": 7}, # A single line of text
+    "word": {"psm": 8}, # A single word
+    "sparse": {"psm": 11}, # Scattered text, in no particular order
+    "digits": {"whitelist": "0123456789.,-"},
+}
+
+def getHintSettings(hint):
+    """ Returns ``(psm, whitelist)`` for ``hint``: None, a hint name from ``OCR_HINTS``,
+    or a tuple of hint names (e.g. ``("line", "digits")``). Unset values are None. """
+    if hint is None:
+        return (None, None)
+    names = (hint,) if isinstance(hint, str) else tuple(hint)
+    psm = whitelist = None
+    for name in names:
+        if name not in OCR_HINTS:
+            raise ValueError("Unknown OCR hint '{}' (expected one of: {})".format(name, ", ".join(OCR_HINTS)))
+        psm = OCR_HINTS[name].get("psm", psm)
+        whitelist = OCR_HINTS[name].get("whitelist", whitelist)
+    return (psm, whitelist)
+
+_TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+class PytesseractBackend(object):
+    """ Runs the ``tesseract`` executable (through pytesseract) for each call """
+    name = "pytesseract"
+    def _config(self, psm, whitelist):
+        config = []
+        if Settings.OcrDataPath:
+            config.append('--tessdata-dir "{}"'.format(Settings.OcrDataPath))
+        if psm is not None:
+            config.append("--psm {}".format(psm))
+        if whitelist:
+            config.append("-c tessedit_char_whitelist={}".format(whitelist))
+        return " ".join(config)
+    def image_to_string(self, image, psm=None, whitelist=None):
+        return pytesseract.image_to_string(image, lang=Settings.OcrLanguage, config=self._config(psm, whitelist))
+    def image_to_data(self, image, psm=None, whitelist=None):
+        """ Returns Tesseract's TSV output (with a header row) """
+        return pytesseract.image_to_data(image, lang=Settings.OcrLanguage, config=self._config(psm, whitelist))
+
+class TesserocrBackend(object):
+    """ Keeps an initialized Tesseract engine in memory (through tesserocr)
+
+    Loading the language model is most of the cost of an OCR call, so each thread
+    gets its own engine, created on first use and reused after that (an engine can't
+    be shared between threads).
+    """
+    name = "tesserocr"
+    def __init__(self):
+        self._local = threading.local()
+    def _engine(self):
+        key = (Settings.OcrDataPath, Settings.OcrLanguage)
+        if getattr(self._local, "key", None) != key:
+            if getattr(self._local, "engine", None) is not None:
+                # Frees the replaced engine's language model now, not when it's collected
+                self._local.engine.End()
+                self._local.engine = None
+            if Settings.OcrDataPath:
+                engine = tesserocr.PyTessBaseAPI(path=Settings.OcrDataPath, lang=Settings.OcrLanguage)
+            else:
+                engine = tesserocr.PyTessBaseAPI(lang=Settings.OcrLanguage)
+            self._local.engine = engine
+            self._local.key = key
+        return self._local.engine
+    def _set_image(self, image, psm, whitelist):
+        if not isinstance(image, Image.Image):
+            if image.ndim == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB if image.shape[2] == 3 else cv2.COLOR_BGRA2RGB)
+            image = Image.fromarray(image)
+        engine = self._engine()
+        # The engine is reused, so hints are set (or reset) on every call
+        engine.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+        engine.SetVariable("tessedit_char_whitelist", whitelist or "")
+        engine.SetImage(image)
+        return engine
+    def image_to_string(self, image, psm=None, whitelist=None):
+        return self._set_image(image, psm, whitelist).GetUTF8Text()
+    def image_to_data(self, image, psm=None, whitelist=None):
+        """ Returns Tesseract's TSV output (with a header row, like pytesseract) """
+        return _TSV_HEADER + self._set_image(image, psm, whitelist).GetTSVText(0)
+
+_backends = {
+    "pytesseract": PytesseractBackend(),
+    "tesserocr": TesserocrBackend() if tesserocr is not None else None
+}
+def getOcrBackend():
+    """ Returns the OCR backend selected by ``Settings.OcrBackend``.
+
+    Falls back to pytesseract if the selected backend isn't available.
+    """
+    backend = _backends.get(Settings.OcrBackend)
+    if backend is None:
+        if Settings.OcrBackend not in _backends:
+            raise ValueError("Unknown OCR backend '{}' (expected one of: {})".format(Settings.OcrBackend, ", ".join(_backends)))
+        Debug.log(3, "OCR backend '{}' is not installed; using pytesseract".format(Settings.OcrBackend))
+        backend = _backends["pytesseract"]
+    return backend
+
+class OcrWord(object):
+    """ A word recognized by Tesseract, with its bounding box (``left``, ``top``,
+    ``width``, ``height``) and confidence (0-100) """
+    def __init__(self, text, left, top, width, height, conf, line_key):
+        self.text = text
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.conf = conf
+        self.line_key = line_key
+
+class OcrResult(object):
+    """ Everything Tesseract found in one image: words with their boxes and confidences,
+    grouped into lines and blocks.
+
+    Built once per frame (see ``OCR.read()``), then used to answer any number of text
+    queries without running OCR again. Word boxes and confidences are stored as numpy
+    columns; the text of each line is stored once, in a single buffer (lines separated
+    by newlines), with the offsets of each word in it. A regex search runs once per
+    line, and each match is mapped back to the words it covers by offset.
+
+    If the image was preprocessed (see ``OcrProfile``), ``scale`` and ``offset`` map
+    word boxes back to the original image: ``original = processed / scale + offset``.
+    ``timings`` holds the time spent in each stage, in milliseconds.
+    """
+    def __init__(self, tsv, scale=1, offset=(0, 0), timings=None):
+        self.timings = timings or {}
+        texts = []
+        boxes = []
+        confs = []
+        line_keys = []
+        for row in tsv.split("\n")[1:]: # Skips the header
+            fields = row.split("\t", 11)
+            # Only words (level 5) have text; the other levels are pages, blocks, etc.
+            if len(fields) < 12 or fields[0] != "5" or not fields[11].strip():
+                continue
+            texts.append(fields[11])
+            boxes.append((int(fields[6]), int(fields[7]), int(fields[8]), int(fields[9])))
+            confs.append(float(fields[10]))
+            line_keys.append((int(fields[1]), int(fields[2]), int(fields[3]), int(fields[4])))
+        self._texts = texts
+        self._boxes = numpy.array(boxes, dtype=numpy.int32).reshape(-1, 4) # left, top, width, height
+        if scale != 1 or offset != (0, 0):
+            corners = self._boxes.copy()
+            corners[:, 2:] += corners[:, :2] # To (x1, y1, x2, y2)
+            corners[:, :2] //= scale
+            corners[:, 2:] = -(-corners[:, 2:] // scale) # Ceiling, so boxes don't shrink
+            corners[:, 0::2] += offset[0]
+            corners[:, 1::2] += offset[1]
+            corners[:, 2:] -= corners[:, :2]
+            self._boxes = corners
+        self._confs = numpy.array(confs, dtype=numpy.float32)
+        self._line_keys = line_keys # Words of a line are contiguous (Tesseract's order)
+        self._indexes = {} # Confidence threshold -> _WordIndex
+
+    @classmethod
+    def combine(cls, results, offsets, timings=None):
+        """ Merges the results of OCR'ing several parts of an image into one result.
+
+        ``offsets`` are the ``(x, y)`` positions of the parts in the image. The parts'
+        lines are merged back into reading order by position: pieces of a line that
+        ended up in different parts are joined when they sit side by side on the same
+        row, and lines are grouped into blocks by the vertical gaps between them.
+        """
+        combined = cls("", timings=timings)
+        if not results:
+            return combined
+        texts = [text for result in results for text in result._texts]
+        boxes = numpy.concatenate(
+            [result._boxes + (offset[0], offset[1], 0, 0) for result, offset in zip(results, offsets)]
+        ).astype(numpy.int32).reshape(-1, 4)
+        confs = numpy.concatenate([result._confs for result in results]).astype(numpy.float32)
+        pieces = {}
+        part_keys = ((part,) + key for part, result in enumerate(results) for key in result._line_keys)
+        for word, key in enumerate(part_keys):
+            pieces.setdefault(key, []).append(word)
+        order = []
+        line_keys = []
+        for key, words in _joinLines(boxes, list(pieces.values())):
+            order.extend(words)
+            line_keys.extend([key] * len(words))
+        order = numpy.array(order, dtype=numpy.int64)
+        combined._setColumns([texts[word] for word in order], boxes[order], confs[order], line_keys)
+        return combined
+
+    def rereadAreas(self, changes, margin=4):
+        """ Returns the areas that need to be OCR'd again after the ``(x, y, w, h)``
+        rectangles in ``changes`` changed: each change, plus every line of text it
+        touches (so a changed word is re-read with the rest of its line) """
+        areas = []
+        for rect in changes:
+            x1, y1 = rect[0] - margin, rect[1] - margin
+            x2, y2 = rect[0] + rect[2] + margin, rect[1] + rect[3] + margin
+            for words in self._lineWords(self._touching(rect)):
+                boxes = self._boxes[words]
+                x1 = min(x1, int(boxes[:, 0].min()))
+                y1 = min(y1, int(boxes[:, 1].min()))
+                x2 = max(x2, int((boxes[:, 0] + boxes[:, 2]).max()))
+                y2 = max(y2, int((boxes[:, 1] + boxes[:, 3]).max()))
+            areas.append((x1, y1, x2 - x1, y2 - y1))
+        return areas
+    def splice(self, areas, results, generation=0):
+        """ Returns a new OcrResult with the words inside ``areas`` replaced by
+        ``results`` (the OCR results of those areas, in area coordinates).
+
+        Lines are put back in reading order (top to bottom, then left to right).
+        """
+        keep = numpy.ones(len(self._texts), dtype=bool)
+        for area in areas:
+            keep[self._touching(area)] = False
+        texts = [text for text, kept in zip(self._texts, keep) if kept]
+        line_keys = [key for key, kept in zip(self._line_keys, keep) if kept]
+        boxes = [self._boxes[keep]]
+        confs = [self._confs[keep]]
+        for part, (area, result) in enumerate(zip(areas, results)):
+            texts.extend(result._texts)
+            # Lines from each re-read area are kept apart from each other and from the rest
+            line_keys.extend((("reread", generation, part),) + key[1:] for key in result._line_keys)
+            boxes.append(result._boxes + (area[0], area[1], 0, 0))
+            confs.append(result._confs)
+        spliced = OcrResult("", timings=self.timings)
+        spliced._setColumns(
+            texts,
+            numpy.concatenate(boxes).astype(numpy.int32).reshape(-1, 4),
+            numpy.concatenate(confs).astype(numpy.float32),
+            line_keys)
+        return spliced
+
+    def _setColumns(self, texts, boxes, confs, line_keys):
+        """ Replaces the words, putting lines in reading order """
+        lines = {}
+        for word, key in enumerate(line_keys):
+            lines.setdefault(key, []).append(word)
+        order = sorted(lines.values(), key=lambda words: (int(boxes[words, 1].min()), int(boxes[words, 0].min())))
+        order = numpy.array([word for words in order for word in words], dtype=numpy.int64)
+        self._texts = [texts[word] for word in order]
+        self._line_keys = [line_keys[word] for word in order]
+        self._boxes = boxes[order].reshape(-1, 4)
+        self._confs = confs[order]
+        self._indexes = {}
+    def _touching(self, rect):
+        """ Returns the indices of the words whose boxes overlap ``rect`` """
+        boxes = self._boxes
+        return numpy.flatnonzero(
+            (boxes[:, 0] < rect[0] + rect[2]) & (rect[0] < boxes[:, 0] + boxes[:, 2]) &
+            (boxes[:, 1] < rect[1] + rect[3]) & (rect[1] < boxes[:, 1] + boxes[:, 3]))
+    def _lineWords(self, words):
+        """ Returns the word indices of each line containing any of ``words`` """
+        keys = set(self._line_keys[word] for word in words)
+        return [
+            numpy.array([word for word, key in enumerate(self._line_keys) if key == line_key])
+            for line_key in keys]
+
+    def getTimings(self):
+        """ Returns the time spent in each preprocessing stage and in OCR (in ms) """
+        return dict(self.timings)
+    def getWords(self):
+        """ Returns the recognized words as a list of OcrWords """
+        return [
+            OcrWord(text, *(int(value) for value in box), conf=float(conf), line_key=line_key)
+            for text, box, conf, line_key in zip(self._texts, self._boxes, self._confs, self._line_keys)]
+    def text(self, confidence=0):
+        """ Returns the text, one line per line and a blank line between blocks """
+        return self._getIndex(confidence).text()
+    def find_word(self, text, confidence=0):
+        """ Returns the first word matching the regex ``text`` as ``(bbox, confidence)`` """
+        return self._getIndex(confidence).find_word(text)
+    def find_line(self, text, confidence=0):
+        """ Returns the first line matching the regex ``text`` as ``(bbox, confidence)`` """
+        return self._getIndex(confidence).find_line(text)
+    def find_all(self, text, confidence=0):
+        """ Returns the run of words covered by each match of the regex ``text`` (matches
+        don't span lines) as a list of ``(bbox, confidence)`` """
+        return self._getIndex(confidence).find_all(text)
+
+    def _getIndex(self, confidence):
+        """ Returns the word index for words with a confidence of at least ``confidence``
+        (0-1). Other words are left out of the line text entirely, so they can't take
+        part in (or break up) a match. Built once per threshold. """
+        if confidence not in self._indexes:
+            # Compared in float32, so a threshold of e.g. 0.3 includes a confidence of 30
+            words = numpy.flatnonzero(self._confs >= numpy.float32(confidence * 100))
+            self._indexes[confidence] = _WordIndex(self, words)
+        return self._indexes[confidence]
+
+def _joinLines(boxes, pieces):
+    """ Joins line ``pieces`` (lists of word indices into ``boxes``) that are side by
+    side on the same row. Returns each line's ``(page, block, paragraph, line)`` key
+    and its words, left to right, in reading order. """
+    def bounds(words):
+        x1, y1 = boxes[words, 0].min(), boxes[words, 1].min()
+        return [int(x1), int(y1), int((boxes[words, 0] + boxes[words, 2]).max()), int((boxes[words, 1] + boxes[words, 3]).max())]
+    lines = [] # [x1, y1, x2, y2, words]
+    for piece in sorted(pieces, key=lambda words: int(boxes[words, 0].min())):
+        x1, y1, x2, y2 = bounds(piece)
+        for line in lines:
+            height = min(y2 - y1, line[3] - line[1])
+            overlap = min(y2, line[3]) - max(y1, line[1])
+            # On the same row (overlapping by half a line) and close behind it
+            if overlap * 2 >= height and -height <= x1 - line[2] <= 2 * max(y2 - y1, line[3] - line[1]):
+                line[:4] = [min(x1, line[0]), min(y1, line[1]), max(x2, line[2]), max(y2, line[3])]
+                line[4] = line[4] + piece
+                break
+        else:
+            lines.append([x1, y1, x2, y2, list(piece)])
+    lines.sort(key=lambda line: (line[1], line[0]))
+    joined = []
+    block = 0
+    block_bottom = None
+    for number, (x1, y1, x2, y2, words) in enumerate(lines):
+        # A gap of more than a line's height starts a new block
+        if block_bottom is not None and y1 - block_bottom > y2 - y1:
+            block += 1
+            block_bottom = None
+        block_bottom = y2 if block_bottom is None else max(block_bottom, y2)
+        words = sorted(words, key=lambda word: int(boxes[word, 0]))
+        joined.append(((0, block, 0, number), words))
+    return joined
+
+class _WordIndex(object):
+    """ Line text buffer and word offsets for a subset of an OcrResult's words """
+    def __init__(self, result, words):
+        self._result = result
+        self._words = words # Indices into the result's columns
+        line_texts = []
+        self._line_keys = []
+        line_starts = [] # Offset of each line in the buffer, and its first word in self._words
+        first_words = []
+        word_starts = numpy.zeros(len(words), dtype=numpy.int64)
+        offset = 0
+        for position, word in enumerate(words):
+            line_key = result._line_keys[word]
+            if not self._line_keys or line_key != self._line_keys[-1]:
+                if self._line_keys:
+                    offset += 1 # The newline between lines
+                self._line_keys.append(line_key)
+                line_starts.append(offset)
+                first_words.append(position)
+                line_texts.append([])
+            elif line_texts[-1]:
+                offset += 1 # The space between words
+            word_starts[position] = offset
+            line_texts[-1].append(result._texts[word])
+            offset += len(result._texts[word])
+        self._buffer = "\n".join(" ".join(line) for line in line_texts)
+        self._word_starts = word_starts
+        self._word_ends = word_starts + numpy.array([len(result._texts[word]) for word in words], dtype=numpy.int64)
+        self._line_starts = line_starts
+        self._line_ends = [start + len(" ".join(line)) for start, line in zip(line_starts, line_texts)]
+        self._first_words = first_words + [len(words)]
+
+    def text(self):
+        text = ""
+        for line, line_key in enumerate(self._line_keys):
+            if line > 0:
+                text += "\n\n" if line_key[:2] != self._line_keys[line - 1][:2] else "\n"
+            text += self._buffer[self._line_starts[line]:self._line_ends[line]]
+        return text
+    def find_word(self, text):
+        pattern = _compile(text)
+        for position, word in enumerate(self._words):
+            if pattern.search(self._result._texts[word]):
+                return self._match(position, position + 1)
+        return None
+    def find_line(self, text):
+        pattern = _compile(text)
+        for line in range(len(self._line_keys)):
+            if pattern.search(self._buffer, self._line_starts[line], self._line_ends[line]):
+                return self._match(self._first_words[line], self._first_words[line + 1])
+        return None
+    def find_all(self, text):
+        pattern = _compile(text)
+        matches = []
+        for line in range(len(self._line_keys)):
+            for found in pattern.finditer(self._buffer, self._line_starts[line], self._line_ends[line]):
+                if found.end() == found.start():
+                    continue # Empty matches don't cover any words
+                # Words overlapping the match: the first one ending after its start, up to
+                # the last one starting before its end
+                first = numpy.searchsorted(self._word_ends, found.start(), side="right")
+                last = numpy.searchsorted(self._word_starts, found.end(), side="left")
+                if first >= last:
+                    continue # Only covers the spaces between words
+                matches.append(self._match(first, last))
+        return matches
+
+    def _match(self, first, last):
+        """ Returns ``(bbox, confidence)`` for the words from ``first`` up to (not
+        including) ``last`` """
+        if last - first == 1:
+            # Most matches are a single word
+            word = self._words[first]
+            left, top, width, height = self._result._boxes[word].tolist()
+            return ((left, top, width, height), float(self._result._confs[word]) / 100)
+        words = self._words[first:last]
+        boxes = self._result._boxes[words]
+        x1 = int(boxes[:, 0].min())
+        y1 = int(boxes[:, 1].min())
+        x2 = int((boxes[:, 0] + boxes[:, 2]).max())
+        y2 = int((boxes[:, 1] + boxes[:, 3]).max())
+        confidence = float(self._result._confs[words].mean()) / 100
+        return ((x1, y1, x2 - x1, y2 - y1), confidence)
+
+def _compile(text):
+    """ Compiles ``text`` (a regex) so that ``^`` and ``$`` match at the start and end of
+    each line of the index buffer """
+    if hasattr(text, "finditer"):
+        return text # Already compiled
+    return re.compile(text, re.MULTILINE)
+
+def _minConfidence(confidence):
+    """ Returns the word confidence (0-1) a text search uses: ``confidence``, or
+    ``Settings.OcrMinConfidence`` if it's None """
+    return Settings.OcrMinConfidence if confidence is None else confidence
 
 class OCR():
     def start(self):
@@ -10,115 +441,198 @@ class OCR():
         Returns the object itself (a hack for Sikuli compatibility)
         """
         return self # Dummy method for Sikuli compatibility
-    def image_to_text(self, image):
+    def read(self, image, profile=None, hint=None):
         """
-        Returns the text found in the given image.
+        Runs OCR on `image` and returns an OcrResult.
+
+        `profile` is the OcrProfile used to preprocess the image (defaults to
+        `Settings.OcrProfile`; None means the image is passed to Tesseract as is).
+
+        `hint` describes the text, so Tesseract can skip work: "line", "word",
+        "block", "sparse" and/or "digits" (see `OCR_HINTS`). For example, with
+        `hint="line"` Tesseract doesn't run page layout analysis.
+
+        Results are cached per frame: reading the same pixels again (for example,
+        several text searches in an unchanged region) doesn't run OCR again.
         """
-        return pytesseract.image_to_string(image)
-    def find_word(self, image, text, confidence=0.6):
+        if profile is None:
+            profile = Settings.OcrProfile
+        hint_settings = getHintSettings(hint)
+        if not isinstance(image, numpy.ndarray):
+            return OcrResult(getOcrBackend().image_to_data(image, *hint_settings))
+        image = numpy.ascontiguousarray(image) # Slices of a capture, e.g. raster cells
+        fingerprint = frameFingerprint(image)
+        key = (Settings.OcrBackend, Settings.OcrLanguage, profile.getKey() if profile else None, hint_settings)
+        found, result = OcrCache.get(fingerprint, key)
+        if not found:
+            min_area = Settings.OcrDetectionMinArea
+            # A hint describes the whole image, so it's read as is rather than split up
+            if min_area is not None and image.shape[0] * image.shape[1] >= min_area and hint is None:
+                result = self._runDetected(image, profile)
+            else:
+                result = self._run(image, profile, hint)
+            OcrCache.put(fingerprint, key, result)
+        return result
+    def _runDetected(self, image, profile):
+        """ OCRs only the text-like areas of `image`, in parallel, and combines the results """
+        started = time.perf_counter()
+        boxes = findTextRegions(image)
+        detection_time = (time.perf_counter() - started) * 1000
+        if not boxes:
+            # Nothing looked like text, but detection can miss some (sparse, very large,
+            # low-contrast), so the whole image is read rather than returning nothing
+            Debug.log(3, "No text areas detected; reading the whole image")
+            return self._run(image, profile)
+        results = self._runAreas(image, boxes, profile)
+        timings = {"detect": detection_time, "ocr": (time.perf_counter() - started) * 1000 - detection_time}
+        Debug.log(3, "OCR on {} detected text areas: detection {:.1f} ms, OCR {:.1f} ms".format(
+            len(boxes), timings["detect"], timings["ocr"]))
+        return OcrResult.combine(results, [(x, y) for x, y, _, _ in boxes], timings)
+    def _runAreas(self, image, areas, profile, hint=None):
+        """ OCRs each ``(x, y, w, h)`` area of `image` in parallel (uncached) """
+        crops = [image[y:y+h, x:x+w] for x, y, w, h in areas]
+        return _mapOnOcrPool(lambda crop: self._run(crop, profile, hint), crops)
+    def _run(self, image, profile, hint=None):
+        scale, offset, timings = 1, (0, 0), {}
+        if profile is not None:
+            image, scale, offset, timings = profile.apply(image)
+        started = time.perf_counter()
+        data = getOcrBackend().image_to_data(image, *getHintSettings(hint))
+        timings["ocr"] = (time.perf_counter() - started) * 1000
+        Debug.log(3, "OCR timings (ms): " + ", ".join("{} {:.1f}".format(stage, ms) for stage, ms in timings.items()))
+        return OcrResult(data, scale, offset, timings)
+    def read_all(self, images, profile=None, hint=None):
+        """
+        Runs OCR on each of `images` in parallel (`Settings.OcrWorkers` at a time),
+        and returns a list of OcrResults in the same order.
+
+        Both backends release the GIL while Tesseract runs (tesserocr gives each
+        worker thread its own resident engine), so a thread pool is enough.
+        """
+        return _mapOnOcrPool(lambda image: self.read(image, profile, hint), images)
+    def image_to_text(self, image, profile=None, hint=None):
+        """
+        Returns the text found in the given image, as Tesseract formats it.
+
+        Unlike ``read(image).text()``, which rebuilds the text from the recognized
+        words, this keeps Tesseract's own layout. It's cached per frame like ``read()``.
+        """
+        if profile is None:
+            profile = Settings.OcrProfile
+        hint_settings = getHintSettings(hint)
+        if not isinstance(image, numpy.ndarray):
+            return getOcrBackend().image_to_string(image, *hint_settings)
+        image = numpy.ascontiguousarray(image)
+        fingerprint = frameFingerprint(image)
+        key = ("text", Settings.OcrBackend, Settings.OcrLanguage, profile.getKey() if profile else None, hint_settings)
+        found, text = OcrCache.get(fingerprint, key)
+        if not found:
+            if profile is not None:
+                image = profile.apply(image)[0]
+            text = getOcrBackend().image_to_string(image, *hint_settings)
+            OcrCache.put(fingerprint, key, text)
+        return text
+    def find_word(self, image, text, confidence=None, profile=None, hint=None):
         """
         Finds the first word in `image` that matches `text`.
-        Currently ignores confidence
-        """
-        data = pytesseract.image_to_data(image)
-        reader = csv.DictReader(data.split("\n"), delimiter="\t", quoting=csv.QUOTE_NONE)
-        for rect in reader:
-            if re.search(text, rect["text"]):
-                return (
-                    (
-                        rect["left"],
-                        rect["top"],
-                        rect["width"],
-                        rect["height"]
-                    ),
-                    rect["conf"]
-                )
-        return None
-    def find_line(self, image, text, confidence=0.6):
+        Words recognized with less than `confidence` (0-1, defaults to
+        `Settings.OcrMinConfidence`) are ignored.
+        Returns `(bbox, confidence)`, with the word's own confidence.
         """
-        Finds all lines in `image` that match `text`.
-        Currently ignores confidence
+        return self.read(image, profile, hint).find_word(text, _minConfidence(confidence))
+    def find_line(self, image, text, confidence=None, profile=None, hint=None):
         """
-        data = pytesseract.image_to_data(image)
-        reader = csv.DictReader(data.split("\n"), delimiter="\t", quoting=csv.QUOTE_NONE)
-        lines = {}
-        for rect in reader:
-            key = (int(rect["page_num"]), int(rect["block_num"]), int(rect["par_num"]), int(rect["line_num"]))
-            if key not in lines:
-                lines[key] = ""
-            lines[key] += " " + rect["text"]
-        for line in lines:
-            if re.search(text, line):
-                return (
-                    (
-                        rect["left"],
-                        rect["top"],
-                        rect["width"],
-                        rect["height"]
-                    ),
-                    rect["conf"]
-                )
-        return None
-    def find_all_in_image(self, image, text, confidence=0.6):
+        Finds the first line in `image` that matches `text`.
+        Words recognized with less than `confidence` (0-1, defaults to
+        `Settings.OcrMinConfidence`) are ignored.
+        Returns `(bbox, confidence)`, with the average confidence of the line's words.
+        """
+        return self.read(image, profile, hint).find_line(text, _minConfidence(confidence))
+    def find_all_in_image(self, image, text, confidence=None, profile=None, hint=None):
         """
         Finds all blocks of text in `image` that match `text`.
-        Currently ignores confidence
-        """
-        confidence = confidence*100 # Scaling for pytesseract
-        data = pytesseract.image_to_data(image)
-        print(data)
-        reader = csv.DictReader(data.split("\n"), delimiter="\t", quoting=csv.QUOTE_NONE)
-        rects = [r for r in reader]
-        # Debug.info("Rects: " + repr(rects))
-        line = []
-        matches = []
-        for rect in rects:
-            if len(line) and (line[0]["page_num"], line[0]["block_num"], line[0]["par_num"], line[0]["line_num"]) == (rect["page_num"], rect["block_num"], rect["par_num"], rect["line_num"]):
-                # This rect is on the same line
-                line.append(rect)
-            else:
-                # Debug.info("Line: " + " ".join(e["text"] for e in line if e["text"] is not None)) # int(e["conf"]) > confidence and 
-                line = [rect]
-            
-            if self._check_if_line_matches(line, text, confidence):
-                matches.append(self._reduce_line_matches(line, text, confidence))
-                line = []
-            # Start with first element in line
-            # Check if it matches
-            # If so, and there are multiple elements, try removing the first one and see if it still matches.
-            # If not, add next element, and check if it matches
-        return matches
-    def find_in_image(self, image, text, confidence=0.6):
+        Words recognized with less than `confidence` (0-1, defaults to
+        `Settings.OcrMinConfidence`) are ignored.
+        Returns a list of `(bbox, confidence)`, with the average confidence of the
+        matched words.
+        """
+        return self.read(image, profile, hint).find_all(text, _minConfidence(confidence))
+    def find_in_image(self, image, text, confidence=None, profile=None, hint=None):
         """
         Finds first match of `text` in `image` (may be a regex).
-        Currently ignores confidence
+        Words recognized with less than `confidence` (0-1, defaults to
+        `Settings.OcrMinConfidence`) are ignored.
         """
-        matches = self.find_all_in_image(image, text, confidence)
-        # Debug.info("Matches: " + repr(matches))
+        matches = self.find_all_in_image(image, text, confidence, profile, hint)
         if matches:
             return matches[0]
         return None
-    def _check_if_line_matches(self, line, text, confidence):
-        # Join the `text` property from each element in `line` and compare it with the `text` regex
-        return re.search(text, " ".join(e["text"] for e in line if e["text"] is not None)) is not None # int(e["conf"]) > confidence and
-    def _reduce_line_matches(self, line, text, confidence):
-        # Remove the first element from line and see if it still matches
-        while self._check_if_line_matches(line, text, confidence):
-            # If so, continue
-            last_element = line.pop(0)
-        # If not, replace the element, and calculate the bounding box of the remaining elements
-        line = [last_element] + line
-        #print("Matched line: " + repr(line)) # DEBUG
-        corners = []
-        for e in line:
-            corners.append((int(e["left"]), int(e["top"])))
-            corners.append((int(e["left"])+int(e["width"]), int(e["top"])+int(e["height"])))
-        bbox = (
-            min(corner[0] for corner in corners), # X
-            min(corner[1] for corner in corners), # Y
-            max(corner[0] for corner in corners) - min(corner[0] for corner in corners), # W
-            max(corner[1] for corner in corners) - min(corner[1] for corner in corners), # H
-        )
-        return (bbox, confidence)
-
-TextOCR = OCR()
\ No newline at end of file
+
+class IncrementalOcr(object):
+    """ Keeps the last OCR result for a region, and on each new capture re-reads only
+    the lines of text that changed.
+
+    Used by text polling loops (``existsText()``, ``waitVanishText()``): when only a
+    spinner or a counter changes, only that line is OCR'd again and spliced into the
+    previous result. If more than ``Settings.OcrRereadMaxFraction`` of the capture
+    changed, it is read in full.
+    """
+    def __init__(self, profile=None, hint=None):
+        self._profile = profile
+        self._hint = hint
+        self._detector = ChangeDetector()
+        self._result = None
+        self._generation = 0
+
+    def read(self, bitmap):
+        """ Returns an OcrResult for ``bitmap`` (a new capture of the same region) """
+        changes = self._detector.update(bitmap) if Settings.ChangeGatedWaits else None
+        if self._result is None or changes is None:
+            self._result = TextOCR.read(bitmap, self._profile, self._hint)
+            return self._result
+        if not changes:
+            return self._result
+        height, width = bitmap.shape[:2]
+        areas = mergeBoxes(self._result.rereadAreas(changes), (height, width))
+        if sum(w * h for _, _, w, h in areas) > Settings.OcrRereadMaxFraction * width * height:
+            self._result = TextOCR.read(bitmap, self._profile, self._hint)
+            return self._result
+        results = TextOCR._runAreas(bitmap, areas, self._profile, self._hint)
+        self._generation += 1
+        self._result = self._result.splice(areas, results, self._generation)
+        Debug.log(3, "Re-read {} changed area(s) of text".format(len(areas)))
+        return self._result
+
+_ocrPool = None
+_ocrPoolSize = None
+_ocrPoolLock = threading.Lock()
+def _getOcrPool():
+    """ Returns the thread pool used to OCR several images at once """
+    global _ocrPool, _ocrPoolSize
+    size = Settings.OcrWorkers or os.cpu_count() or 1
+    with _ocrPoolLock:
+        if _ocrPool is None or size != _ocrPoolSize:
+            # Other threads may still be mapping on the old pool; it isn't shut down,
+            # its workers exit once it has finished their work and is released
+            _ocrPool = ThreadPoolExecutor(max_workers=size)
+            _ocrPoolSize = size
+        return _ocrPool
+_ocrPoolThread = threading.local()
+def _mapOnOcrPool(function, items):
+    """ Returns ``[function(item) for item in items]``, computed on the OCR pool.
+
+    Items are processed inline when there's only one, or when this is already one of
+    the pool's workers (e.g. ``read_all()`` reading a large image in detected areas):
+    a worker waiting for work queued behind it on its own pool could wait forever.
+    """
+    if len(items) <= 1 or getattr(_ocrPoolThread, "active", False):
+        return [function(item) for item in items]
+    def run(item):
+        _ocrPoolThread.active = True
+        try:
+            return function(item)
+        finally:
+            _ocrPoolThread.active = False
+    return list(_getOcrPool().map(run, items))
+
+TextOCR = OCR()
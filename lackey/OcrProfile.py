@@ -0,0 +1,108 @@
+""" Preprocessing applied to screen captures before OCR
+
+Tesseract is tuned for scanned pages: dark text on a light background, at print
+resolution. Screen text is small, often anti-aliased, and sometimes light on dark.
+An OcrProfile converts a capture into something closer to a page before OCR, so the
+first pass gives accurate text instead of needing retries.
+"""
+import time
+import numpy
+import cv2
+
+class OcrProfile(object):
+    """ A configurable OCR preprocessing pipeline
+
+    Stages, in order (each can be turned off):
+
+    * ``grayscale``: drop color
+    * ``invert``: True, False, or "auto" (invert if the image is mostly dark, e.g. a
+      dark theme), so the text ends up dark on light
+    * ``crop``: crop to the area containing text-like edges (plus ``crop_margin``
+      pixels), so Tesseract doesn't scan empty space
+    * ``scale``: integer upscaling factor (Tesseract prefers text 20-30 px high)
+    * ``threshold``: "adaptive" (handles uneven backgrounds), "otsu", or None
+
+    Word boxes in the OCR results are mapped back to the original image's coordinates.
+    """
+    def __init__(self, grayscale=True, invert="auto", crop=True, scale=2, threshold="adaptive",
+                 block_size=31, threshold_offset=10, crop_margin=4):
+        if threshold not in ("adaptive", "otsu", None):
+            raise ValueError("threshold should be \"adaptive\", \"otsu\" or None")
+        if int(scale) != scale or scale < 1:
+            raise ValueError("scale should be a positive integer")
+        self.grayscale = grayscale
+        self.invert = invert
+        self.crop = crop
+        self.scale = int(scale)
+        self.threshold = threshold
+        self.block_size = block_size
+        self.threshold_offset = threshold_offset
+        self.crop_margin = crop_margin
+
+    def getKey(self):
+        """ Returns a hashable key for this profile's settings (used to cache results) """
+        return (self.grayscale, self.invert, self.crop, self.scale, self.threshold,
+                self.block_size, self.threshold_offset, self.crop_margin)
+
+    def apply(self, image):
+        """ Runs the pipeline on ``image`` (a BGR or grayscale numpy array).
+
+        Returns ``(processed, scale, offset, timings)``: coordinates in ``processed``
+        map back to ``image`` as ``original = processed / scale + offset``, and
+        ``timings`` holds the time spent in each stage, in milliseconds.
+        """
+        timings = {}
+        offset = (0, 0)
+        clock = time.perf_counter()
+        def lap(stage):
+            nonlocal clock
+            now = time.perf_counter()
+            timings[stage] = (now - clock) * 1000
+            clock = now
+
+        if (self.grayscale or self.threshold) and image.ndim == 3:
+            code = cv2.COLOR_BGR2GRAY if image.shape[2] == 3 else cv2.COLOR_BGRA2GRAY
+            image = cv2.cvtColor(image, code)
+            lap("grayscale")
+        if self.invert == "auto":
+            invert = image.mean() < 128
+        else:
+            invert = self.invert
+        if invert:
+            image = cv2.bitwise_not(image)
+            lap("invert")
+        if self.crop:
+            rect = self._textBounds(image)
+            if rect is not None:
+                x, y, w, h = rect
+                image = image[y:y+h, x:x+w]
+                offset = (x, y)
+            lap("crop")
+        if self.scale > 1:
+            image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_CUBIC)
+            lap("scale")
+        if self.threshold and image.ndim == 2:
+            if self.threshold == "adaptive":
+                image = cv2.adaptiveThreshold(
+                    image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                    self.block_size, self.threshold_offset)
+            else:
+                _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            lap("threshold")
+        return (image, self.scale, offset, timings)
+
+    def _textBounds(self, image):
+        """ Returns the ``(x, y, w, h)`` rectangle around text-like edges in ``image``
+        (with a margin), or None if there are none """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, numpy.ones((3, 3), numpy.uint8))
+        points = cv2.findNonZero(cv2.threshold(gradient, 40, 255, cv2.THRESH_BINARY)[1])
+        if points is None:
+            return None
+        x, y, w, h = cv2.boundingRect(points)
+        margin = self.crop_margin
+        x1 = max(0, x - margin)
+        y1 = max(0, y - margin)
+        x2 = min(gray.shape[1], x + w + margin)
+        y2 = min(gray.shape[0], y + h + margin)
+        return (x1, y1, x2 - x1, y2 - y1)
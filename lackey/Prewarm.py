@@ -0,0 +1,104 @@
+""" Loads the images a script refers to before it needs them
+
+Most image references in a Sikuli script are string literals (``click("ok.png")``,
+``Pattern("ok.png").similar(0.9)``). ``prewarm()`` finds them in the script's source
+without running it, then resolves and decodes the images, and builds their search
+pyramids, on background threads. By the time the script's first ``click()`` runs, the
+image is usually already in the decoded-image cache.
+
+Scripts imported from ``.sikuli`` bundles are prewarmed automatically (see
+``ImportHandler`` and ``Settings.PrewarmImports``).
+"""
+import ast
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .SettingsDebug import Settings, Debug
+from .ImageResolver import ImageIndex, IMAGE_EXTENSIONS
+from .ImageCache import DecodedImages, PYRAMID_LEVELS
+
+def findImageReferences(source):
+    """ Returns the image names referenced in the Python ``source``, in order of first
+    appearance: string literals that end in an image extension, and the first
+    argument of ``Pattern(...)`` calls """
+    found = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Call):
+            function = node.func
+            function_name = function.attr if isinstance(function, ast.Attribute) else getattr(function, "id", None)
+            if function_name == "Pattern" and node.args and _stringValue(node.args[0]):
+                found.append((node.lineno, node.col_offset, _stringValue(node.args[0])))
+        else:
+            value = _stringValue(node)
+            if value and value.lower().endswith(IMAGE_EXTENSIONS):
+                found.append((node.lineno, node.col_offset, value))
+    # ast.walk() is breadth-first; sort back into source order
+    return list(dict.fromkeys(name for _, _, name in sorted(found)))
+
+def _stringValue(node):
+    """ Returns the value of a string literal node (None for other nodes) """
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if sys.version_info < (3, 8) and isinstance(node, ast.Str):
+        return node.s
+    return None
+
+def _getSourceFile(target):
+    """ Returns the path of the script for a module, a ``.py`` file or a ``.sikuli``
+    directory """
+    if hasattr(target, "__file__"):
+        target = target.__file__
+    if os.path.isdir(target):
+        name = os.path.splitext(os.path.basename(os.path.normpath(target)))[0]
+        target = os.path.join(target, name + ".py")
+    return target
+
+_pool = None
+_poolLock = threading.Lock()
+def _getPool():
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=Settings.PatternPreloadWorkers or os.cpu_count() or 1,
+                thread_name_prefix="lackey-prewarm")
+        return _pool
+
+def _warm(name):
+    """ Resolves and decodes the image ``name`` and builds its pyramid. Returns False if
+    it isn't an image in the image path. """
+    path = ImageIndex.resolve(name)
+    if path is None:
+        return False # Probably OCR text, or an image path added later by the script
+    image = DecodedImages.load(path)
+    if image is None:
+        return False
+    DecodedImages.getPyramid(image, PYRAMID_LEVELS)
+    return True
+
+def prewarm(target, wait=False):
+    """ Loads the images referenced by a script in the background.
+
+    ``target`` is a module, a script file, or a ``.sikuli`` directory. Its source is
+    scanned (not run) for image names (see ``findImageReferences()``), which are then
+    resolved and decoded on background threads.
+
+    Returns a list of futures, one per image, each resolving to True if the image was
+    loaded. With ``wait=True``, returns only after they have all finished.
+    """
+    source_file = _getSourceFile(target)
+    try:
+        with open(source_file, "rb") as script:
+            names = findImageReferences(script.read())
+    except (OSError, SyntaxError, ValueError) as e:
+        Debug.log(3, "Could not scan {} for images: {!r}".format(source_file, e))
+        return []
+    Debug.log(3, "Prewarming {} images referenced by {}".format(len(names), source_file))
+    pool = _getPool()
+    futures = [pool.submit(_warm, name) for name in names]
+    if wait:
+        for future in futures:
+            future.exception()
+    return futures
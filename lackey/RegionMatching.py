@@ -8,14 +8,20 @@ except ImportError:
     import tkinter.messagebox as tkmb
 import multiprocessing
 import subprocess
+import threading
+import queue
+import asyncio
+import atexit
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 import pyperclip
 import tempfile
 import platform
 import numpy
 import time
 import uuid
+import zlib
 import cv2
-import sys
 import os
 import re
 
@@ -23,8 +29,17 @@ from .InputEmulation import Mouse as MouseClass, Keyboard
 from .Exceptions import FindFailed, ImageMissing
 from .SettingsDebug import Settings, Debug
 from .TemplateMatchers import PyramidTemplateMatcher as TemplateMatcher
+from .MatchCache import FindCache, frameFingerprint
+from .ChangeDetection import ChangeDetector, expandRect, rectsIntersect, findChanges
+from .WaitEngine import WaitEngine, getRunningLoop
+from .Capture import AsyncFrameBroker
+from .ObserverScheduler import ObserverScheduler
+from .SharedFrames import FramePublisher, FrameSubscriber, SharedFrameProducer, isAvailable as sharedFramesAvailable
 from .Geometry import Location
-from .Ocr import TextOCR
+from .ImageResolver import ImageIndex
+from .ImageCache import DecodedImages
+from .Bundle import findBundledImage
+from .Ocr import TextOCR, IncrementalOcr
 
 if platform.system() == "Windows" or os.environ.get('READTHEDOCS') == 'True':
     # Avoid throwing an error if it's just being imported for documentation purposes
@@ -37,6 +52,9 @@ else:
     raise NotImplementedError("Lackey is currently only compatible with Windows and OSX.")
     
 
+# Images in directories with a compiled bundle are read from it instead of decoded
+DecodedImages.addSource(findBundledImage)
+
 # Python 3 compatibility
 try:
     basestring
@@ -52,30 +70,83 @@ except:
 Mouse = MouseClass()
 keyboard = Keyboard()
 
+# Async waits share captures per event loop
+_frameBrokers = weakref.WeakKeyDictionary()
+def _getFrameBroker(loop):
+    """ Returns the ``AsyncFrameBroker`` shared by all regions waiting on ``loop`` """
+    if loop not in _frameBrokers:
+        _frameBrokers[loop] = AsyncFrameBroker(PlatformManager.getBitmapFromRect, loop)
+    return _frameBrokers[loop]
+
 class Pattern(object):
-    """ Defines a pattern based on a bitmap, similarity, and target offset """
+    """ Defines a pattern based on a bitmap, similarity, and target offset
+
+    A Pattern created from a filename doesn't look up or decode the image until it is
+    first needed (usually by the first search), so unused patterns cost nothing. Call
+    ``preload()`` (or ``lackey.preloadPatterns()``) to load them up front; an
+    ``ImageMissing`` error is raised then, or on first use.
+    """
     def __init__(self, target=None):
-        self.path = None
+        self._filename = None # Set while the image is waiting to be loaded
+        self._loadLock = threading.Lock()
+        self._path = None
+        self._image = None
+        self._imagePattern = False
         self.similarity = Settings.MinSimilarity
         self.offset = Location(0, 0)
-        self.imagePattern = False
         if isinstance(target, Pattern):
-            self.image = target.getImage()
+            if target._filename is not None:
+                self._filename = target._filename # Copy stays unloaded too
+            else:
+                self._path = target._path
+                self._image = target._image
+                self._imagePattern = target._imagePattern
             self.similarity = target.similarity
             self.offset = target.offset.offset(0, 0) # Clone Location
-            self.imagePattern = target.isImagePattern()
         elif isinstance(target, basestring):
             self.setFilename(target)
         elif isinstance(target, numpy.ndarray):
             self.setImage(target)
         elif target is not None:
             raise TypeError("Unrecognized argument for Pattern()")
+    def __getstate__(self):
+        # Patterns are pickled for observer subprocesses; each copy gets its own lock
+        state = self.__dict__.copy()
+        del state["_loadLock"]
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._loadLock = threading.Lock()
     def __repr__(self):
-        return "<Pattern [" + ('image' if self.imagePattern else 'ocr') + "] \"" + self.path + "\" (" + str(self.similarity) + ") >"
+        if self._filename is not None:
+            return "<Pattern [unloaded] \"" + self._filename + "\" (" + str(self.similarity) + ") >"
+        return "<Pattern [" + ('image' if self._imagePattern else 'ocr') + "] \"" + self._path + "\" (" + str(self.similarity) + ") >"
+
+    @property
+    def path(self):
+        self._ensureLoaded()
+        return self._path
+    @path.setter
+    def path(self, path):
+        self._path = path
+    @property
+    def image(self):
+        self._ensureLoaded()
+        return self._image
+    @image.setter
+    def image(self, image):
+        self.setImage(image)
+    @property
+    def imagePattern(self):
+        self._ensureLoaded()
+        return self._imagePattern
+    @imagePattern.setter
+    def imagePattern(self, image_pattern):
+        self._imagePattern = image_pattern
 
     def similar(self, similarity):
         """ Returns a new Pattern with the specified similarity threshold """
-        pattern = Pattern(self.path)
+        pattern = Pattern(self)
         pattern.similarity = similarity
         return pattern
     def getSimilar(self):
@@ -83,15 +154,17 @@ class Pattern(object):
         return self.similarity
     def exact(self):
         """ Returns a new Pattern with a similarity threshold of 1.0 """
-        pattern = Pattern(self.path)
+        pattern = Pattern(self)
         pattern.similarity = 1.0
         return pattern
     def isValid(self):
-        return (self.image is not None)
+        try:
+            return (self.image is not None)
+        except ImageMissing:
+            return False
     def targetOffset(self, dx, dy):
         """ Returns a new Pattern with the given target offset """
-        pattern = Pattern(self.path)
-        pattern.similarity = self.similarity
+        pattern = Pattern(self)
         pattern.offset = Location(dx, dy)
         return pattern
 
@@ -99,31 +172,59 @@ class Pattern(object):
         """ Returns the path to this Pattern's bitmap """
         return self.path
     def setFilename(self, filename):
-        """ Set the filename of the pattern's image (and load it) """
-        ## Loop through image paths to find the image
-        found = False
-        for image_path in sys.path + [Settings.BundlePath, os.getcwd()] + Settings.ImagePaths:
-            full_path = os.path.join(image_path, filename)
-            if os.path.exists(full_path):
-                found = True
-                self.path = full_path
-                self.setImage(cv2.imread(self.path))
-                break
-        ## Check if path is valid
-        if not found:
-            self.path = filename
+        """ Set the filename of the pattern's image (it is loaded when first used) """
+        self._filename = filename
+        self._path = None
+        self._image = None
+        self._imagePattern = False
+        return self
+    def preload(self):
+        """ Looks up and decodes the pattern's image now, instead of on first use.
+
+        Raises ImageMissing if the image can't be found (unless ``Settings.SwitchToText``
+        is set, in which case the pattern is treated as OCR text). """
+        self._ensureLoaded()
+        return self
+    def isLoaded(self):
+        """ Returns True if the pattern's image has been loaded (or it's a text pattern) """
+        return self._filename is None
+    def _ensureLoaded(self):
+        if self._filename is not None:
+            with self._loadLock:
+                if self._filename is not None:
+                    self._load()
+    def _load(self):
+        filename = self._filename
+        ## Look up the image in the image paths
+        full_path = ImageIndex.resolve(filename)
+        if full_path is not None:
+            self._path = full_path
+            # Decoded once per file and shared (read-only) by every Pattern using it
+            self._image = DecodedImages.load(full_path)
+            self._imagePattern = True
+        else:
+            self._path = filename
             Debug.info("Pattern not found in image paths: " + repr(Settings.ImagePaths))
             if Settings.SwitchToText:
                 Debug.info("Assuming pattern is OCR text")
             else:
+                # Still unloaded, so it's looked up again on the next use
                 raise ImageMissing(ImageMissingEvent(pattern=self, event_type="IMAGEMISSING"))
-        return self
+        self._filename = None
     def setImage(self, img):
-        self.image = img
-        self.imagePattern = True
+        self._filename = None
+        self._path = None # The image no longer comes from a file (see _getCacheKey)
+        self._image = img
+        self._imagePattern = True
         return self
     def getImage(self):
         return self.image
+    def _getCacheKey(self):
+        """ Identifies this pattern's needle for the search result cache """
+        if self.path is not None:
+            return self.path
+        image = numpy.ascontiguousarray(self.image)
+        return (image.shape, zlib.crc32(image))
     def getTargetOffset(self):
         """ Returns the target offset as a Location(dx, dy) """
         return self.offset
@@ -169,11 +270,14 @@ class Region(object):
         self._raster = (0, 0)
         self._observer = Observer(self)
         self._observeScanRate = None
+        self._observePriority = 0
+        self._ocrProfile = None
         self._repeatWaitTime = 0.3
         self._throwException = True
         self._findFailedResponse = "ABORT"
         self._findFailedHandler = None
         self._highlighter = None
+        self._waitEngine = WaitEngine()
     
     CREATE_X_DIRECTION_LEFT = 0
     CREATE_X_DIRECTION_RIGHT = 1
@@ -540,27 +644,13 @@ class Region(object):
             pattern = Pattern(pattern)
         if not pattern.isImagePattern():
             # Assume the pattern is text to match via OCR
-            timeout = time.time() + seconds
-
-            # Consult TextOCR to find needle text
-            matches = []
-            while time.time() < timeout and len(matches) == 0:
-                matches = TextOCR.find_all_in_image(r.getBitmap(), pattern.path, pattern.similarity)
-                time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
+            probe = self._textProbe(pattern.path, find_all=True)
         else:
-            needle = cv2.imread(pattern.path)
-            if needle is None:
+            if pattern.getImage() is None:
                 raise ValueError("Unable to load image '{}'".format(pattern.path))
-            needle_height, needle_width, needle_channels = needle.shape
-            positions = []
-            timeout = time.time() + seconds
-
             # Check TemplateMatcher for valid matches
-            matches = []
-            while time.time() < timeout and len(matches) == 0:
-                matcher = TemplateMatcher(r.getBitmap())
-                matches = matcher.findAllMatches(needle, pattern.similarity)
-                time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
+            probe = self._imageProbe(pattern, find_all=True)
+        matches = self._poll(r, probe, seconds)
 
         if len(matches) == 0:
             Debug.info("Couldn't find '{}' with enough similarity.".format(pattern.path))
@@ -601,14 +691,10 @@ class Region(object):
             seconds = self.autoWaitTimeout
         
         findFailedRetry = True
-        timeout = time.time() + seconds
         while findFailedRetry:
-            while True:
-                match = self.exists(pattern)
-                if match:
-                    return match
-                if time.time() >= timeout:
-                    break
+            match = self.exists(pattern, seconds)
+            if match:
+                return match
             path = pattern.path if isinstance(pattern, Pattern) else pattern
             findFailedRetry = self._raiseFindFailed("Could not find pattern '{}'".format(path))
             if findFailedRetry:
@@ -627,28 +713,8 @@ class Region(object):
             return None
         if seconds is None:
             seconds = self.autoWaitTimeout
-        if not isinstance(pattern, Pattern):
-            if not isinstance(pattern, basestring):
-                raise TypeError("find expected a string [image path] or Pattern object")
-            pattern = Pattern(pattern)
-        if not pattern.isImagePattern():
-            # Assume the pattern is text to match via OCR
-            timeout = time.time() + seconds
-
-            # Consult TextOCR to find needle text
-            while match and time.time() < timeout:
-                match = TextOCR.find_in_image(r.getBitmap(), pattern.path, pattern.similarity)
-                time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
-        else:
-            needle = cv2.imread(pattern.path)
-            match = True
-            timeout = time.time() + seconds
-
-            while match and time.time() < timeout:
-                matcher = TemplateMatcher(r.getBitmap())
-                # When needle disappears, matcher returns None
-                match = matcher.findBestMatch(needle, pattern.similarity)
-                time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
+        pattern = self._getPattern(pattern)
+        match = self._poll(r, self._patternProbe(pattern, vanish=True), seconds, until=lambda m: not m)
         if match:
             return False
             #self._findFailedHandler(FindFailed("Pattern '{}' did not vanish".format(pattern.path)))
@@ -679,37 +745,13 @@ class Region(object):
             return
         if not pattern:
             time.sleep(seconds)
-        if not isinstance(pattern, Pattern):
-            if not isinstance(pattern, basestring):
-                raise TypeError("find expected a string [image path] or Pattern object")
-            pattern = Pattern(pattern)
-        if not pattern.isImagePattern():
-            # Assume the pattern is text to match via OCR
-            timeout = time.time() + seconds
-
-            # Consult TextOCR to find needle text
-            match = None
-            while not match:
-                match = TextOCR.find_in_image(r.getBitmap(), pattern.path, pattern.similarity)
-                time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
-                if time.time() > timeout:
-                    break
-        else:
-            needle = cv2.imread(pattern.path)
-            needle_height, needle_width, needle_channels = needle.shape
-            match = None
-            timeout = time.time() + seconds
-
-            # Consult TemplateMatcher to find needle
-            while not match:
-                matcher = TemplateMatcher(r.getBitmap())
-                match = matcher.findBestMatch(needle, pattern.similarity)
-                time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
-                if time.time() > timeout:
-                    break
-
+        pattern = self._getPattern(pattern)
+        match = self._poll(r, self._patternProbe(pattern), seconds)
+        return self._foundMatch(pattern, match, find_time)
+    def _foundMatch(self, pattern, match, find_time):
+        """ Turns the result of an ``exists()`` search into the region's last ``Match``
+        (or returns None if nothing was found) """
         if match is None:
-            print(pattern)
             Debug.info("Couldn't find '{}' with enough similarity.".format(pattern.path))
             return None
 
@@ -730,6 +772,123 @@ class Region(object):
             self._lastMatch.getTarget().y))
         self._lastMatchTime = (time.time() - find_time) * 1000 # Capture find time in milliseconds
         return self._lastMatch
+    def _matchPattern(self, bitmap, pattern, find_all=False):
+        """ Searches ``bitmap`` for the image in ``pattern``.
+
+        Returns the raw matcher result (``findBestMatch`` or, if ``find_all`` is set,
+        ``findAllMatches``) in bitmap coordinates. If this exact frame has already been
+        searched with the same pattern and similarity, the cached result is returned
+        instead of searching again.
+        """
+        fingerprint = frameFingerprint(bitmap)
+        search_key = (pattern._getCacheKey(), pattern.similarity, find_all)
+        found, result = FindCache.get(fingerprint, search_key)
+        if found:
+            return list(result) if find_all else result
+        matcher = TemplateMatcher(bitmap)
+        if find_all:
+            result = matcher.findAllMatches(pattern.getImage(), pattern.similarity)
+        else:
+            result = matcher.findBestMatch(pattern.getImage(), pattern.similarity)
+        FindCache.put(fingerprint, search_key, tuple(result) if find_all else result)
+        return result
+    def _matchNewPixels(self, gate, bitmap, pattern, find_all=False):
+        """ Searches ``bitmap`` for ``pattern`` in a wait loop where the previous search
+        came up empty.
+
+        ``gate`` is the loop's ``ChangeDetector``. If nothing changed since the last
+        capture, the search is skipped. If only part of the region changed, only the
+        changed areas (grown by the needle size, so any placement that touches a changed
+        pixel is covered) are searched.
+        """
+        changes = gate.update(bitmap) if Settings.ChangeGatedWaits else None
+        if changes is None:
+            return self._matchPattern(bitmap, pattern, find_all)
+        if not changes:
+            return [] if find_all else None
+        needle_h, needle_w = pattern.getImage().shape[:2]
+        areas = [expandRect(change, needle_w, needle_h, bitmap.shape) for change in changes]
+        if (not Settings.RematchChangedTilesOnly or
+                sum(w*h for _, _, w, h in areas) * 2 > bitmap.shape[0] * bitmap.shape[1]):
+            # Most of the region changed anyway
+            return self._matchPattern(bitmap, pattern, find_all)
+        results = {}
+        for x, y, w, h in areas:
+            if w < needle_w or h < needle_h:
+                continue # Needle can't fit here
+            found = self._matchPattern(bitmap[y:y+h, x:x+w], pattern, find_all)
+            if not find_all:
+                found = [found] if found else []
+            for position, confidence in found:
+                position = (position[0] + x, position[1] + y, position[2], position[3])
+                # Grown areas may overlap, so the same match can be found twice
+                results[position[:2]] = (position, confidence)
+        if find_all:
+            return sorted(results.values(), key=lambda m: (m[0][1], m[0][0]))
+        if not results:
+            return None
+        return max(results.values(), key=lambda m: m[1])
+    def _getPattern(self, pattern):
+        """ Returns ``pattern`` as a ``Pattern`` object """
+        if not isinstance(pattern, Pattern):
+            if not isinstance(pattern, basestring):
+                raise TypeError("find expected a string [image path] or Pattern object")
+            pattern = Pattern(pattern)
+        return pattern
+    def _patternProbe(self, pattern, vanish=False):
+        """ Returns the right probe for ``pattern`` (an image, or text to match via OCR) """
+        if not pattern.isImagePattern():
+            # Assume the pattern is text to match via OCR
+            return self._textProbe(pattern.path)
+        elif vanish:
+            return self._vanishProbe(pattern)
+        # Consult TemplateMatcher to find needle
+        return self._imageProbe(pattern)
+    def _poll(self, r, probe, seconds, until=None):
+        """ Runs ``probe`` on fresh captures of ``r`` at this region's scan rate until
+        it succeeds (see ``WaitEngine.run()``) or ``seconds`` pass """
+        return self._waitEngine.run(lambda: probe(r.getBitmap()), seconds, self.getWaitScanRate(), until)
+    async def _pollAsync(self, r, probe, seconds, until=None):
+        """ Awaitable version of ``_poll()``. Captures go through the event loop's shared
+        ``AsyncFrameBroker`` and the probe runs in the loop's default executor. """
+        loop = getRunningLoop()
+        broker = _getFrameBroker(loop)
+        async def step():
+            bitmap = await broker.capture(r.getTuple())
+            return await loop.run_in_executor(None, probe, bitmap)
+        return await self._waitEngine.runAsync(step, seconds, self.getWaitScanRate(), until)
+    def _imageProbe(self, pattern, find_all=False):
+        """ Returns a probe for ``_poll()`` that searches each capture for ``pattern``,
+        skipping the search while the region is unchanged """
+        gate = ChangeDetector()
+        return lambda bitmap: self._matchNewPixels(gate, bitmap, pattern, find_all)
+    def _vanishProbe(self, pattern):
+        """ Returns a probe for ``_poll()`` that returns the current match for ``pattern``
+        in each capture (None once it has vanished) """
+        gate = ChangeDetector()
+        match = None
+        def probe(bitmap):
+            nonlocal match
+            changes = gate.update(bitmap) if Settings.ChangeGatedWaits else None
+            # The needle can only have vanished if pixels under the last match changed
+            if match is None or changes is None or any(rectsIntersect(change, match[0]) for change in changes):
+                # When needle disappears, matcher returns None
+                match = self._matchPattern(bitmap, pattern)
+            return match
+        return probe
+    def _textProbe(self, text, find_all=False, hint=None):
+        """ Returns a probe for ``_poll()`` that searches each capture for ``text`` with
+        OCR, ignoring words read with less than ``Settings.OcrMinConfidence``. Only the
+        lines of text that changed since the last capture are re-read. """
+        confidence = Settings.OcrMinConfidence
+        reader = IncrementalOcr(self._ocrProfile, hint)
+        def probe(bitmap):
+            result = reader.read(bitmap)
+            if find_all:
+                return result.find_all(text, confidence)
+            matches = result.find_all(text, confidence)
+            return matches[0] if matches else None
+        return probe
 
     def click(self, target=None, modifiers=""):
         """ Moves the cursor to the target location and clicks the default mouse button. """
@@ -994,9 +1153,13 @@ class Region(object):
         Can be used to pull outside text into the application, if it is first
         copied with the OS keyboard shortcut (e.g., "Ctrl+C") """
         return pyperclip.paste()
-    def text(self):
-        """ Extracts text from the region using OCR and returns it as a string. """
-        return TextOCR.image_to_text(self.getBitmap())
+    def text(self, hint=None):
+        """ Extracts text from the region using OCR and returns it as a string.
+
+        ``hint`` describes the text, so OCR can skip work: "line", "word", "block",
+        "sparse" and/or "digits" (e.g. ``hint=("line", "digits")``). See ``Ocr.OCR_HINTS``.
+        """
+        return TextOCR.image_to_text(self.getBitmap(), self._ocrProfile, hint)
 
     def mouseDown(self, button=Mouse.LEFT):
         """ Low-level mouse actions. """
@@ -1185,7 +1348,7 @@ class Region(object):
         if self._raster[0] == 0 or self._raster[1] == 0:
             return self
         rowHeight = self.h / self._raster[0]
-        columnWidth = self.h / self._raster[1]
+        columnWidth = self.w / self._raster[1]
         if column < 0:
             # If column is negative, count backwards from the end
             column = self._raster[1] - column
@@ -1419,40 +1582,55 @@ class Region(object):
         return exists(Pattern(image), 0)
 
     # OCR Functions
-    def findText(self, text):
-        """ Finds the first block of text in the region that matches `text`. Can be a regex. """
+    # (OCR results are cached per frame, so several text searches in an unchanged
+    # region only run OCR once)
+    def setOcrProfile(self, profile):
+        """ Sets the OcrProfile used to preprocess this region's captures before OCR.
+
+        None (the default) uses ``Settings.OcrProfile``.
+        """
+        self._ocrProfile = profile
+        return self
+    def getOcrProfile(self):
+        """ Returns the OcrProfile used for this region (None means ``Settings.OcrProfile``) """
+        return self._ocrProfile
+    def findText(self, text, hint=None):
+        """ Finds the first block of text in the region that matches `text`. Can be a regex.
+
+        ``hint`` describes the text (see ``text()``).
+        """
         findFailedRetry = True
         while findFailedRetry:
-            match = self.existsText(text)
+            match = self.existsText(text, hint=hint)
             if match is not None:
                 break
             findFailedRetry = self._raiseFindFailed("Could not find text '{}'".format(text))
             if findFailedRetry:
                 time.sleep(self._repeatWaitTime)
         return match
-    def findWord(self, text):
+    def findWord(self, text, hint=None):
         """ Finds the first word in the region that matches `text`. Can be a regex. """
-        search = TextOCR.find_word(self.getBitmap(), text)
+        search = TextOCR.find_word(self.getBitmap(), text, profile=self._ocrProfile, hint=hint)
         if search:
             bbox, conf = search
             return Match(
                 conf,
                 Location(0,0),
-                ((bbox[0], bbox[1]), (bbox[2], bbox[3]))
+                ((bbox[0] + self.x, bbox[1] + self.y), (bbox[2], bbox[3]))
             )
         return None
-    def findLine(self, text):
+    def findLine(self, text, hint=None):
         """ Finds the first line in the region that matches `text`. Can be a regex. """
-        search = TextOCR.find_line(self.getBitmap(), text)
+        search = TextOCR.find_line(self.getBitmap(), text, profile=self._ocrProfile, hint=hint)
         if search:
             bbox, conf = search
             return Match(
                 conf,
                 Location(0,0),
-                ((bbox[0], bbox[1]), (bbox[2], bbox[3]))
+                ((bbox[0] + self.x, bbox[1] + self.y), (bbox[2], bbox[3]))
             )
         return None
-    def waitText(self, text, seconds=None):
+    def waitText(self, text, seconds=None, hint=None):
         """ Searches for an image pattern in the given region, given a specified timeout period
 
         Functionally identical to findText(). If a number is passed instead of a pattern,
@@ -1469,26 +1647,22 @@ class Region(object):
             seconds = self.autoWaitTimeout
         
         findFailedRetry = True
-        timeout = time.time() + seconds
         while findFailedRetry:
-            while True:
-                match = self.existsText(text)
-                if match:
-                    return match
-                if time.time() >= timeout:
-                    break
+            match = self.existsText(text, seconds, hint)
+            if match:
+                return match
             findFailedRetry = self._raiseFindFailed("Could not find text '{}'".format(text))
             if findFailedRetry:
                 time.sleep(self._repeatWaitTime)
         return None
-    def hasText(self, text):
+    def hasText(self, text, hint=None):
         """
         Checks whether the given text is visible in the region. Does not throw FindFailed.
 
         A convenience shortcut for `existsText(text, 0)`
         """
-        return self.existsText(text, 0)
-    def existsText(self, text, seconds=None):
+        return self.existsText(text, 0, hint)
+    def existsText(self, text, seconds=None, hint=None):
         """ Searches for a text pattern in the given region (may be a regex)
 
         Returns Match if pattern exists, None otherwise (does not throw exception)
@@ -1510,16 +1684,8 @@ class Region(object):
         if not isinstance(text, basestring):
             raise TypeError("existsText expected a string")
     
-        # Assume the pattern is text to match via OCR
-        timeout = time.time() + seconds
-
         # Consult TextOCR to find needle text
-        match = None
-        while not match:
-            match = TextOCR.find_in_image(r.getBitmap(), text)
-            time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
-            if time.time() > timeout:
-                break
+        match = self._poll(r, self._textProbe(text, hint=hint), seconds)
 
         if match is None:
             Debug.info("Couldn't find '{}' with enough similarity.".format(text))
@@ -1542,7 +1708,7 @@ class Region(object):
             self._lastMatch.getTarget().y))
         self._lastMatchTime = (time.time() - find_time) * 1000 # Capture find time in milliseconds
         return self._lastMatch
-    def waitVanishText(self, text, seconds=None):
+    def waitVanishText(self, text, seconds=None, hint=None):
         """ Waits until the specified text is not visible on screen.
 
         If ``seconds`` pass and the text is still visible, raises FindFailed exception.
@@ -1556,19 +1722,140 @@ class Region(object):
         if not isinstance(text, basestring):
             raise TypeError("waitVanishText expected a string")
         
-        timeout = time.time() + seconds
-
         # Consult TextOCR to find needle text
-        match = TextOCR.find_in_image(r.getBitmap(), text)
-        while match and time.time() < timeout:
-            match = TextOCR.find_in_image(r.getBitmap(), text)
-            time.sleep(1/self._defaultScanRate if self._defaultScanRate is not None else 1/Settings.WaitScanRate)
-        
+        match = self._poll(r, self._textProbe(text, hint=hint), seconds, until=lambda m: not m)
+
         if match:
             return False
         return True
+    def textChanges(self, interval=None, backlog=None, hint=None):
+        """ Generator that yields a ``TextChange`` each time the region's text changes.
+
+        A background thread captures the region every ``interval`` seconds (defaults to
+        ``1 / getWaitScanRate()``). Captures where no pixels changed aren't OCR'd, and
+        when some did, only the changed lines are re-read. The current text is yielded
+        first, then only text that differs from the previous update::
+
+            for change in status_bar.textChanges(0.5):
+                print(change.getText())
+
+        Up to ``backlog`` updates (``Settings.TextChangesBacklog`` by default) are
+        kept for a slow consumer; beyond that the oldest are dropped, and the next
+        update yielded reports how many were lost (``getDropped()``). The thread stops
+        when the generator is closed or garbage collected (e.g. after breaking out of
+        the loop above).
+        """
+        r = self.clipRegionToScreen()
+        if r is None:
+            raise ValueError("Region outside all visible screens")
+        if interval is None:
+            interval = 1.0 / self.getWaitScanRate()
+        if backlog is None:
+            backlog = Settings.TextChangesBacklog
+        updates = queue.Queue(maxsize=max(1, backlog))
+        stop = threading.Event()
+        lock = threading.Lock()
+        dropped = 0
+        def put(update):
+            nonlocal dropped
+            while True:
+                try:
+                    updates.put_nowait(update)
+                    return
+                except queue.Full:
+                    try:
+                        updates.get_nowait()
+                        with lock:
+                            dropped += 1
+                    except queue.Empty:
+                        pass
+        def produce():
+            reader = IncrementalOcr(self._ocrProfile, hint)
+            result = text = None
+            try:
+                while not stop.is_set():
+                    started = time.monotonic()
+                    captured = time.time()
+                    new_result = reader.read(r.getBitmap())
+                    # An unchanged capture returns the previous result
+                    if new_result is not result:
+                        result = new_result
+                        new_text = result.text()
+                        if new_text != text:
+                            put(TextChange(new_text, text, captured))
+                            text = new_text
+                    stop.wait(max(0, started + interval - time.monotonic()))
+            except Exception as e:
+                put(e)
+        producer = threading.Thread(target=produce, name="lackey-text-changes")
+        producer.daemon = True
+        producer.start()
+        try:
+            while True:
+                update = updates.get()
+                if isinstance(update, Exception):
+                    raise update
+                with lock:
+                    update._dropped, dropped = dropped, 0
+                yield update
+        finally:
+            stop.set()
+
+    def textCells(self, hint=None):
+        """ Extracts the text of every cell of the region's raster (see ``setRaster()``)
+
+        The region is captured once, and the cells are OCR'd in parallel
+        (``Settings.OcrWorkers`` at a time). Returns a list of rows, each a list of
+        strings. If no raster is set, the whole region is a single cell.
+        """
+        r = self.clipRegionToScreen()
+        if r is None:
+            raise ValueError("Region outside all visible screens")
+        cells = self._cellBitmaps(r.getBitmap())
+        results = iter(TextOCR.read_all([bitmap for _, bitmap in cells], self._ocrProfile, hint))
+        rows, columns = self._raster if self._raster[0] and self._raster[1] else (1, 1)
+        return [[next(results).text() for _ in range(columns)] for _ in range(rows)]
+    def findAllTextInCells(self, text, confidence=None, hint=None):
+        """ Searches each cell of the region's raster (see ``setRaster()``) for ``text``
+        (may be a regex)
+
+        The region is captured once, and the cells are OCR'd in parallel
+        (``Settings.OcrWorkers`` at a time). Returns a list of ``Match`` objects in
+        grid order (row by row), several per cell if the text occurs more than once.
+        Words read with less than ``confidence`` (0-1, defaults to
+        ``Settings.OcrMinConfidence``) are ignored.
+        """
+        if confidence is None:
+            confidence = Settings.OcrMinConfidence
+        r = self.clipRegionToScreen()
+        if r is None:
+            raise ValueError("Region outside all visible screens")
+        cells = self._cellBitmaps(r.getBitmap())
+        results = TextOCR.read_all([bitmap for _, bitmap in cells], self._ocrProfile, hint)
+        matches = []
+        for ((x, y), _), result in zip(cells, results):
+            for position, score in result.find_all(text, confidence):
+                matches.append(Match(
+                    score,
+                    Location(0,0),
+                    ((r.x + x + position[0], r.y + y + position[1]), (position[2], position[3]))))
+        return matches
+    def _cellBitmaps(self, bitmap):
+        """ Slices ``bitmap`` (a capture of the region) into its raster cells, row by row.
 
-    def findAllText(self, text):
+        Returns a list of ``((x, y), view)``, with each cell's offset in the bitmap.
+        """
+        rows, columns = self._raster if self._raster[0] and self._raster[1] else (1, 1)
+        height, width = bitmap.shape[:2]
+        # Integer cell edges, so cells tile the bitmap exactly
+        ys = [int(round(row * height / float(rows))) for row in range(rows + 1)]
+        xs = [int(round(column * width / float(columns))) for column in range(columns + 1)]
+        return [
+            ((xs[column], ys[row]), bitmap[ys[row]:ys[row+1], xs[column]:xs[column+1]])
+            for row in range(rows)
+            for column in range(columns)]
+
+    def findAllText(self, text, hint=None):
         """ Searches for all matching text regions in the given region
 
         Returns array of ``Match`` objects if ``text`` exists, empty array
@@ -1585,7 +1872,7 @@ class Region(object):
             raise TypeError("findAllText expected a string")
 
         # Consult TextOCR to find needle text
-        matches = TextOCR.find_all_in_image(r.getBitmap(), text)
+        matches = TextOCR.find_all_in_image(r.getBitmap(), text, profile=self._ocrProfile, hint=hint)
         
         if len(matches) == 0:
             Debug.info("Couldn't find '{}' with enough similarity.".format(text))
@@ -1599,7 +1886,7 @@ class Region(object):
                 Match(
                     confidence,
                     Location(0,0),
-                    ((position[0], position[1]), (position[2], position[3]))
+                    ((position[0] + self.x, position[1] + self.y), (position[2], position[3]))
                 )
             )
         self._lastMatches = iter(lastMatches)
@@ -1607,6 +1894,91 @@ class Region(object):
         self._lastMatchTime = (time.time() - find_time) * 1000 # Capture find time in milliseconds
         return self._lastMatches
 
+    # Asynchronous Functions
+
+    async def exists_async(self, pattern, seconds=None):
+        """ Awaitable version of ``exists()``
+
+        Capturing and matching run in the event loop's default executor, so many waits
+        can share one event loop. Waits on the same loop that scan on the same tick share
+        a single screen capture.
+        """
+        find_time = time.time()
+        r = self.clipRegionToScreen()
+        if r is None:
+            raise ValueError("Region outside all visible screens")
+        if seconds is None:
+            seconds = self.autoWaitTimeout
+        pattern = self._getPattern(pattern)
+        match = await self._pollAsync(r, self._patternProbe(pattern), seconds)
+        return self._foundMatch(pattern, match, find_time)
+    async def wait_async(self, pattern, seconds=None):
+        """ Awaitable version of ``wait()``
+
+        If a number is passed instead of a pattern, just waits the specified number of
+        seconds (without blocking the event loop).
+        """
+        if isinstance(pattern, (int, float)):
+            if pattern == FOREVER:
+                while True:
+                    await asyncio.sleep(1) # Infinite loop
+            await asyncio.sleep(pattern)
+            return None
+
+        if seconds is None:
+            seconds = self.autoWaitTimeout
+
+        findFailedRetry = True
+        while findFailedRetry:
+            match = await self.exists_async(pattern, seconds)
+            if match:
+                return match
+            path = pattern.path if isinstance(pattern, Pattern) else pattern
+            findFailedRetry = self._raiseFindFailed("Could not find pattern '{}'".format(path))
+            if findFailedRetry:
+                await asyncio.sleep(self._repeatWaitTime)
+        return None
+    async def waitVanish_async(self, pattern, seconds=None):
+        """ Awaitable version of ``waitVanish()`` """
+        r = self.clipRegionToScreen()
+        if r is None:
+            raise ValueError("Region outside all visible screens")
+        if seconds is None:
+            seconds = self.autoWaitTimeout
+        pattern = self._getPattern(pattern)
+        match = await self._pollAsync(r, self._patternProbe(pattern, vanish=True), seconds, until=lambda m: not m)
+        return not match
+    async def observe_async(self, seconds=None):
+        """ Asynchronous version of ``observe()``: an async iterator over the events
+        caught by this region's observer.
+
+        ``async for event in region.observe_async(30): ...``
+
+        Registered handlers are still called (in the event loop's default executor).
+        Iteration ends after ``seconds`` or when ``stopObserver()`` is called.
+        """
+        if self._observer.isRunning:
+            return
+        self._observer.isStopped = False
+        loop = getRunningLoop()
+        deadline = None if seconds is None else loop.time() + seconds
+        r = self.clipRegionToScreen()
+        if r is None:
+            raise ValueError("Region outside all visible screens")
+        broker = _getFrameBroker(loop)
+        interval = 1.0 / self.getObserveScanRate()
+        self._observer.isRunning = True
+        try:
+            while (not self._observer.isStopped) and (deadline is None or loop.time() < deadline):
+                started = loop.time()
+                bitmap = await broker.capture(r.getTuple())
+                events = await loop.run_in_executor(None, self._observer.check_events, bitmap)
+                for event in events:
+                    yield event
+                await asyncio.sleep(max(0, started + interval - loop.time()))
+        finally:
+            self._observer.isRunning = False
+
     # Event Handlers
 
     def onAppear(self, pattern, handler=None):
@@ -1654,14 +2026,34 @@ class Region(object):
                 handler=handler)
         else:
             raise ValueError("Unsupported arguments for onChange method")
-    def isChanged(self, min_changed_pixels, screen_state):
+    def isChanged(self, min_changed_pixels, screen_state, current_state=None):
         """ Returns true if at least ``min_changed_pixels`` are different between
         ``screen_state`` and the current state.
+
+        If ``current_state`` is not provided, the region is captured. A pixel counts once
+        however many of its color channels changed (earlier versions counted channels).
         """
-        r = self.clipRegionToScreen()
-        current_state = r.getBitmap()
-        diff = numpy.subtract(current_state, screen_state)
-        return (numpy.count_nonzero(diff) >= min_changed_pixels)
+        changes = self.getChangedRegions(screen_state, current_state)
+        return sum(change.getChangedPixels() for change in changes) >= min_changed_pixels
+    def getChangedRegions(self, screen_state, current_state=None):
+        """ Returns a list of ChangedRegions covering the pixels that differ between
+        ``screen_state`` and the current state (one per area of change).
+
+        If ``current_state`` is not provided, the region is captured. The screen is
+        compared in tiles of ``Settings.ChangeTileSize`` pixels, so each ChangedRegion
+        is aligned to that grid; ``getChangedPixels()`` is the exact number of pixels
+        that changed inside it.
+        """
+        if current_state is None:
+            r = self.clipRegionToScreen()
+            current_state = r.getBitmap()
+        if screen_state.shape != current_state.shape:
+            # The region was resized (or clipped differently): everything changed
+            return [ChangedRegion((self.x, self.y, self.w, self.h), self.w * self.h)]
+        return [
+            ChangedRegion((self.x + x, self.y + y, w, h), changed_pixels)
+            for (x, y, w, h), changed_pixels
+            in findChanges(screen_state, current_state, Settings.ChangeTileSize)]
 
     def observe(self, seconds=None):
         """ Begins the observer loop (synchronously).
@@ -1675,26 +2067,69 @@ class Region(object):
         # Check if observer is already running
         if self._observer.isRunning:
             return False # Could not start
-
-        # Set timeout
-        if seconds is not None:
-            timeout = time.time() + seconds
-        else:
-            timeout = None
-
-        # Start observe loop
-        while (not self._observer.isStopped) and (seconds is None or time.time() < timeout):
-            # Check registered events
-            self._observer.check_events()
-            # Sleep for scan rate
-            time.sleep(1/self.getObserveScanRate())
+        self._observer.isStopped = False
+        self._observeLoop(seconds)
         return True
+    def _observeLoop(self, seconds=None, dispatch=None, shared_frames=None):
+        """ Runs the observer loop until ``seconds`` pass or the observer is stopped.
+
+        ``dispatch(handler, event)``, if provided, is used to call event handlers.
+        If ``shared_frames`` (the name of a SharedFrames block) is provided, frames are
+        read from there instead of being captured.
+        """
+        self._observer.isRunning = True
+        subscriber = FrameSubscriber(shared_frames) if shared_frames else None
+        last_seq = None
+        try:
+            # Set timeout
+            if seconds is not None:
+                timeout = time.monotonic() + seconds
+            else:
+                timeout = None
+
+            # Start observe loop
+            while (not self._observer.isStopped) and (seconds is None or time.monotonic() < timeout):
+                started = time.monotonic()
+                bitmap = None
+                if subscriber is not None:
+                    frame = subscriber.latest()
+                    if frame is not None and frame.seq != last_seq:
+                        bitmap = frame.crop(self.clipRegionToScreen().getTuple())
+                        if bitmap is not None:
+                            # Copied, so the producer can't overwrite it mid-match; if
+                            # it already started to, the copy is torn and is dropped
+                            bitmap = bitmap.copy()
+                            if not subscriber.isCurrent(frame.seq):
+                                bitmap = None
+                        last_seq = frame.seq
+                # Check registered events (on a new shared frame, if there is one)
+                if subscriber is None or bitmap is not None:
+                    self._observer.check_events(bitmap, dispatch=dispatch)
+                # Sleep for scan rate (returns early if the observer is stopped)
+                delay = started + 1/self.getObserveScanRate() - time.monotonic()
+                if timeout is not None:
+                    delay = min(delay, timeout - time.monotonic())
+                self._observer.wait_for_stop(max(0, delay))
+        finally:
+            self._observer.isRunning = False
+            if subscriber is not None:
+                subscriber.close()
     def getObserveScanRate(self):
         """ Gets the number of times per second the observe loop should run """
         return self._observeScanRate if self._observeScanRate is not None else Settings.ObserveScanRate
     def setObserveScanRate(self, scan_rate):
         """ Set the number of times per second the observe loop should run """
         self._observeScanRate = scan_rate
+    def getObservePriority(self):
+        """ Gets the priority of this region's background observer """
+        return self._observePriority
+    def setObservePriority(self, priority):
+        """ Sets the priority of this region's background observer.
+
+        When several background observers are due at the same time, those with a higher
+        priority have their events checked (and handlers dispatched) first.
+        """
+        self._observePriority = priority
     def getRepeatWaitTime(self):
         """ Gets the wait time before repeating a search """
         return self._repeatWaitTime
@@ -1702,26 +2137,54 @@ class Region(object):
         """ Sets the wait time before repeating a search """
         self._repeatWaitTime = wait_time
     def observeInBackground(self, seconds=None):
-        """ As Region.observe(), but runs in a background process, allowing the rest
+        """ As Region.observe(), but runs in the background, allowing the rest
         of your script to continue.
 
-        Note that the subprocess operates on *copies* of the usual objects, not the original
-        Region object itself for example. If your event handler needs to share data with your
-        main process, check out the documentation for the ``multiprocessing`` module to set up
-        shared memory.
+        By default (``Settings.ObserveInBackgroundMode = "thread"``) the region is added
+        to a scheduler that runs all background observers from one thread: handlers can
+        share state with the rest of your script, ``stopObserver()`` stops it, and caught
+        events are available from ``getEvents()``. Regions that are due at the same time
+        share screen captures, so observing many regions doesn't mean capturing the
+        screen once per region. Handlers run on a shared worker pool
+        (``Settings.ObserveHandlerWorkers`` threads), so a slow handler doesn't hold up
+        scanning. See also ``setObservePriority()``.
+
+        With ``Settings.ObserveInBackgroundMode = "process"``, the observer runs in a
+        subprocess instead. Note that the subprocess operates on *copies* of the usual
+        objects, not the original Region object itself for example. If your event handler
+        needs to share data with your main process, check out the documentation for the
+        ``multiprocessing`` module to set up shared memory. Unless
+        ``Settings.ObserveSharedFrames`` is False (or on Python < 3.8), observer
+        subprocesses don't capture the screen themselves: the main process captures once
+        for all of them and shares the frames through shared memory.
         """
         if self._observer.isRunning:
             return False
-        self._observer_process = multiprocessing.Process(target=self.observe, args=(seconds,))
-        self._observer_process.start()
+        self._observer.isStopped = False
+        if Settings.ObserveInBackgroundMode == "process":
+            # The stop signal has to reach the subprocess
+            self._observer.use_process_stop_signal()
+            if Settings.ObserveSharedFrames and sharedFramesAvailable():
+                producer = _getFrameProducer()
+                process = multiprocessing.Process(target=self._observeLoop, args=(seconds, None, producer.getName()))
+                process.start()
+                producer.register(process, self.clipRegionToScreen().getTuple(), self.getObserveScanRate())
+            else:
+                process = multiprocessing.Process(target=self._observeLoop, args=(seconds,))
+                process.start()
+            self._observer_process = process
+        else:
+            _getObserverScheduler().register(self, seconds)
         return True
     def stopObserver(self):
         """ Stops this region's observer loop.
 
-        If this is running in a subprocess, the subprocess will end automatically.
+        If this is running in the background (thread or subprocess), it stops after the
+        current pass.
         """
         self._observer.isStopped = True
-        self._observer.isRunning = False
+        if _observerScheduler is not None:
+            _observerScheduler.unregister(self)
 
     def hasObserver(self):
         """ Check whether at least one event is registered for this region.
@@ -1734,30 +2197,24 @@ class Region(object):
         return self._observer.isRunning
     def hasEvents(self):
         """ Check whether any events have been caught for this region """
-        return len(self._observer.caught_events) > 0
+        return self._observer.has_caught_events()
     def getEvents(self):
         """ Returns a list of all events that have occurred.
 
         Empties the internal queue.
         """
-        caught_events = self._observer.caught_events
-        self._observer.caught_events = []
+        caught_events = self._observer.pop_events()
         for event in caught_events:
-            self._observer.activate_event(event["name"])
+            self._observer.activate_event(event.getName())
         return caught_events
     def getEvent(self, name):
         """ Returns the named event.
 
         Removes it from the internal queue.
         """
-        to_return = None
-        for event in self._observer.caught_events:
-            if event["name"] == name:
-                to_return = event
-                break
+        to_return = self._observer.pop_event(name)
         if to_return:
-            self._observer.caught_events.remove(to_return)
-            self._observer.activate_event(to_return["name"])
+            self._observer.activate_event(to_return.getName())
         return to_return
     def setInactive(self, name):
         """ The specified event is ignored until reactivated
@@ -1864,17 +2321,75 @@ class Observer(object):
         self._supported_events = ("APPEAR", "VANISH", "CHANGE")
         self._region = region
         self._events = {}
-        self.isStopped = False
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
         self.isRunning = False
         self.caught_events = []
+        # Timing of the last check_events() pass, in milliseconds
+        self.last_capture_time = 0
+        self.last_tick_time = 0
+
+    def __getstate__(self):
+        # Subprocess observers get their own lock (and stop signal, unless it's
+        # already a process-safe one)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        if isinstance(self._stop_event, threading.Event):
+            del state["_stop_event"]
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        if "_stop_event" not in state:
+            self._stop_event = threading.Event()
+
+    @property
+    def isStopped(self):
+        return self._stop_event.is_set()
+    @isStopped.setter
+    def isStopped(self, value):
+        if value:
+            self._stop_event.set()
+        else:
+            self._stop_event.clear()
+    def wait_for_stop(self, seconds):
+        """ Sleeps for ``seconds``, or until the observer is stopped """
+        return self._stop_event.wait(seconds)
+    def use_process_stop_signal(self):
+        """ Switches to a stop signal that also reaches observer subprocesses """
+        stopped = self.isStopped
+        self._stop_event = multiprocessing.Event()
+        self.isStopped = stopped
+
+    def push_event(self, event):
+        """ Adds a caught event to the queue """
+        with self._lock:
+            self.caught_events.append(event)
+    def pop_events(self):
+        """ Removes and returns all caught events """
+        with self._lock:
+            caught_events = self.caught_events
+            self.caught_events = []
+        return caught_events
+    def pop_event(self, name):
+        """ Removes and returns the first caught event with the given name (or None) """
+        with self._lock:
+            for event in self.caught_events:
+                if event.getName() == name:
+                    self.caught_events.remove(event)
+                    return event
+        return None
+    def has_caught_events(self):
+        with self._lock:
+            return len(self.caught_events) > 0
 
     def inactivate_event(self, name):
         if name in self._events:
-            self._events[name].active = False
+            self._events[name]["active"] = False
 
     def activate_event(self, name):
         if name in self._events:
-            self._events[name].active = True
+            self._events[name]["active"] = True
 
     def has_events(self):
         return len(self._events) > 0
@@ -1901,63 +2416,144 @@ class Observer(object):
             "name": uuid.uuid4(),
             "active": True
         }
+        if event_type != "CHANGE":
+            # Load the needle once, rather than on every check
+            event["needle"] = self._region._getPattern(pattern)
         self._events[event["name"]] = event
         return event["name"]
 
-    def check_events(self):
-        for event_name in self._events.keys():
-            event = self._events[event_name]
-            if not event["active"]:
+    def check_events(self, bitmap=None, dispatch=None):
+        """ Checks all active events once against a single capture of the region.
+
+        If ``bitmap`` is provided, it is used instead of capturing the region. Events
+        are evaluated in parallel if ``Settings.ObserveWorkers`` is more than 1.
+        If ``dispatch(handler, event)`` is provided, it is used to call handlers.
+
+        Returns a list of the events that fired.
+        """
+        tick_start = time.time()
+        if bitmap is None:
+            r = self._region.clipRegionToScreen()
+            if r is None:
+                raise ValueError("Region outside all visible screens")
+            bitmap = r.getBitmap()
+        capture_end = time.time()
+
+        active = [event for event in list(self._events.values()) if event["active"]]
+        if Settings.ObserveWorkers > 1 and len(active) > 1:
+            results = list(_getObserverPool().map(lambda event: self._evaluate(event, bitmap), active))
+        else:
+            results = [self._evaluate(event, bitmap) for event in active]
+
+        fired = []
+        for event, (caught, match) in zip(active, results):
+            if not caught:
                 continue
-            event_type = event["event_type"]
-            pattern = event["pattern"]
             handler = event["handler"]
-            if event_type == "APPEAR" and self._region.exists(event["pattern"], 0):
-                # Call the handler with a new ObserveEvent object
-                appear_event = ObserveEvent(self._region,
-                                            count=event["count"],
-                                            pattern=event["pattern"],
-                                            event_type=event["event_type"])
-                if callable(handler):
-                    handler(appear_event)
-                self.caught_events.append(appear_event)
-                event["count"] += 1
-                # Event handlers are inactivated after being caught once
-                event["active"] = False
-            elif event_type == "VANISH" and not self._region.exists(event["pattern"], 0):
-                # Call the handler with a new ObserveEvent object
-                vanish_event = ObserveEvent(self._region,
-                                            count=event["count"],
-                                            pattern=event["pattern"],
-                                            event_type=event["event_type"])
-                if callable(handler):
-                    handler(vanish_event)
+            # Call the handler with a new ObserveEvent object
+            observe_event = ObserveEvent(self._region,
+                                         count=event["count"],
+                                         pattern=event["pattern"],
+                                         match=match,
+                                         event_type=event["event_type"],
+                                         name=event["name"])
+            fired.append(observe_event)
+            if callable(handler):
+                if dispatch is not None:
+                    dispatch(handler, observe_event)
                 else:
-                    self.caught_events.append(vanish_event)
-                event["count"] += 1
-                # Event handlers are inactivated after being caught once
-                event["active"] = False
+                    handler(observe_event)
+            if event["event_type"] == "APPEAR" or not callable(handler):
+                self.push_event(observe_event)
+            event["count"] += 1
+            # Event handlers are inactivated after being caught once
+            event["active"] = False
+
+        self.last_capture_time = (capture_end - tick_start) * 1000
+        self.last_tick_time = (time.time() - tick_start) * 1000
+        Debug.log(3, "Observer checked {} event(s) in {:.1f} ms (capture {:.1f} ms)".format(
+            len(active),
+            self.last_tick_time,
+            self.last_capture_time))
+        return fired
+
+    def _evaluate(self, event, bitmap):
+        """ Checks a single event against ``bitmap``. Returns a tuple of
+        ``(caught, match)``, where ``match`` is the ``Match`` found (if any), or the
+        list of ChangedRegions for a CHANGE event. """
+        event_type = event["event_type"]
+        if event_type == "CHANGE":
             # For a CHANGE event, ``pattern`` is a tuple of
             # (min_pixels_changed, original_region_state)
-            elif event_type == "CHANGE" and self._region.isChanged(*event["pattern"]):
-                # Call the handler with a new ObserveEvent object
-                change_event = ObserveEvent(self._region,
-                                            count=event["count"],
-                                            pattern=event["pattern"],
-                                            event_type=event["event_type"])
-                if callable(handler):
-                    handler(change_event)
-                else:
-                    self.caught_events.append(change_event)
-                event["count"] += 1
-                # Event handlers are inactivated after being caught once
-                event["active"] = False
+            min_changed_pixels, screen_state = event["pattern"]
+            changes = self._region.getChangedRegions(screen_state, bitmap)
+            changed_pixels = sum(change.getChangedPixels() for change in changes)
+            return (changed_pixels >= min_changed_pixels, changes)
+        needle = event["needle"]
+        if needle.isImagePattern():
+            found = self._region._matchPattern(bitmap, needle)
+        else:
+            found = TextOCR.find_in_image(bitmap, needle.path, profile=self._region._ocrProfile)
+        match = None
+        if found:
+            position, confidence = found
+            match = Match(
+                confidence,
+                needle.offset,
+                ((position[0] + self._region.x, position[1] + self._region.y), (position[2], position[3])))
+        if event_type == "APPEAR":
+            return (match is not None, match)
+        return (match is None, None) # VANISH
+
+_handlerPool = None
+def _dispatchHandler(handler, event):
+    """ Calls an observer event handler on the shared handler pool """
+    global _handlerPool
+    if _handlerPool is None:
+        _handlerPool = ThreadPoolExecutor(max_workers=Settings.ObserveHandlerWorkers)
+    _handlerPool.submit(handler, event).add_done_callback(_logHandlerError)
+def _logHandlerError(future):
+    if future.exception() is not None:
+        Debug.error("Observer event handler failed: {!r}".format(future.exception()))
+
+_observerScheduler = None
+def _getObserverScheduler():
+    """ Returns the scheduler that runs all background observers """
+    global _observerScheduler
+    if _observerScheduler is None:
+        _observerScheduler = ObserverScheduler(PlatformManager.getBitmapFromRect, _dispatchHandler)
+    return _observerScheduler
+
+_frameProducer = None
+def _getFrameProducer():
+    """ Returns the producer that shares screen captures with observer subprocesses """
+    global _frameProducer
+    if _frameProducer is None:
+        # Big enough for the whole virtual screen (in BGRA)
+        screens = [screen["rect"] for screen in PlatformManager.getScreenDetails()]
+        x1 = min(rect[0] for rect in screens)
+        y1 = min(rect[1] for rect in screens)
+        x2 = max(rect[0] + rect[2] for rect in screens)
+        y2 = max(rect[1] + rect[3] for rect in screens)
+        publisher = FramePublisher((x2 - x1) * (y2 - y1) * 4, Settings.SharedFrameSlots)
+        atexit.register(publisher.close)
+        _frameProducer = SharedFrameProducer(PlatformManager.getBitmapFromRect, publisher)
+    return _frameProducer
+
+_observerPool = None
+def _getObserverPool():
+    """ Returns the thread pool used to evaluate observer events in parallel """
+    global _observerPool
+    if _observerPool is None:
+        _observerPool = ThreadPoolExecutor(max_workers=Settings.ObserveWorkers)
+    return _observerPool
 
 
 class ObserveEvent(object):
-    def __init__(self, region=None, count=0, pattern=None, match=None, event_type="GENERIC"):
+    def __init__(self, region=None, count=0, pattern=None, match=None, event_type="GENERIC", name=None):
         self._valid_types = ["APPEAR", "VANISH", "CHANGE", "GENERIC", "FINDFAILED", "MISSING"]
         self._type = event_type
+        self._name = name
         self._region = region
         self._pattern = pattern
         self._match = match
@@ -1995,6 +2591,7 @@ class ObserveEvent(object):
             raise ValueError("This event's match was not set!")
         return self._match
     def getChanges(self):
+        """ Returns the list of ChangedRegions that triggered a CHANGE event """
         valid_types = ["CHANGE"]
         if self._type not in valid_types:
             raise TypeError("This is a(n) {} event, but method getChanges is only valid for the following event types: ({})".format(self._type, ", ".join(valid_types)))
@@ -2003,6 +2600,9 @@ class ObserveEvent(object):
         return self._match
     def getCount(self):
         return self._count
+    def getName(self):
+        """ Returns the name (ID) of the registered event that produced this one """
+        return self._name
 class FindFailedEvent(ObserveEvent):
     def __init__(self, *args, **kwargs):
         ObserveEvent.__init__(self, *args, **kwargs)
@@ -2028,6 +2628,8 @@ class ImageMissingEvent(ObserveEvent):
         else:
             self._response = response
     def __repr__(self):
+        if isinstance(self._pattern, Pattern):
+            return self._pattern._path # Not .path, which would try to load the image again
         if hasattr(self._pattern, "path"):
             return self._pattern.path
         return self._pattern
@@ -2051,6 +2653,45 @@ class Match(Region):
     def __repr__(self):
         return "Match[{},{} {}x{}] score={:2f}, target={}".format(self.x, self.y, self.w, self.h, self._score, self._target.getTuple())
 
+class ChangedRegion(Region):
+    """ Extended Region object with the number of pixels that changed inside it """
+    def __init__(self, rect, changed_pixels):
+        super(ChangedRegion, self).__init__(*rect)
+        self._changedPixels = int(changed_pixels)
+
+    def getChangedPixels(self):
+        """ Returns the number of pixels in this region that changed """
+        return self._changedPixels
+
+    def __repr__(self):
+        return "ChangedRegion[{},{} {}x{}] changed={}".format(self.x, self.y, self.w, self.h, self._changedPixels)
+
+class TextChange(object):
+    """ An update yielded by ``Region.textChanges()`` """
+    def __init__(self, text, previous_text, timestamp, dropped=0):
+        self._text = text
+        self._previousText = previous_text
+        self._time = timestamp
+        self._dropped = dropped
+
+    def getText(self):
+        """ Returns the region's new text """
+        return self._text
+    def getPreviousText(self):
+        """ Returns the text before this change (None for the first update). If updates
+        were dropped, this is the text of the last dropped one. """
+        return self._previousText
+    def getTime(self):
+        """ Returns the time (as ``time.time()``) the capture was taken """
+        return self._time
+    def getDropped(self):
+        """ Returns the number of updates dropped (because the backlog was full) since
+        the previous update was yielded """
+        return self._dropped
+
+    def __repr__(self):
+        return "TextChange[{!r}]".format(self._text)
+
 class Screen(Region):
     """ Individual screen objects can be created for each monitor in a multi-monitor system.
 
@@ -1,6 +1,7 @@
 """ Defines Settings and Debug objects """
 import datetime
 import os
+import warnings
 import __main__
 
 from io import open # For Python 2 native line endings compatibility
@@ -154,7 +155,16 @@ class SettingsMaster(object):
     SlowMotionDelay = 3 # Extra duration of slowed-down visual effects
     WaitScanRate = 3	# Searches per second
     ObserveScanRate = 3 # Searches per second (observers)
-    OberveMinChangedPixels = 50 # Threshold to trigger onChange() (not implemented yet)
+    ObserveWorkers = 1 # Threads used to check an observer's events (1 = one at a time)
+    ObserveInBackgroundMode = "thread" # observeInBackground() runs in a "thread" or "process"
+    ObserveHandlerWorkers = 4 # Threads used to run event handlers for background observers
+    ObserveSharedFrames = True # Observer subprocesses share the main process's captures
+    SharedFrameSlots = 3 # Frames kept in shared memory for observer subprocesses
+    ObserveMinChangedPixels = 50 # Threshold to trigger onChange() (changed pixels, not channel values)
+    MatchCacheSize = 64 # Search results kept for unchanged frames (0 to disable)
+    ChangeGatedWaits = True # Skip searching in wait loops when the region hasn't changed
+    RematchChangedTilesOnly = True # In wait loops, only search the parts that changed
+    ChangeTileSize = 32 # Tile size (pixels) for detecting changed areas
 
     ## Keyboard/Mouse Settings
     MoveMouseDelay = 0.3 # Time to take moving mouse to target location
@@ -174,6 +184,15 @@ class SettingsMaster(object):
     except AttributeError:
         BundlePath = os.path.dirname(os.path.abspath(os.getcwd()))
     ImagePaths = []
+    ImageIndexRecheckInterval = 1.0 # Seconds between checks for changes to the image directories
+    ImageCacheSize = 128 # Megabytes of decoded pattern images kept in memory (0 to disable)
+    PatternPreloadWorkers = None # Threads used by preloadPatterns() and prewarm() (None = one per CPU)
+    PrewarmImports = True # Load the images referenced by imported .sikuli scripts in the background
+    HttpImageCachePath = None # Where images from http(s) image paths are cached (None = "lackey-images" in the temp directory)
+    HttpImageRevalidateInterval = 60 # Seconds a downloaded image is used before checking the server for a newer one
+    HttpImageTimeout = 10 # Seconds to wait for an image server
+    HttpImageWorkers = 8 # Parallel downloads (and pooled connections) per image server
+    HttpImageManifest = "manifest.txt" # List of images downloaded by prefetchImages()
     OcrDataPath = None
 
     ## Popup settings
@@ -181,6 +200,27 @@ class SettingsMaster(object):
 
     ## OCR Settings
     SwitchToText = False
+    OcrBackend = "tesserocr" # "tesserocr" (in-process, falls back to pytesseract if not installed) or "pytesseract"
+    OcrLanguage = "eng"
+    OcrCacheSize = 16 # OCR results kept for unchanged frames (0 to disable)
+    OcrWorkers = None # Threads used to OCR several cells/areas at once (None = one per CPU)
+    OcrProfile = None # Default OcrProfile for preprocessing captures before OCR (None = no preprocessing)
+    OcrMinConfidence = 0 # Text searches ignore words OCR'd with a lower confidence (0-1; 0 keeps every word)
+    OcrDetectionMinArea = None # If set, captures of at least this many pixels are OCR'd only where text is detected (e.g. 1000000)
+    OcrRereadMaxFraction = 0.5 # In text wait loops, re-read only changed lines unless more than this fraction changed
+    TextChangesBacklog = 16 # Updates kept by Region.textChanges() for a slow consumer
+
+    # Deprecated names
+
+    @property
+    def OberveMinChangedPixels(self):
+        """ Deprecated (misspelled) alias of ObserveMinChangedPixels """
+        warnings.warn("Please use ObserveMinChangedPixels instead.", DeprecationWarning)
+        return self.ObserveMinChangedPixels
+    @OberveMinChangedPixels.setter
+    def OberveMinChangedPixels(self, value):
+        warnings.warn("Please use ObserveMinChangedPixels instead.", DeprecationWarning)
+        self.ObserveMinChangedPixels = value
 
     # Environment methods
 
@@ -0,0 +1,195 @@
+""" Shares screen captures with observer subprocesses
+
+Process-based observers (``Settings.ObserveInBackgroundMode = "process"``) would
+otherwise each capture the screen on their own. Instead, one producer thread in the
+main process captures the area covered by all of them and publishes each frame into
+a ``multiprocessing.shared_memory`` block. The subprocesses map the latest frame as
+a read-only numpy array, without copying it.
+
+The block holds a few frame slots, used in turn. A frame stays valid until the
+producer comes back around to its slot (``Settings.SharedFrameSlots - 1`` frames
+later); ``FrameSubscriber.isCurrent()`` tells a reader whether that has happened.
+
+``multiprocessing.shared_memory`` is new in Python 3.8. It's only imported when a
+block is created or attached, so lackey still imports on older versions; there,
+``isAvailable()`` returns False and observer subprocesses capture for themselves.
+"""
+import threading
+import time
+import numpy
+
+from .Capture import cropRect
+from .SettingsDebug import Debug
+
+_PREFIX_FIELDS = 3 # latest seq, slot count, bytes per slot
+_HEADER_FIELDS = 6 # seq, x, y, w, h, channels
+_WRITING = -1
+
+def isAvailable():
+    """ Returns True if frames can be shared (``multiprocessing.shared_memory`` exists) """
+    try:
+        from multiprocessing import shared_memory #pylint: disable=unused-import
+    except ImportError:
+        return False
+    return True
+
+class _SharedLayout(object):
+    """ Numpy views over a shared memory block: the latest sequence number and the
+    block's geometry, one header per slot, and the slot buffers """
+    def __init__(self, shm, slots=None, slot_bytes=None):
+        self.shm = shm
+        self.prefix = numpy.ndarray((_PREFIX_FIELDS,), dtype=numpy.int64, buffer=shm.buf)
+        if slots is None:
+            slots, slot_bytes = int(self.prefix[1]), int(self.prefix[2])
+        else:
+            self.prefix[:] = (0, slots, slot_bytes)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.headers = numpy.ndarray((slots, _HEADER_FIELDS), dtype=numpy.int64, buffer=shm.buf, offset=_PREFIX_FIELDS * 8)
+        self.data_offset = (_PREFIX_FIELDS + slots * _HEADER_FIELDS) * 8
+
+    @staticmethod
+    def size(slots, slot_bytes):
+        return (_PREFIX_FIELDS + slots * _HEADER_FIELDS) * 8 + slots * slot_bytes
+    def slotArray(self, slot, shape):
+        return numpy.ndarray(
+            shape,
+            dtype=numpy.uint8,
+            buffer=self.shm.buf,
+            offset=self.data_offset + slot * self.slot_bytes)
+    def release(self):
+        # The views have to go before the block can be closed
+        self.prefix = self.headers = None
+
+class FramePublisher(object):
+    """ Owns the shared memory block and writes frames into it
+
+    ``max_bytes`` is the size of the largest frame that will be published.
+    """
+    def __init__(self, max_bytes, slots=3):
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=_SharedLayout.size(slots, max_bytes))
+        self._layout = _SharedLayout(shm, slots, max_bytes)
+        self._layout.headers[:, 0] = 0
+
+    def getName(self):
+        """ Returns the name subprocesses use to attach a FrameSubscriber """
+        return self._layout.shm.name
+    def publish(self, frame, rect):
+        """ Copies ``frame`` (captured at the ``(x, y, w, h)`` rectangle ``rect``) into the
+        next slot and returns its sequence number """
+        layout = self._layout
+        if frame.nbytes > layout.slot_bytes:
+            raise ValueError("Frame of {} bytes is larger than the shared buffer ({} bytes)".format(frame.nbytes, layout.slot_bytes))
+        seq = int(layout.prefix[0]) + 1
+        slot = seq % layout.slots
+        header = layout.headers[slot]
+        header[0] = _WRITING
+        channels = 1 if frame.ndim == 2 else frame.shape[2]
+        layout.slotArray(slot, (frame.shape[0], frame.shape[1], channels))[...] = frame.reshape(frame.shape[0], frame.shape[1], channels)
+        header[1:] = (rect[0], rect[1], frame.shape[1], frame.shape[0], channels)
+        header[0] = seq
+        layout.prefix[0] = seq
+        return seq
+    def close(self):
+        """ Frees the shared memory block """
+        shm = self._layout.shm
+        self._layout.release()
+        shm.close()
+        shm.unlink()
+
+class SharedFrame(object):
+    """ A frame read from shared memory: ``seq``, its ``(x, y, w, h)`` ``rect`` and a
+    read-only ``bitmap`` """
+    def __init__(self, seq, rect, bitmap):
+        self.seq = seq
+        self.rect = rect
+        self.bitmap = bitmap
+
+    def crop(self, rect):
+        """ Returns the part of the frame covered by ``rect``, or None if the frame
+        doesn't cover all of it """
+        x, y, w, h = self.rect
+        if rect[0] < x or rect[1] < y or rect[0] + rect[2] > x + w or rect[1] + rect[3] > y + h:
+            return None
+        return cropRect(self.bitmap, self.rect, rect)
+
+class FrameSubscriber(object):
+    """ Attaches to a FramePublisher's block (by name), typically in a subprocess """
+    def __init__(self, name):
+        from multiprocessing import shared_memory
+        self._layout = _SharedLayout(shared_memory.SharedMemory(name=name))
+
+    def latest(self):
+        """ Returns the most recent SharedFrame, or None if nothing was published yet """
+        layout = self._layout
+        seq = int(layout.prefix[0])
+        if seq == 0:
+            return None
+        header = layout.headers[seq % layout.slots]
+        if header[0] != seq:
+            return None # Overwritten since; the caller will try again on its next tick
+        x, y, w, h, channels = (int(value) for value in header[1:])
+        bitmap = layout.slotArray(seq % layout.slots, (h, w, channels))
+        if channels == 1:
+            bitmap = bitmap.reshape(h, w)
+        bitmap.flags.writeable = False
+        return SharedFrame(seq, (x, y, w, h), bitmap)
+    def isCurrent(self, seq):
+        """ Returns True if the frame ``seq`` hasn't been overwritten yet """
+        return int(self._layout.headers[seq % self._layout.slots][0]) == seq
+    def close(self):
+        shm = self._layout.shm
+        self._layout.release()
+        shm.close()
+
+class SharedFrameProducer(object):
+    """ Captures and publishes frames for observer subprocesses
+
+    Each subprocess is registered with the rectangle it observes and its scan rate.
+    While any of them is alive, a background thread captures the rectangle around all
+    of them (once) at the fastest of their scan rates.
+    """
+    def __init__(self, grab, publisher):
+        self._grab = grab
+        self._publisher = publisher
+        self._entries = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._captures = 0
+
+    def getName(self):
+        """ Returns the name of the shared memory block frames are published to """
+        return self._publisher.getName()
+    def getCaptureCount(self):
+        """ Returns the number of frames captured and published """
+        return self._captures
+    def register(self, process, rect, scan_rate):
+        """ Publishes frames covering ``rect`` for as long as ``process`` is alive """
+        with self._lock:
+            self._entries.append((process, tuple(rect), scan_rate))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="lackey-frame-producer")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._entries = [entry for entry in self._entries if entry[0].is_alive()]
+                if not self._entries:
+                    self._thread = None
+                    return
+                rects = [rect for _, rect, _ in self._entries]
+                interval = 1.0 / max(scan_rate for _, _, scan_rate in self._entries)
+            started = time.monotonic()
+            x = min(rect[0] for rect in rects)
+            y = min(rect[1] for rect in rects)
+            w = max(rect[0] + rect[2] for rect in rects) - x
+            h = max(rect[1] + rect[3] for rect in rects) - y
+            try:
+                self._publisher.publish(self._grab(x, y, w, h), (x, y, w, h))
+                self._captures += 1
+            except Exception as e:
+                Debug.error("Could not publish frame for observers: {!r}".format(e))
+            time.sleep(max(0, started + interval - time.monotonic()))
@@ -4,6 +4,7 @@ import numpy
 import cv2
 
 from .SettingsDebug import Debug
+from .ImageCache import DecodedImages, PYRAMID_LEVELS
 
 class NaiveTemplateMatcher(object):
     """ Python wrapper for OpenCV's TemplateMatcher 
@@ -85,7 +86,13 @@ class PyramidTemplateMatcher(object):
         *Developer's Note - Despite the name, this method actually returns the **first** result
         with enough similarity, not the **best** result.*
         """
-        needle = cv2.cvtColor(needle, cv2.COLOR_BGR2GRAY) # Convert to grayscale
+        levels = PYRAMID_LEVELS
+        # Patterns loaded from files share a cached grayscale pyramid
+        needle_pyramid = DecodedImages.getPyramid(needle, levels)
+        if needle_pyramid is not None:
+            needle = needle_pyramid[-1]
+        else:
+            needle = cv2.cvtColor(needle, cv2.COLOR_BGR2GRAY) # Convert to grayscale
         haystack = self.haystack
         # Check if haystack or needle are a solid color - if so, switch to SQDIFF_NORMED
 
@@ -97,12 +104,13 @@ class PyramidTemplateMatcher(object):
                 # Invert needle & haystack before matching
                 needle = numpy.invert(needle)
                 haystack = numpy.invert(haystack)
+                needle_pyramid = None
         else:
             #print("Not Solid color, using CCOEFF")
             method = cv2.TM_CCOEFF_NORMED
 
-        levels = 3
-        needle_pyramid = self._build_pyramid(needle, levels)
+        if needle_pyramid is None:
+            needle_pyramid = self._build_pyramid(needle, levels)
         # Needle will be smaller than haystack, so may not be able to create
         # ``levels`` smaller versions of itself. If not, create only as many
         # levels for ``haystack`` as we could for ``needle``.
@@ -0,0 +1,46 @@
+""" Finds areas of an image that look like text
+
+A full screen is mostly images, icons and empty space, and Tesseract spends most of its
+time there. This proposes boxes around text-like areas (dense, short, horizontally
+aligned edges) without any model, so OCR can run on just those boxes.
+"""
+import numpy
+import cv2
+
+def findTextRegions(image, margin=4, min_height=6, max_height=120, min_fill=0.2):
+    """ Returns a list of ``(x, y, w, h)`` boxes around text-like areas of ``image``,
+    in reading order (top to bottom, then left to right).
+
+    Characters are found by their edges (a morphological gradient), then joined
+    horizontally into words and lines. Components that are too small, too tall or
+    too sparse to be text are dropped. Each box is grown by ``margin`` pixels, and
+    boxes that overlap are merged (into the box around both).
+    """
+    gray = image
+    if image.ndim == 3:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY if image.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Join the characters of a word (and the words of a line) into one component
+    joined = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3)))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+    boxes = []
+    for label in range(1, count):
+        x, y, w, h, _ = stats[label]
+        if h < min_height or h > max_height or w < min_height:
+            continue
+        if cv2.countNonZero(edges[y:y+h, x:x+w]) < min_fill * w * h:
+            continue
+        boxes.append((x - margin, y - margin, w + 2 * margin, h + 2 * margin))
+    return mergeBoxes(boxes, gray.shape)
+
+def mergeBoxes(boxes, shape):
+    """ Clips ``(x, y, w, h)`` boxes to ``shape`` and merges overlapping ones (into the
+    box around them). Returns the boxes in reading order. """
+    # The boxes are drawn on a mask; overlapping ones become one component
+    mask = numpy.zeros(shape[:2], dtype=numpy.uint8)
+    for x, y, w, h in boxes:
+        mask[max(0, y):max(0, y + h), max(0, x):max(0, x + w)] = 255
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=4)
+    boxes = [tuple(int(value) for value in stats[label][:4]) for label in range(1, count)]
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
@@ -0,0 +1,75 @@
+""" Scheduling for polling loops (find, wait, waitVanish and their text variants) """
+import asyncio
+import math
+import time
+
+try:
+    getRunningLoop = asyncio.get_running_loop
+except AttributeError:
+    # Python 3.6: the same thing, when called from a coroutine
+    getRunningLoop = asyncio.get_event_loop
+
+class WaitEngine(object):
+    """ Repeats a probe at a fixed scan rate until it succeeds or a deadline passes
+
+    The time spent inside the probe (capturing and matching) counts towards the scan
+    interval, so a scan rate of 3 means a probe *starts* every 1/3 second rather than
+    1/3 second after the last one ended. The loop returns as soon as the probe succeeds
+    and never sleeps past the deadline.
+
+    ``clock`` and ``sleep`` default to ``time.monotonic`` and ``time.sleep``, and can be
+    replaced (e.g. with a fake clock in tests).
+    """
+    def __init__(self, clock=None, sleep=None):
+        self._clock = clock or time.monotonic
+        self._sleep = sleep or time.sleep
+
+    def run(self, probe, seconds, scan_rate, until=None):
+        """ Calls ``probe()`` until ``until(result)`` is true or ``seconds`` have passed.
+
+        ``until`` defaults to checking that the result is truthy. The probe always runs
+        at least once (so ``seconds=0`` is a single check), and runs one final time at
+        the deadline. Returns the last result of ``probe()``.
+        """
+        if until is None:
+            until = bool
+        deadline = self._clock() + seconds
+        interval = 1.0 / scan_rate
+        while True:
+            started = self._clock()
+            result = probe()
+            if until(result):
+                return result
+            now = self._clock()
+            if now >= deadline:
+                return result
+            # Sleep out the rest of this scan interval, but not past the deadline
+            self._sleep(max(0, min(started + interval, deadline) - now))
+
+    async def runAsync(self, probe, seconds, scan_rate, until=None):
+        """ Awaitable version of ``run()``; ``probe`` is a coroutine function.
+
+        Runs on the event loop's clock. After the first probe, probes start on a shared
+        grid of ticks (multiples of the scan interval), so concurrent waits with the same
+        scan rate wake up on the same loop iteration and can share a capture.
+        """
+        if until is None:
+            until = bool
+        loop = getRunningLoop()
+        deadline = loop.time() + seconds
+        interval = 1.0 / scan_rate
+        while True:
+            started = loop.time()
+            result = await probe()
+            if until(result):
+                return result
+            if loop.time() >= deadline:
+                return result
+            next_tick = (math.floor(started / interval) + 1) * interval
+            wake = loop.create_future()
+            loop.call_at(min(next_tick, deadline), _wake, wake)
+            await wake
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
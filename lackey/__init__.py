@@ -23,7 +23,7 @@ import sys
 import time
 import os
 import warnings
-import requests
+from concurrent.futures import ThreadPoolExecutor
 
 ## Lackey sub-files
 
@@ -31,11 +31,15 @@ import requests
 from .KeyCodes import Button, Key, KeyModifier
 from .RegionMatching import Pattern, Region, Match, Screen, ObserveEvent, PlatformManager, FOREVER
 from .Geometry import Location
+from .OcrProfile import OcrProfile
 from .InputEmulation import Mouse, Keyboard
 from .App import App
 from .Exceptions import FindFailed, ImageMissing
 from .SettingsDebug import Debug, Settings, DebugMaster, SettingsMaster
 from .SikuliGui import PopupInput, PopupList, PopupTextarea
+from .ImageResolver import ImageIndex
+from .ImageRepository import getImageRepository
+from .Prewarm import prewarm
 from ._version import __version__
 
 from . import ImportHandler
@@ -105,6 +109,7 @@ def setBundlePath(path):
     """ Convenience function. Changes the path of the \\*.sikuli bundle. """
     if os.path.exists(path):
         Settings.BundlePath = path
+        ImageIndex.invalidate()
     else:
         raise OSError("File not found: " + path)
 def getImagePath():
@@ -113,21 +118,40 @@ def getImagePath():
 def addImagePath(new_path):
     """ Convenience function. Adds a path to the list of paths to search for images.
 
-    Can be a URL (but must be accessible). """
+    Can be a URL (but must be accessible). Images from a URL are downloaded when first
+    used and cached on disk (see `Settings.HttpImageCachePath`). """
     if os.path.exists(new_path):
         Settings.ImagePaths.append(new_path)
+        ImageIndex.invalidate()
     elif "http://" in new_path or "https://" in new_path:
-        request = requests.get(new_path)
-        if request.status_code < 400:
-            # Path exists
-            Settings.ImagePaths.append(new_path)
-        else:
-            raise OSError("Unable to connect to " + new_path)
+        getImageRepository(new_path).check()
+        Settings.ImagePaths.append(new_path)
     else:
         raise OSError("File not found: " + new_path)
 def addHTTPImagePath(new_path):
     """ Convenience function. Same as `addImagePath()`. """
     addImagePath(new_path)
+def prefetchImages(url, names=None):
+    """ Convenience function. Downloads the images `names` from the image path `url`
+    ahead of time, in parallel. If `names` is None, downloads every image in the
+    server's manifest (`Settings.HttpImageManifest`). Returns the number of images
+    available. """
+    return getImageRepository(url).prefetch(names)
+
+def preloadPatterns(patterns):
+    """ Convenience function. Loads the images of `patterns` (Patterns or filenames) now,
+    decoding them in parallel on `Settings.PatternPreloadWorkers` threads, instead of on
+    their first use.
+
+    Returns the list of Patterns. Raises ImageMissing (after the others are loaded) if
+    an image can't be found. """
+    patterns = [pattern if isinstance(pattern, Pattern) else Pattern(pattern) for pattern in patterns]
+    workers = Settings.PatternPreloadWorkers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(pattern.preload) for pattern in patterns]
+    for future in futures:
+        future.result() # Re-raises ImageMissing
+    return patterns
 
 def getParentPath():
     """ Convenience function. Returns the parent folder of the \\*.sikuli bundle. """
@@ -48,6 +48,7 @@ setup(
     keywords="automation testing sikuli",
     packages=find_packages(exclude=['docs', 'tests']),
     install_requires=install_requires,
+    extras_require={'tesserocr': ['tesserocr']},
     include_package_data=True,
     distclass=BinaryDistribution
 )
@@ -1,11 +1,60 @@
+import asyncio
+import functools
 import inspect
+import shutil
 import subprocess
+import tempfile
+import threading
 import unittest
 import numpy
 import time
 import sys
 import os
+import pickle
 import lackey
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+def ocr_tsv(words):
+    """ Builds Tesseract TSV output from ``(block, line, left, top, width, height, conf,
+    text)`` rows """
+    from lackey.Ocr import _TSV_HEADER
+    rows = [
+        "5\t1\t{}\t1\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(block, line, number + 1, left, top, width, height, conf, text)
+        for number, (block, line, left, top, width, height, conf, text) in enumerate(words)]
+    # Non-word levels and empty words are skipped by the parser
+    return _TSV_HEADER + "1\t1\t0\t0\t0\t0\t0\t0\t640\t480\t-1\t\n" + "".join(rows) + "5\t1\t1\t1\t1\t9\t0\t0\t5\t5\t95\t \n"
+
+class FakeOcrBackend(object):
+    """ Records OCR calls. ``words(image)`` returns the words to report (as rows for
+    ``ocr_tsv()``); by default, one word: "42". """
+    def __init__(self, words=None):
+        self.calls = []
+        self.string_calls = []
+        self._words = words or (lambda image: [(1, 1, 2, 2, 10, 10, 90, "42")])
+    def image_to_data(self, image, psm=None, whitelist=None):
+        self.calls.append((image.shape[:2], psm, whitelist))
+        return ocr_tsv(self._words(image))
+    def image_to_string(self, image, psm=None, whitelist=None):
+        self.string_calls.append((image.shape[:2], psm, whitelist))
+        # Tesseract's own layout, ending with a form feed
+        return " ".join(word[-1] for word in self._words(image)) + "\n\f"
+
+class SettingsTestCase(unittest.TestCase):
+    """ Restores the Settings (and OCR backend) a test changes when it finishes """
+    def setSettings(self, **settings):
+        """ Changes ``Settings`` attributes for the rest of the test """
+        for name, value in settings.items():
+            self.addCleanup(setattr, lackey.Settings, name, getattr(lackey.Settings, name))
+            setattr(lackey.Settings, name, value)
+    def useOcrBackend(self, backend):
+        """ Reads text with ``backend`` (without preprocessing) for the rest of the test """
+        from lackey import Ocr
+        Ocr._backends["fake"] = backend
+        self.addCleanup(Ocr._backends.pop, "fake", None)
+        self.setSettings(OcrBackend="fake", OcrProfile=None)
+        Ocr.OcrCache.clear()
+        self.addCleanup(Ocr.OcrCache.clear)
+        return backend
 
 class TestMouseMethods(unittest.TestCase):
     def setUp(self):
@@ -93,6 +142,9 @@ class TestLocationMethods(unittest.TestCase):
         self.assertIsInstance(self.test_loc.getColor(), numpy.ndarray) # No color outside all screens, should return None
 
 
+def on_observed_event(event):
+    pass
+
 class TestPatternMethods(unittest.TestCase):
     def setUp(self):
         self.file_path = os.path.join("tests", "test_pattern.png")
@@ -115,6 +167,9 @@ class TestPatternMethods(unittest.TestCase):
         self.assertEqual(test_pattern.similarity, 0.7)
         self.assertEqual(test_pattern.path[-len(self.file_path):], self.file_path)
         self.assertEqual(test_pattern.offset.getTuple(), (3,5))
+        # Derived patterns share the decoded image
+        self.assertIs(test_pattern.getImage(), self.pattern.getImage())
+        self.assertIs(lackey.Pattern(self.file_path).getImage(), self.pattern.getImage())
 
     def test_getters(self):
         self.assertEqual(self.pattern.getFilename()[-len(self.file_path):], self.file_path)
@@ -128,8 +183,151 @@ class TestPatternMethods(unittest.TestCase):
         self.assertTrue(pattern_from_image.isImagePattern())
         with self.assertRaises(TypeError):
             lackey.Pattern(True)
+        # Missing images are reported when the pattern is first used (or preloaded)
+        missing_pattern = lackey.Pattern("non_existent_file.png")
+        self.assertFalse(missing_pattern.isLoaded())
+        with self.assertRaises(lackey.ImageMissing):
+            missing_pattern.preload()
         with self.assertRaises(lackey.ImageMissing):
-            lackey.Pattern("non_existent_file.png")
+            lackey.preloadPatterns([self.file_path, "non_existent_file.png"])
+
+    def test_lazy_loading(self):
+        pattern = lackey.Pattern(self.file_path)
+        self.assertFalse(pattern.isLoaded())
+        derived = pattern.similar(0.9)
+        self.assertFalse(derived.isLoaded())
+        self.assertTrue(derived.isValid())
+        self.assertTrue(derived.isLoaded())
+        preloaded = lackey.preloadPatterns([self.file_path, pattern])
+        self.assertTrue(all(p.isLoaded() for p in preloaded))
+        self.assertIs(preloaded[1], pattern)
+        self.assertFalse(lackey.Pattern("non_existent_file.png").isValid())
+
+    def test_pickle(self):
+        # Process-mode observers pickle the region with its event patterns
+        region = lackey.Region(0, 0, 100, 100)
+        region.onAppear(self.pattern, on_observed_event)
+        copied = pickle.loads(pickle.dumps(region))
+        copied_event = list(copied._observer._events.values())[0]
+        self.assertTrue(copied_event["pattern"].isValid())
+        self.assertTrue(copied_event["needle"].isValid())
+        self.pattern.preload()
+        self.assertEqual(pickle.loads(pickle.dumps(self.pattern)).getImage().shape, self.pattern.getImage().shape)
+
+class TestImageResolver(SettingsTestCase):
+    def setUp(self):
+        self.image_dir = tempfile.mkdtemp()
+        self.setSettings(ImagePaths=list(lackey.Settings.ImagePaths))
+        lackey.addImagePath(self.image_dir)
+
+    def tearDown(self):
+        lackey.ImageIndex.invalidate()
+        shutil.rmtree(self.image_dir)
+
+    def test_index(self):
+        self.setSettings(ImageIndexRecheckInterval=0)
+        self.assertIsNone(lackey.ImageIndex.resolve("resolver_test.png"))
+        image_file = os.path.join(self.image_dir, "resolver_test.png")
+        shutil.copy(os.path.join("tests", "test_pattern.png"), image_file)
+        # Picked up from the directory's new modification time
+        self.assertEqual(lackey.ImageIndex.resolve("resolver_test.png"), image_file)
+        self.assertEqual(lackey.Pattern("resolver_test.png").getFilename(), image_file)
+        stats = lackey.ImageIndex.getStats()
+        self.assertGreaterEqual(stats["found"], 2)
+        self.assertGreaterEqual(stats["missing"], 1)
+
+class TestDecodedImageCache(unittest.TestCase):
+    def setUp(self):
+        self.image_dir = tempfile.mkdtemp()
+        for name in ("first.png", "copy.png"):
+            shutil.copy(os.path.join("tests", "test_pattern.png"), os.path.join(self.image_dir, name))
+
+    def tearDown(self):
+        shutil.rmtree(self.image_dir)
+
+    def test_identical_files(self):
+        from lackey.ImageCache import DecodedImageCache
+        cache = DecodedImageCache()
+        first = cache.load(os.path.join(self.image_dir, "first.png"))
+        copy = cache.load(os.path.join(self.image_dir, "copy.png"))
+        # Same content: decoded once, and counted once
+        self.assertIs(first, copy)
+        stats = cache.getStats()
+        self.assertEqual(stats["images"], 1)
+        self.assertEqual(stats["bytes"], first.nbytes)
+        self.assertIs(cache.load(os.path.join(self.image_dir, "copy.png")), first)
+        self.assertEqual(cache.getStats()["hits"], 1)
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class TestHttpImagePath(SettingsTestCase):
+    def setUp(self):
+        self.served_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join("tests", "test_pattern.png"), os.path.join(self.served_dir, "http_pattern.png"))
+        with open(os.path.join(self.served_dir, "manifest.txt"), "w") as manifest:
+            manifest.write("http_pattern.png\n")
+        self.server = HTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=self.served_dir))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:{}/".format(self.server.server_port)
+        self.setSettings(ImagePaths=list(lackey.Settings.ImagePaths), HttpImageCachePath=self.cache_dir)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.served_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def test_fetch(self):
+        lackey.addImagePath(self.url)
+        pattern = lackey.Pattern("http_pattern.png")
+        self.assertTrue(pattern.getFilename().startswith(self.cache_dir))
+        self.assertTrue(pattern.isValid())
+        repository = lackey.ImageRepository.getImageRepository(self.url)
+        lackey.Pattern("http_pattern.png")
+        self.assertEqual(repository.getStats()["downloads"], 1) # Second lookup used the cache
+        self.setSettings(HttpImageRevalidateInterval=0)
+        self.assertEqual(lackey.prefetchImages(self.url), 1)
+        self.assertEqual(repository.getStats()["downloads"], 1) # Not modified
+        self.assertGreaterEqual(repository.getStats()["revalidations"], 1)
+
+class TestImageBundle(unittest.TestCase):
+    def setUp(self):
+        self.bundle_dir = tempfile.mkdtemp(suffix=".sikuli")
+        shutil.copy(os.path.join("tests", "test_pattern.png"), self.bundle_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.bundle_dir)
+
+    def test_compile(self):
+        from lackey.Bundle import compileBundle, getBundle
+        self.assertIsNone(getBundle(self.bundle_dir))
+        output, count = compileBundle(self.bundle_dir)
+        self.assertEqual(count, 1)
+        self.assertEqual(sorted(os.listdir(self.bundle_dir)), ["images.lkbundle", "test_pattern.png"])
+        # Not found before compiling, but the new file is picked up
+        self.assertEqual(getBundle(self.bundle_dir).path, output)
+        bundled = getBundle(self.bundle_dir).get("test_pattern.png")
+        decoded = lackey.Pattern(os.path.join("tests", "test_pattern.png")).getImage()
+        self.assertTrue(numpy.array_equal(bundled.image, decoded))
+        self.assertEqual(bundled.pyramid(3)[-1].shape, decoded.shape[:2])
+
+class TestPrewarm(unittest.TestCase):
+    def test_references(self):
+        from lackey.Prewarm import findImageReferences
+        source = "click(Pattern('a.png').similar(0.9))\nwait('b.PNG')\nfind(Pattern('c'))\ntype('hello')\n"
+        self.assertEqual(findImageReferences(source), ["a.png", "b.PNG", "c"])
+
+    def test_prewarm(self):
+        script = os.path.join("tests", "test_import.sikuli")
+        sys.path.append(os.path.abspath(script))
+        try:
+            futures = lackey.prewarm(script, wait=True)
+        finally:
+            sys.path.remove(os.path.abspath(script))
+        self.assertEqual([future.result() for future in futures], [True])
 
 class TestRegionMethods(unittest.TestCase):
     def setUp(self):
@@ -250,6 +448,496 @@ class TestRegionMethods(unittest.TestCase):
         self.r.setWaitScanRate(2)
         self.assertEqual(self.r.getWaitScanRate(), 2.0)
 
+class TestMatchCache(unittest.TestCase):
+    def setUp(self):
+        from lackey.MatchCache import MatchCache, frameFingerprint
+        self.cache = MatchCache(max_size=2)
+        self.frame = numpy.zeros((20, 30, 3), dtype=numpy.uint8)
+        self.fingerprint = frameFingerprint(self.frame)
+
+    def test_fingerprint(self):
+        from lackey.MatchCache import frameFingerprint
+        changed = self.frame.copy()
+        changed[10, 10, 0] = 1 # A single pixel
+        self.assertNotEqual(frameFingerprint(changed), self.fingerprint)
+        self.assertEqual(frameFingerprint(self.frame.copy()), self.fingerprint)
+        # Views (e.g. of a region in a larger capture) fingerprint like copies
+        larger = numpy.zeros((40, 60, 3), dtype=numpy.uint8)
+        self.assertEqual(frameFingerprint(larger[5:25, 10:40]), self.fingerprint)
+
+    def test_hit_miss(self):
+        self.assertEqual(self.cache.get(self.fingerprint, "a"), (False, None))
+        self.cache.put(self.fingerprint, "a", [1])
+        self.assertEqual(self.cache.get(self.fingerprint, "a"), (True, [1]))
+        self.assertEqual(self.cache.get(self.fingerprint, "b"), (False, None))
+        self.assertEqual((self.cache.getHits(), self.cache.getMisses()), (1, 2))
+        self.assertAlmostEqual(self.cache.getHitRate(), 1 / 3.0)
+        # A cached "not found" is a hit too
+        self.cache.put(self.fingerprint, "b", None)
+        self.assertEqual(self.cache.get(self.fingerprint, "b"), (True, None))
+
+    def test_eviction(self):
+        self.cache.put(self.fingerprint, "a", 1)
+        self.cache.put(self.fingerprint, "b", 2)
+        self.cache.get(self.fingerprint, "a") # Now "b" is the least recently used
+        self.cache.put(self.fingerprint, "c", 3)
+        self.assertEqual(self.cache.getSize(), 2)
+        self.assertFalse(self.cache.get(self.fingerprint, "b")[0])
+        self.assertTrue(self.cache.get(self.fingerprint, "a")[0])
+        self.cache.setMaxSize(0)
+        self.assertEqual(self.cache.getSize(), 0)
+        self.cache.put(self.fingerprint, "a", 1)
+        self.assertEqual(self.cache.get(self.fingerprint, "a"), (False, None))
+
+    def test_replaced_pattern_image(self):
+        frame = numpy.random.RandomState(0).randint(0, 256, (120, 160, 3)).astype(numpy.uint8)
+        region = lackey.Region(0, 0, 160, 120)
+        pattern = lackey.Pattern(os.path.join("tests", "test_pattern.png"))
+        self.assertIsNone(region._matchPattern(frame, pattern))
+        # Same frame, same pattern object, new image: searched again, not the cached miss
+        pattern.setImage(frame[40:70, 50:90].copy())
+        self.assertIsNone(pattern.getFilename())
+        self.assertEqual(region._matchPattern(frame, pattern)[0], (50, 40, 40, 30))
+
+class TestChangeDetector(unittest.TestCase):
+    def setUp(self):
+        from lackey.ChangeDetection import ChangeDetector
+        self.detector = ChangeDetector(tile_size=16)
+        self.frame = numpy.zeros((50, 70, 3), dtype=numpy.uint8)
+
+    def test_update(self):
+        self.assertIsNone(self.detector.update(self.frame)) # Everything is new
+        self.assertEqual(self.detector.update(self.frame.copy()), [])
+        changed = self.frame.copy()
+        changed[20, 40] = 255
+        self.assertEqual(self.detector.update(changed), [(32, 16, 16, 16)])
+        # Tiles at the edges are clipped to the bitmap
+        changed = changed.copy()
+        changed[49, 69] = 255
+        self.assertEqual(self.detector.update(changed), [(64, 48, 6, 2)])
+        self.assertIsNone(self.detector.update(numpy.zeros((10, 10, 3), dtype=numpy.uint8)))
+        self.detector.reset()
+        self.assertIsNone(self.detector.update(self.frame))
+
+    def test_tile_mask(self):
+        from lackey.ChangeDetection import tileChangeMask, maskToRects
+        changed = self.frame.copy()
+        changed[0, 0, 2] = 1 # One channel of one pixel
+        changed[40:45, 5:40] = 7
+        mask = tileChangeMask(self.frame, changed, 16)
+        self.assertEqual(mask.shape, (4, 5))
+        self.assertEqual(mask.sum(), 4)
+        self.assertEqual(sorted(maskToRects(mask, 16, changed.shape)), [(0, 0, 16, 16), (0, 32, 48, 16)])
+
+class TestFindChanges(unittest.TestCase):
+    def test_changes(self):
+        from lackey.ChangeDetection import findChanges
+        previous = numpy.zeros((24, 40, 3), dtype=numpy.uint8)
+        current = previous.copy()
+        # An L of 8x8 tiles (one changed pixel in each), and a separate block of 5
+        # changed pixels inside the L's bounding rectangle
+        for row, col in [(0, 0), (1, 0), (2, 0), (2, 1), (2, 2), (2, 3), (2, 4)]:
+            current[row * 8 + 3, col * 8 + 3] = 200
+        current[2, 16:21, 1] = 9
+        changes = sorted(findChanges(previous, current, 8))
+        self.assertEqual(changes, [((0, 0, 40, 24), 7), ((16, 0, 8, 8), 5)])
+        self.assertEqual(findChanges(previous, previous.copy(), 8), [])
+
+    def test_grayscale(self):
+        from lackey.ChangeDetection import findChanges
+        previous = numpy.zeros((30, 30), dtype=numpy.uint8)
+        current = previous.copy()
+        current[25:30, 25:30] = 1
+        self.assertEqual(findChanges(previous, current, 16), [((16, 16, 14, 14), 25)])
+
+class TestChangedRegions(SettingsTestCase):
+    def setUp(self):
+        self.setSettings(ChangeTileSize=16)
+        self.region = lackey.Region(100, 50, 64, 48)
+        self.before = numpy.zeros((48, 64, 3), dtype=numpy.uint8)
+
+    def test_changed_regions(self):
+        from lackey.RegionMatching import ChangedRegion
+        after = self.before.copy()
+        after[5:8, 5:9] = 255 # 12 pixels
+        after[40, 60, 2] = 1 # One channel of one pixel
+        changes = sorted(self.region.getChangedRegions(self.before, after), key=lambda change: change.getTuple())
+        self.assertTrue(all(isinstance(change, ChangedRegion) for change in changes))
+        # Tiles of the screen, with the number of pixels that changed in each
+        self.assertEqual(
+            [(change.getTuple(), change.getChangedPixels()) for change in changes],
+            [((100, 50, 16, 16), 12), ((148, 82, 16, 16), 1)])
+        self.assertEqual(self.region.getChangedRegions(self.before, self.before.copy()), [])
+        # A capture of a different size: the whole region changed
+        resized = self.region.getChangedRegions(self.before, numpy.zeros((10, 10, 3), dtype=numpy.uint8))
+        self.assertEqual([(change.getTuple(), change.getChangedPixels()) for change in resized], [((100, 50, 64, 48), 64 * 48)])
+
+    def test_is_changed(self):
+        after = self.before.copy()
+        after[0:2, 0:5] = 255
+        # 10 pixels changed (30 channel values): the threshold counts pixels
+        self.assertTrue(self.region.isChanged(10, self.before, after))
+        self.assertFalse(self.region.isChanged(11, self.before, after))
+        self.assertFalse(self.region.isChanged(1, self.before, self.before.copy()))
+
+class TestCaptureSharing(unittest.TestCase):
+    def setUp(self):
+        self.screen = numpy.arange(100 * 200 * 3, dtype=numpy.uint32).astype(numpy.uint8).reshape(100, 200, 3)
+        self.grabs = []
+
+    def grab(self, x, y, w, h):
+        self.grabs.append((x, y, w, h))
+        return self.screen[y:y+h, x:x+w].copy()
+
+    def test_merge_rects(self):
+        from lackey.Capture import mergeRects
+        groups = mergeRects([(0, 0, 50, 50), (40, 0, 50, 50), (150, 80, 10, 10), (0, 0, 50, 50)])
+        self.assertEqual(sorted(groups), [((0, 0, 90, 50), [0, 3, 1]), ((150, 80, 10, 10), [2])])
+        # Far apart: capturing the area between them would waste too much
+        self.assertEqual(len(mergeRects([(0, 0, 10, 10), (100, 50, 10, 10)])), 2)
+        self.assertEqual(len(mergeRects([(0, 0, 10, 10), (100, 50, 10, 10)], max_waste=100)), 1)
+
+    def test_capture_rects(self):
+        from lackey.Capture import captureRects
+        rects = [(10, 10, 30, 20), (20, 15, 30, 20), (150, 80, 10, 10)]
+        bitmaps = captureRects(self.grab, rects)
+        self.assertEqual(len(self.grabs), 2)
+        for (x, y, w, h), bitmap in zip(rects, bitmaps):
+            self.assertTrue(numpy.array_equal(bitmap, self.screen[y:y+h, x:x+w]))
+
+    def test_async_broker(self):
+        from lackey.Capture import AsyncFrameBroker
+        loop = asyncio.new_event_loop()
+        try:
+            broker = AsyncFrameBroker(self.grab, loop)
+            async def capture_all():
+                # Requests made on the same tick share one capture
+                return await asyncio.gather(broker.capture((0, 0, 40, 40)), broker.capture((10, 10, 40, 40)))
+            first, second = loop.run_until_complete(capture_all())
+            self.assertTrue(numpy.array_equal(first, self.screen[0:40, 0:40]))
+            self.assertTrue(numpy.array_equal(second, self.screen[10:50, 10:50]))
+            self.assertEqual(broker.getCaptureCount(), 1)
+            self.assertEqual(broker.getRequestCount(), 2)
+            loop.run_until_complete(broker.capture((0, 0, 40, 40)))
+            self.assertEqual(broker.getCaptureCount(), 2)
+        finally:
+            loop.close()
+
+@unittest.skipUnless(lackey.SharedFrames.isAvailable(), "multiprocessing.shared_memory needs Python 3.8")
+class TestSharedFrames(unittest.TestCase):
+    def setUp(self):
+        from lackey.SharedFrames import FramePublisher, FrameSubscriber
+        self.publisher = FramePublisher(40 * 30 * 3, slots=2)
+        self.subscriber = FrameSubscriber(self.publisher.getName())
+
+    def tearDown(self):
+        self.subscriber.close()
+        self.publisher.close()
+
+    def test_publish(self):
+        self.assertIsNone(self.subscriber.latest())
+        frame = numpy.arange(30 * 40 * 3, dtype=numpy.uint32).astype(numpy.uint8).reshape(30, 40, 3)
+        seq = self.publisher.publish(frame, (100, 50, 40, 30))
+        latest = self.subscriber.latest()
+        self.assertEqual((latest.seq, latest.rect), (seq, (100, 50, 40, 30)))
+        self.assertTrue(numpy.array_equal(latest.bitmap, frame))
+        self.assertTrue(numpy.array_equal(latest.crop((110, 60, 5, 5)), frame[10:15, 10:15]))
+        self.assertIsNone(latest.crop((90, 60, 5, 5))) # Not all in the frame
+        # The slot is reused after a full round of the other slots
+        self.publisher.publish(frame, (100, 50, 40, 30))
+        self.assertTrue(self.subscriber.isCurrent(seq))
+        self.publisher.publish(frame, (100, 50, 40, 30))
+        self.assertFalse(self.subscriber.isCurrent(seq))
+        with self.assertRaises(ValueError):
+            self.publisher.publish(numpy.zeros((100, 100, 3), dtype=numpy.uint8), (0, 0, 100, 100))
+
+class FakeClock(object):
+    """ Stands in for ``time.monotonic``/``time.sleep`` so wait loops run instantly """
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    def clock(self):
+        return self.now
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+    def probe(self, results, cost):
+        """ Returns a probe that takes ``cost`` seconds and returns ``results`` in order """
+        results = list(results)
+        def probe():
+            self.now += cost
+            return results.pop(0) if len(results) > 1 else results[0]
+        return probe
+
+class TestWaitEngine(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.engine = lackey.WaitEngine.WaitEngine(self.clock.clock, self.clock.sleep)
+
+    def test_returns_immediately_on_hit(self):
+        result = self.engine.run(self.clock.probe(["match"], 0.1), 3, 3)
+        self.assertEqual(result, "match")
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertAlmostEqual(self.clock.now, 0.1)
+
+    def test_subtracts_probe_time_from_interval(self):
+        result = self.engine.run(self.clock.probe([None, None, "match"], 0.1), 3, 2)
+        self.assertEqual(result, "match")
+        # Probes start every 0.5s, so each sleep is the 0.4s left after the probe
+        self.assertEqual(len(self.clock.sleeps), 2)
+        for seconds in self.clock.sleeps:
+            self.assertAlmostEqual(seconds, 0.4)
+        self.assertAlmostEqual(self.clock.now, 1.1)
+
+    def test_honors_deadline(self):
+        result = self.engine.run(self.clock.probe([None], 0.1), 1, 3)
+        self.assertIsNone(result)
+        # Never sleeps past the deadline, and checks one last time at the deadline
+        self.assertAlmostEqual(self.clock.now, 1.1)
+        self.assertLessEqual(self.clock.now - 0.1, 1.0 + 1e-9)
+
+    def test_zero_timeout_checks_once(self):
+        probe = self.clock.probe([None], 0.1)
+        self.assertIsNone(self.engine.run(probe, 0, 3))
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_custom_condition(self):
+        # waitVanish-style: keep going while the probe still finds something
+        result = self.engine.run(self.clock.probe(["match", "match", None], 0), 5, 10, until=lambda m: not m)
+        self.assertIsNone(result)
+        self.assertAlmostEqual(self.clock.now, 0.2)
+
+    def test_run_async(self):
+        loop = asyncio.new_event_loop()
+        try:
+            starts = []
+            async def probe(results):
+                starts.append(loop.time())
+                return results.pop(0) if len(results) > 1 else results[0]
+            engine = lackey.WaitEngine.WaitEngine()
+            hit = loop.run_until_complete(engine.runAsync(functools.partial(probe, ["match"]), 1, 10))
+            self.assertEqual((hit, len(starts)), ("match", 1))
+            del starts[:]
+            started = loop.time()
+            self.assertIsNone(loop.run_until_complete(engine.runAsync(functools.partial(probe, [None]), 0.3, 10)))
+            # One probe per tick of the 0.1s grid, and a last one at the deadline
+            self.assertGreaterEqual(starts[-1] - started, 0.28)
+            self.assertIn(len(starts), (4, 5))
+            for start in starts[1:-1]:
+                self.assertLess(min(start % 0.1, 0.1 - start % 0.1), 0.04)
+        finally:
+            loop.close()
+
+class TestAsyncWaits(unittest.TestCase):
+    """ Async waits on a fake screen, captured through the event loop's frame broker """
+    def setUp(self):
+        import cv2
+        from lackey.Capture import AsyncFrameBroker
+        from lackey.RegionMatching import _frameBrokers
+        self.needle = cv2.imread(os.path.join("tests", "test_pattern.png"))
+        self.pattern = lackey.Pattern(os.path.join("tests", "test_pattern.png"))
+        self.screen = numpy.full((120, 160, 3), 255, dtype=numpy.uint8)
+        self.region = lackey.Region(0, 0, 160, 120)
+        self.region.setWaitScanRate(10)
+        self.loop = asyncio.new_event_loop()
+        self.broker = _frameBrokers[self.loop] = AsyncFrameBroker(self.grab, self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def grab(self, x, y, w, h):
+        return self.screen[y:y+h, x:x+w].copy()
+
+    def show(self, shown=True):
+        """ Puts the needle on the fake screen (or takes it off) """
+        self.screen[:] = 255
+        if shown:
+            self.screen[30:30+self.needle.shape[0], 40:40+self.needle.shape[1]] = self.needle
+
+    def complete(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_exists(self):
+        self.show()
+        match = self.complete(self.region.exists_async(self.pattern, 1))
+        self.assertEqual(match.getTuple()[:2], (40, 30))
+        self.assertEqual(self.broker.getCaptureCount(), 1)
+
+    def test_timeout(self):
+        started = self.loop.time()
+        self.assertIsNone(self.complete(self.region.exists_async(self.pattern, 0.3)))
+        self.assertGreaterEqual(self.loop.time() - started, 0.28)
+        self.assertIn(self.broker.getCaptureCount(), (4, 5))
+        with self.assertRaises(lackey.FindFailed):
+            self.complete(self.region.wait_async(self.pattern, 0.1))
+
+    def test_wait(self):
+        self.loop.call_later(0.25, self.show)
+        match = self.complete(self.region.wait_async(self.pattern, 2))
+        self.assertEqual(match.getTuple()[:2], (40, 30))
+        self.assertGreater(self.broker.getCaptureCount(), 1)
+
+    def test_vanish(self):
+        self.show()
+        self.assertFalse(self.complete(self.region.waitVanish_async(self.pattern, 0.2)))
+        self.loop.call_later(0.2, self.show, False)
+        self.assertTrue(self.complete(self.region.waitVanish_async(self.pattern, 2)))
+
+    def test_gather_shares_captures(self):
+        regions = [lackey.Region(0, 0, 160, 120), lackey.Region(20, 10, 120, 100), lackey.Region(0, 0, 160, 120)]
+        for region in regions:
+            region.setWaitScanRate(10)
+        self.loop.call_later(0.25, self.show)
+        async def wait_all():
+            return await asyncio.gather(*(region.wait_async(self.pattern, 2) for region in regions))
+        matches = self.complete(wait_all())
+        self.assertEqual([match.getTuple()[:2] for match in matches], [(40, 30)] * 3)
+        # The waits wake up on the same ticks, and each tick is one capture for all three
+        self.assertGreater(self.broker.getCaptureCount(), 1)
+        self.assertEqual(self.broker.getRequestCount(), 3 * self.broker.getCaptureCount())
+
+    def test_observe(self):
+        self.region.setObserveScanRate(10)
+        appear = self.region.onAppear(self.pattern)
+        self.loop.call_later(0.2, self.show)
+        async def collect(seconds):
+            events = []
+            async for event in self.region.observe_async(seconds):
+                events.append(event)
+                self.region.stopObserver()
+            return events
+        events = self.complete(collect(2))
+        self.assertEqual([event.getName() for event in events], [appear])
+        self.assertFalse(self.region.isObserving())
+        # Nothing else happens before the time is up
+        self.assertEqual(self.complete(collect(0.2)), [])
+
+class FakeObservedRegion(object):
+    """ Stands in for an observed Region: records the bitmaps its events are checked on """
+    def __init__(self, rect, scan_rate=4, priority=0):
+        self.rect = rect
+        self.scan_rate = scan_rate
+        self.priority = priority
+        self.checked = []
+        self._observer = self
+        self.isStopped = False
+        self.isRunning = True
+    def getObserveScanRate(self):
+        return self.scan_rate
+    def getObservePriority(self):
+        return self.priority
+    def clipRegionToScreen(self):
+        return lackey.Region(*self.rect)
+    def check_events(self, bitmap, dispatch=None):
+        self.checked.append(bitmap.shape)
+
+class TestObserverChecks(SettingsTestCase):
+    def setUp(self):
+        import cv2
+        self.pattern = lackey.Pattern(os.path.join("tests", "test_pattern.png"))
+        self.bitmap = numpy.full((100, 120, 3), 255, dtype=numpy.uint8)
+        needle = cv2.imread(os.path.join("tests", "test_pattern.png"))
+        self.bitmap[30:30+needle.shape[0], 40:40+needle.shape[1]] = needle
+        self.region = lackey.Region(200, 100, 120, 100)
+        self.handled = []
+
+    def check(self):
+        appear = self.region.onAppear(self.pattern, self.handled.append)
+        vanish = self.region.onVanish(self.pattern, self.handled.append)
+        # Both events are checked against the one bitmap
+        fired = self.region._observer.check_events(self.bitmap)
+        self.assertEqual([event.getName() for event in fired], [appear])
+        self.assertEqual(fired[0].getMatch().getTarget().getTuple(), (200 + 40 + 23, 100 + 30 + 19))
+        self.assertEqual(self.handled, fired)
+        # Caught events are inactive until they're collected
+        self.assertEqual(self.region._observer.check_events(self.bitmap), [])
+        self.region.getEvents()
+        blank = numpy.full_like(self.bitmap, 255)
+        self.assertEqual([event.getName() for event in self.region._observer.check_events(blank)], [vanish])
+
+    def test_check_events(self):
+        self.check()
+
+    def test_parallel_check_events(self):
+        self.setSettings(ObserveWorkers=2)
+        self.check()
+
+class TestObserverHandlers(unittest.TestCase):
+    def test_dispatch(self):
+        from lackey.RegionMatching import _dispatchHandler
+        region = lackey.Region(0, 0, 50, 50)
+        called = threading.Event()
+        threads = []
+        def failing_handler(event):
+            raise RuntimeError("handler failed")
+        def handler(event):
+            threads.append(threading.current_thread())
+            called.set()
+        region.onVanish(lackey.Pattern(os.path.join("tests", "test_pattern.png")), failing_handler)
+        region.onVanish(lackey.Pattern(os.path.join("tests", "test_pattern.png")), handler)
+        # Handlers run on the handler pool; a failing one doesn't stop the others
+        blank = numpy.full((50, 50, 3), 255, dtype=numpy.uint8)
+        fired = region._observer.check_events(blank, dispatch=_dispatchHandler)
+        self.assertEqual(len(fired), 2)
+        self.assertTrue(called.wait(5))
+        self.assertIsNot(threads[0], threading.current_thread())
+        # Events without a handler are queued for getEvents()
+        region.onVanish(lackey.Pattern(os.path.join("tests", "test_pattern.png")))
+        region._observer.check_events(blank, dispatch=_dispatchHandler)
+        self.assertTrue(region.hasEvents())
+        self.assertEqual([event.isVanish() for event in region.getEvents()], [True])
+        self.assertFalse(region.hasEvents())
+
+class TestObserverScheduler(unittest.TestCase):
+    def setUp(self):
+        from lackey.ObserverScheduler import ObserverScheduler, _Entry
+        self.grabs = []
+        self.scheduler = ObserverScheduler(self.grab)
+        self.regions = [
+            FakeObservedRegion((0, 0, 20, 20)),
+            FakeObservedRegion((10, 10, 20, 20), priority=5),
+            FakeObservedRegion((0, 0, 20, 20), scan_rate=1)]
+        for region in self.regions:
+            self.scheduler._entries[id(region)] = _Entry(region, None)
+
+    def grab(self, x, y, w, h):
+        self.grabs.append((x, y, w, h))
+        return numpy.zeros((h, w, 3), dtype=numpy.uint8)
+
+    def test_due(self):
+        due = self.scheduler._collectDue(10.1)
+        # Higher priority first
+        self.assertEqual([entry.region for entry in due][0], self.regions[1])
+        self.assertEqual(len(due), 3)
+        # Due times are aligned to the scan interval, so regions with the same scan rate
+        # come due together
+        self.assertAlmostEqual(due[0].next_due, 10.25)
+        self.assertAlmostEqual(due[1].next_due, 10.25)
+        self.assertAlmostEqual(due[2].next_due, 11.0)
+        self.assertEqual(self.scheduler._collectDue(10.2), [])
+        self.assertEqual(len(self.scheduler._collectDue(10.3)), 2)
+
+    def test_deadline(self):
+        entry = self.scheduler._entries[id(self.regions[0])]
+        entry.deadline = 10.1
+        self.scheduler._collectDue(10.0)
+        # Checked one last time at the deadline, then dropped
+        self.assertAlmostEqual(entry.next_due, 10.1)
+        self.assertEqual(self.scheduler._collectDue(10.1), [])
+        self.assertFalse(self.scheduler.isRegistered(self.regions[0]))
+        self.assertFalse(self.regions[0].isRunning)
+        self.regions[1].isStopped = True
+        self.scheduler._collectDue(10.5)
+        self.assertFalse(self.scheduler.isRegistered(self.regions[1]))
+        self.assertTrue(self.scheduler.isRegistered(self.regions[2]))
+
+    def test_shared_capture(self):
+        self.scheduler._tick(self.scheduler._collectDue(10.0))
+        self.assertEqual(self.grabs, [(0, 0, 30, 30)])
+        self.assertEqual([region.checked for region in self.regions], [[(20, 20, 3)]] * 3)
+        self.assertEqual(self.scheduler.getCaptureCount(), 1)
+        self.assertEqual(self.scheduler.getTickCount(), 1)
+
 class TestObserverEventMethods(unittest.TestCase):
     def setUp(self):
         self.r = lackey.Screen(0)
@@ -277,5 +965,386 @@ class TestObserverEventMethods(unittest.TestCase):
         with self.assertRaises(TypeError) as context:
             self.generic_event.getChanges()
 
+class TestOcrResult(unittest.TestCase):
+    def setUp(self):
+        from lackey.Ocr import OcrResult
+        self.result = OcrResult(ocr_tsv([
+            (1, 1, 10, 10, 50, 20, 96, "Save"),
+            (1, 1, 70, 10, 40, 20, 91, "file"),
+            (1, 2, 10, 40, 60, 20, 88, "Cancel"),
+            (2, 1, 10, 100, 30, 20, 93, "OK"),
+        ]))
+
+    def test_parsing(self):
+        words = self.result.getWords()
+        self.assertEqual([word.text for word in words], ["Save", "file", "Cancel", "OK"])
+        self.assertEqual((words[1].left, words[1].top, words[1].width, words[1].height), (70, 10, 40, 20))
+        self.assertEqual(words[2].conf, 88)
+        self.assertEqual(self.result.text(), "Save file\nCancel\n\nOK")
+
+    def test_find(self):
+        self.assertEqual(self.result.find_word("Can"), ((10, 40, 60, 20), 0.88))
+        self.assertIsNone(self.result.find_word("Open"))
+        bbox, confidence = self.result.find_line("^Save file$")
+        self.assertEqual(bbox, (10, 10, 100, 20))
+        self.assertAlmostEqual(confidence, 0.935, places=5)
+        self.assertEqual(self.result.find_line("file"), self.result.find_line("Save"))
+        # Matches cover the words they overlap, and don't span lines
+        self.assertEqual([bbox for bbox, _ in self.result.find_all("e")], [
+            (10, 10, 50, 20), (70, 10, 40, 20), (10, 40, 60, 20)])
+        self.assertEqual(self.result.find_all("ve fi")[0][0], (10, 10, 100, 20))
+        self.assertEqual(self.result.find_all("file\\sCancel"), [])
+        # Matches of only the space between words are skipped
+        self.assertEqual(self.result.find_all(r"\s"), [])
+
+class TestOcrConfidence(unittest.TestCase):
+    def setUp(self):
+        from lackey.Ocr import OcrResult
+        # A stray "|" read from a table border, with a low confidence
+        self.result = OcrResult(ocr_tsv([
+            (1, 1, 10, 10, 50, 20, 90, "Total"),
+            (1, 1, 65, 10, 5, 20, 20, "|"),
+            (1, 1, 75, 10, 20, 20, 80, "42"),
+            (1, 2, 10, 40, 50, 20, 30, "noise"),
+        ]))
+
+    def test_filtering(self):
+        # Low-confidence words break up a match, unless they're filtered out
+        self.assertEqual(self.result.find_all("Total 42"), [])
+        bbox, confidence = self.result.find_line("^Total 42$", confidence=0.6)
+        self.assertEqual(bbox, (10, 10, 85, 20))
+        self.assertAlmostEqual(confidence, 0.85) # Average of the words kept
+        self.assertIsNone(self.result.find_word(r"\|", confidence=0.6))
+        self.assertAlmostEqual(self.result.find_word(r"\|")[1], 0.2)
+        self.assertIsNone(self.result.find_word("noise", confidence=0.5))
+        self.assertEqual(self.result.text(confidence=0.6), "Total 42")
+        self.assertEqual(self.result.text(), "Total | 42\nnoise")
+        # Thresholds are inclusive
+        self.assertEqual(len(self.result.find_all("noise", confidence=0.3)), 1)
+
+class TestOcrProfile(unittest.TestCase):
+    def setUp(self):
+        # Light "text" on a dark background (e.g. a dark theme)
+        self.image = numpy.full((60, 100, 3), 30, dtype=numpy.uint8)
+        self.image[20:30, 30:70] = 220
+
+    def test_apply(self):
+        from lackey.OcrProfile import OcrProfile
+        processed, scale, offset, timings = OcrProfile(scale=3, crop_margin=2).apply(self.image)
+        self.assertEqual(scale, 3)
+        self.assertEqual(offset, (27, 17)) # Cropped to the edges, plus the margin
+        self.assertEqual(processed.shape, (16 * 3, 46 * 3))
+        self.assertEqual(set(numpy.unique(processed)) - {0, 255}, set())
+        self.assertEqual(processed[0, 0], 255) # Inverted: the background is now light
+        self.assertEqual(set(timings), {"grayscale", "invert", "crop", "scale", "threshold"})
+        # Turned-off stages are skipped
+        processed, scale, offset, timings = OcrProfile(grayscale=False, invert=False, crop=False, scale=1, threshold=None).apply(self.image)
+        self.assertIs(processed, self.image)
+        self.assertEqual((scale, offset, timings), (1, (0, 0), {}))
+
+    def test_settings(self):
+        from lackey.OcrProfile import OcrProfile
+        with self.assertRaises(ValueError):
+            OcrProfile(threshold="global")
+        with self.assertRaises(ValueError):
+            OcrProfile(scale=1.5)
+        self.assertEqual(OcrProfile().getKey(), OcrProfile().getKey())
+        self.assertNotEqual(OcrProfile().getKey(), OcrProfile(scale=3).getKey())
+
+    def test_mapping(self):
+        from lackey.Ocr import OcrResult
+        # Boxes in the processed image map back to the original, without shrinking
+        result = OcrResult(ocr_tsv([(1, 1, 10, 10, 21, 9, 90, "word")]), scale=2, offset=(30, 20))
+        word = result.getWords()[0]
+        self.assertEqual((word.left, word.top, word.width, word.height), (35, 25, 11, 5))
+        self.assertEqual(result.find_word("word")[0], (35, 25, 11, 5))
+
+class TestTextDetection(SettingsTestCase):
+    def test_find_text_regions(self):
+        import cv2
+        from lackey.TextDetection import findTextRegions
+        image = numpy.full((300, 500, 3), 255, dtype=numpy.uint8)
+        cv2.putText(image, "Hello world", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+        cv2.putText(image, "Second line", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+        cv2.rectangle(image, (300, 100), (480, 290), (40, 90, 200), -1) # Not text: too tall and sparse
+        boxes = findTextRegions(image)
+        # One box per line, in reading order
+        self.assertEqual(len(boxes), 2)
+        for (x, y, w, h), baseline in zip(boxes, (50, 120)):
+            self.assertLessEqual(x, 20)
+            self.assertGreater(x + w, 150)
+            self.assertTrue(y < baseline - 15 and baseline <= y + h)
+            self.assertLess(x + w, 300)
+
+    def test_merge_boxes(self):
+        from lackey.TextDetection import mergeBoxes
+        boxes = mergeBoxes([(30, 30, 5, 5), (0, 0, 10, 10), (5, 5, 10, 10), (50, -5, 10, 10)], (40, 55))
+        # Overlapping boxes are merged, and all are clipped
+        self.assertEqual(boxes, [(0, 0, 15, 15), (50, 0, 5, 5), (30, 30, 5, 5)])
+
+    def test_combine(self):
+        from lackey.Ocr import OcrResult
+        # A line split across two detected areas, and a second block further down
+        first = OcrResult(ocr_tsv([(1, 1, 0, 0, 40, 12, 90, "Hello"), (1, 1, 45, 0, 30, 12, 90, "big")]))
+        second = OcrResult(ocr_tsv([(1, 1, 0, 0, 40, 12, 90, "world")]))
+        third = OcrResult(ocr_tsv([(1, 1, 0, 0, 40, 12, 90, "Below")]))
+        combined = OcrResult.combine([second, first, third], [(90, 11), (0, 10), (0, 200)])
+        self.assertEqual(combined.text(), "Hello big world\n\nBelow")
+        self.assertEqual(combined.find_line("big world")[0], (0, 10, 130, 13))
+        self.assertEqual(combined.getWords()[3].top, 200)
+
+    def test_read_all_detected(self):
+        import cv2
+        from lackey import Ocr
+        self.useOcrBackend(FakeOcrBackend(lambda image: [(1, 1, 2, 2, 10, 10, 90, "text")]))
+        self.setSettings(OcrWorkers=2, OcrDetectionMinArea=1000000)
+        images = []
+        for shift in (0, 7):
+            image = numpy.full((1000, 1100, 3), 255, dtype=numpy.uint8)
+            for y in (100, 400, 700):
+                cv2.putText(image, "Line of text", (50 + shift, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+            images.append(image)
+        # Each image is read on the OCR pool, in detected areas: this used to wait
+        # forever for pool workers that were all busy reading the images
+        results = []
+        reader = threading.Thread(target=lambda: results.extend(Ocr.TextOCR.read_all(images)))
+        reader.daemon = True
+        reader.start()
+        reader.join(30)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(len(results), 2)
+        # Three lines (one block each) of words read from the detected areas
+        self.assertEqual([len(result.text().split("\n\n")) for result in results], [3, 3])
+
+    def test_full_frame_by_default(self):
+        import cv2
+        from lackey import Ocr
+        words = [(1, 1, 50, 75, 200, 30, 90, "Line"), (1, 1, 260, 75, 40, 30, 90, "of"), (2, 1, 50, 375, 200, 30, 90, "text")]
+        backend = self.useOcrBackend(FakeOcrBackend(lambda image: words))
+        image = numpy.full((1000, 1100, 3), 255, dtype=numpy.uint8)
+        for y in (100, 400):
+            cv2.putText(image, "Line of text", (50, y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        # Large captures are still read whole, as one image, unless detection is enabled
+        self.assertEqual(Ocr.TextOCR.read(image).text(), "Line of\n\ntext")
+        self.assertEqual([shape for shape, _, _ in backend.calls], [(1000, 1100)])
+
+    def test_nothing_detected(self):
+        from lackey import Ocr
+        backend = self.useOcrBackend(FakeOcrBackend())
+        self.setSettings(OcrDetectionMinArea=1000000)
+        # No text-like areas: the whole image is read rather than nothing
+        result = Ocr.TextOCR.read(numpy.full((1000, 1100, 3), 255, dtype=numpy.uint8))
+        self.assertEqual(result.text(), "42")
+        self.assertEqual([shape for shape, _, _ in backend.calls], [(1000, 1100)])
+
+class TestOcrBackends(SettingsTestCase):
+    def test_selection(self):
+        from lackey import Ocr
+        self.setSettings(OcrBackend="pytesseract")
+        self.assertIs(Ocr.getOcrBackend(), Ocr._backends["pytesseract"])
+        # Falls back to pytesseract when tesserocr isn't installed
+        self.setSettings(OcrBackend="tesserocr")
+        expected = "tesserocr" if Ocr.tesserocr is not None else "pytesseract"
+        self.assertEqual(Ocr.getOcrBackend().name, expected)
+        self.setSettings(OcrBackend="ocrad")
+        with self.assertRaises(ValueError):
+            Ocr.getOcrBackend()
+
+    def test_tesserocr_engines(self):
+        from lackey import Ocr
+        engines = []
+        class FakeEngine(object):
+            def __init__(self, path=None, lang=None):
+                self.key = (path, lang)
+                self.ended = False
+                engines.append(self)
+            def End(self):
+                self.ended = True
+        class FakeTesserocr(object):
+            PyTessBaseAPI = FakeEngine
+        self.addCleanup(setattr, Ocr, "tesserocr", Ocr.tesserocr)
+        Ocr.tesserocr = FakeTesserocr
+        self.setSettings(OcrDataPath=None, OcrLanguage="eng")
+        backend = Ocr.TesserocrBackend()
+        self.assertIs(backend._engine(), backend._engine())
+        self.setSettings(OcrLanguage="deu")
+        # A new engine for the new language; the old one is shut down
+        self.assertEqual(backend._engine().key, (None, "deu"))
+        self.assertEqual([(engine.key, engine.ended) for engine in engines], [((None, "eng"), True), ((None, "deu"), False)])
+
+    def test_pytesseract_config(self):
+        from lackey.Ocr import PytesseractBackend
+        self.setSettings(OcrDataPath=None)
+        self.assertEqual(PytesseractBackend()._config(7, "0123"), "--psm 7 -c tessedit_char_whitelist=0123")
+        self.setSettings(OcrDataPath="tessdata")
+        self.assertEqual(PytesseractBackend()._config(None, None), '--tessdata-dir "tessdata"')
+
+class TestOcrReads(SettingsTestCase):
+    def setUp(self):
+        self.backend = self.useOcrBackend(FakeOcrBackend())
+        self.image = numpy.full((40, 60, 3), 255, dtype=numpy.uint8)
+
+    def test_one_pass_per_frame(self):
+        from lackey.Ocr import TextOCR
+        self.assertEqual(TextOCR.read(self.image).text(), "42")
+        self.assertIsNotNone(TextOCR.find_word(self.image.copy(), "4"))
+        self.assertEqual(len(TextOCR.find_all_in_image(self.image, "2")), 1)
+        self.assertEqual(len(self.backend.calls), 1)
+        changed = self.image.copy()
+        changed[0, 0] = 0
+        TextOCR.read(changed)
+        self.assertEqual(len(self.backend.calls), 2)
+
+    def test_hints(self):
+        from lackey.Ocr import TextOCR, getHintSettings
+        self.assertEqual(getHintSettings(None), (None, None))
+        self.assertEqual(getHintSettings("line"), (7, None))
+        self.assertEqual(getHintSettings(("word", "digits")), (8, "0123456789.,-"))
+        with self.assertRaises(ValueError):
+            getHintSettings("paragraph")
+        TextOCR.read(self.image, hint=("line", "digits"))
+        self.assertEqual(self.backend.calls[-1], ((40, 60), 7, "0123456789.,-"))
+        # Results read with different hints are cached separately
+        TextOCR.read(self.image)
+        self.assertEqual(self.backend.calls[-1], ((40, 60), None, None))
+        self.assertEqual(len(self.backend.calls), 2)
+
+    def test_image_to_text(self):
+        from lackey.Ocr import TextOCR
+        # Tesseract's text, as is; the words read for searches are rebuilt into lines
+        self.assertEqual(TextOCR.image_to_text(self.image), "42\n\f")
+        self.assertEqual(TextOCR.read(self.image).text(), "42")
+        self.assertEqual(TextOCR.image_to_text(self.image.copy(), hint="line"), "42\n\f")
+        self.assertEqual(TextOCR.image_to_text(self.image.copy()), "42\n\f") # Cached
+        self.assertEqual(self.backend.string_calls, [((40, 60), None, None), ((40, 60), 7, None)])
+
+    def test_region_coordinates(self):
+        region = ScriptedRegion(100, 50, 60, 40).setFrames([self.image])
+        # Text matches are on the screen, like existsText() matches
+        self.assertEqual(region.findWord("42").getTuple(), (102, 52, 10, 10))
+        self.assertEqual(region.findLine("42").getTuple(), (102, 52, 10, 10))
+        self.assertEqual([match.getTuple() for match in region.findAllText("42")], [(102, 52, 10, 10)])
+        self.assertEqual(region.existsText("42").getTuple(), (102, 52, 10, 10))
+
+    def test_min_confidence(self):
+        self.useOcrBackend(FakeOcrBackend(lambda image: [(1, 1, 2, 2, 10, 10, 40, "faint")]))
+        self.setSettings(SwitchToText=True)
+        region = ScriptedRegion(0, 0, 60, 40).setFrames([self.image])
+        # Words aren't filtered by confidence unless asked (not by the pattern's similarity)
+        self.assertIsNotNone(region.existsText("faint", 0))
+        self.assertIsNotNone(region.exists(lackey.Pattern("faint").similar(0.9), 0))
+        self.assertIsNotNone(region.findWord("faint"))
+        self.setSettings(OcrMinConfidence=0.6)
+        self.assertIsNone(region.existsText("faint", 0))
+        self.assertIsNone(region.exists(lackey.Pattern("faint"), 0))
+        self.assertIsNone(region.findWord("faint"))
+
+class TestOcrCells(SettingsTestCase):
+    def test_cell_bitmaps(self):
+        region = lackey.Region(0, 0, 100, 50)
+        region.setRaster(2, 3)
+        bitmap = numpy.zeros((50, 100, 3), dtype=numpy.uint8)
+        cells = region._cellBitmaps(bitmap)
+        # Row by row, tiling the bitmap exactly
+        self.assertEqual([offset for offset, _ in cells], [(0, 0), (33, 0), (67, 0), (0, 25), (33, 25), (67, 25)])
+        self.assertEqual([cell.shape[1] for _, cell in cells[:3]], [33, 34, 33])
+        self.assertEqual(sum(cell.shape[0] * cell.shape[1] for _, cell in cells), 50 * 100)
+        self.assertEqual(region.getCell(1, 2).getTuple(), (66, 25, 33, 25))
+
+    def test_read_all(self):
+        from lackey import Ocr
+        def slow_shade(image):
+            time.sleep(0.01)
+            return [(1, 1, 0, 0, 5, 5, 90, str(int(image[0, 0, 0])))]
+        self.useOcrBackend(FakeOcrBackend(slow_shade))
+        self.setSettings(OcrWorkers=3)
+        images = [numpy.full((10, 10, 3), shade, dtype=numpy.uint8) for shade in range(8)]
+        # Read in parallel, returned in order
+        self.assertEqual([result.text() for result in Ocr.TextOCR.read_all(images)], [str(shade) for shade in range(8)])
+
+class TestIncrementalOcr(SettingsTestCase):
+    def setUp(self):
+        from lackey.Ocr import OcrResult
+        self.result = OcrResult(ocr_tsv([
+            (1, 1, 10, 10, 50, 20, 90, "Loading"),
+            (1, 1, 70, 10, 30, 20, 90, "10%"),
+            (1, 2, 10, 40, 60, 20, 90, "Cancel"),
+        ]))
+
+    def test_reread_areas(self):
+        # A change in a word re-reads its whole line
+        self.assertEqual(self.result.rereadAreas([(75, 15, 5, 5)], margin=2), [(10, 10, 90, 20)])
+        # A change away from any text is re-read on its own
+        self.assertEqual(self.result.rereadAreas([(200, 100, 10, 10)], margin=2), [(198, 98, 14, 14)])
+
+    def test_splice(self):
+        from lackey.Ocr import OcrResult
+        reread = OcrResult(ocr_tsv([(1, 1, 0, 0, 50, 20, 90, "Loading"), (1, 1, 60, 0, 30, 20, 95, "50%")]))
+        spliced = self.result.splice([(10, 10, 90, 20)], [reread], generation=1)
+        self.assertEqual([word.text for word in spliced.getWords()], ["Loading", "50%", "Cancel"])
+        self.assertEqual(spliced.find_line("^Loading 50%$")[0], (10, 10, 90, 20))
+        self.assertEqual(spliced.find_word("50%"), ((70, 10, 30, 20), 0.95))
+        self.assertEqual(self.result.text(), "Loading 10%\nCancel") # Unchanged
+
+    def test_read(self):
+        import cv2
+        from lackey import Ocr
+        backend = self.useOcrBackend(FakeOcrBackend(lambda image: [(1, 1, 2, 2, 10, 10, 90, "word{}".format(len(backend.calls)))]))
+        self.setSettings(ChangeGatedWaits=True)
+        shapes = lambda: [shape for shape, _, _ in backend.calls]
+        bitmap = numpy.full((200, 300, 3), 255, dtype=numpy.uint8)
+        reader = Ocr.IncrementalOcr()
+        first = reader.read(bitmap)
+        self.assertEqual(shapes(), [(200, 300)])
+        self.assertIs(reader.read(bitmap.copy()), first) # Nothing changed
+        changed = bitmap.copy()
+        changed[150:160, 200:220] = 0
+        result = reader.read(changed)
+        # Only the changed area was read again
+        self.assertEqual(len(shapes()), 2)
+        self.assertLess(shapes()[1][0] * shapes()[1][1], 200 * 300 / 4)
+        self.assertEqual(result.text(), "word1\n\nword2")
+        changed = numpy.zeros_like(bitmap) # Mostly changed: read in full
+        reader.read(changed)
+        self.assertEqual(shapes()[2], (200, 300))
+
+class ScriptedRegion(lackey.Region):
+    """ A region whose captures are taken from a list of bitmaps (the last one repeats) """
+    def setFrames(self, frames):
+        self.frames = list(frames)
+        return self
+    def clipRegionToScreen(self):
+        return self
+    def getBitmap(self):
+        return self.frames.pop(0) if len(self.frames) > 1 else self.frames[0]
+
+class TestTextChanges(SettingsTestCase):
+    def setUp(self):
+        self.useOcrBackend(FakeOcrBackend(lambda image: [(1, 1, 0, 0, 5, 5, 90, "shade{}".format(int(image[0, 0, 0])))]))
+
+    def test_changes(self):
+        frames = [numpy.full((20, 30, 3), shade, dtype=numpy.uint8) for shade in (10, 10, 10, 20, 20, 30)]
+        region = ScriptedRegion(0, 0, 30, 20).setFrames(frames)
+        changes = region.textChanges(interval=0.01)
+        first = next(changes)
+        self.assertEqual((first.getText(), first.getPreviousText()), ("shade10", None))
+        # Unchanged captures aren't reported
+        second = next(changes)
+        self.assertEqual((second.getText(), second.getPreviousText()), ("shade20", "shade10"))
+        self.assertEqual(next(changes).getText(), "shade30")
+        changes.close()
+
+    def test_backlog(self):
+        frames = [numpy.full((20, 30, 3), shade, dtype=numpy.uint8) for shade in range(1, 6)]
+        region = ScriptedRegion(0, 0, 30, 20).setFrames(frames)
+        changes = region.textChanges(interval=0.05, backlog=1)
+        self.assertEqual(next(changes).getText(), "shade1") # Starts the producer
+        time.sleep(1) # Let it get ahead
+        update = next(changes)
+        # Only the latest update was kept
+        self.assertEqual(update.getText(), "shade5")
+        self.assertEqual(update.getDropped(), 3)
+        changes.close()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,46 @@
+""" Times change detection (as used by onChange() observers) on 4K frames.
+
+Compares the tiled detector in lackey.ChangeDetection with the previous full-frame
+numpy diff, for a static screen, a small change (a blinking caret), a few scattered
+changes, and a change to the whole screen.
+"""
+import time
+import numpy
+
+from lackey.ChangeDetection import findChanges
+
+WIDTH, HEIGHT = 3840, 2160
+TILE_SIZE = 32
+REPEATS = 20
+
+def full_frame_diff(previous, current):
+    """ The previous implementation of Region.isChanged() """
+    return numpy.count_nonzero(numpy.subtract(current, previous))
+
+def time_ms(function, *args):
+    function(*args)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        function(*args)
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+def main():
+    base = numpy.random.randint(0, 255, (HEIGHT, WIDTH, 3), dtype=numpy.uint8)
+    caret = base.copy()
+    caret[1000:1020, 1500:1502] ^= 255
+    scattered = base.copy()
+    for y, x in ((10, 10), (700, 3000), (1500, 200), (2100, 3800)):
+        scattered[y:y+40, x:x+30] ^= 255
+    full = numpy.random.randint(0, 255, base.shape, dtype=numpy.uint8)
+
+    print("{:<12}{:>16}{:>16}{:>10}".format("scenario", "full diff (ms)", "tiled (ms)", "regions"))
+    for name, frame in (("static", base), ("caret", caret), ("scattered", scattered), ("full", full)):
+        changes = findChanges(base, frame, TILE_SIZE)
+        print("{:<12}{:>16.2f}{:>16.2f}{:>10}".format(
+            name,
+            time_ms(full_frame_diff, base, frame),
+            time_ms(findChanges, base, frame, TILE_SIZE),
+            len(changes)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+""" Times OCR of a 10x10 table, cell by cell vs. in parallel (Region.textCells()).
+
+Needs Tesseract. Renders a table of numbers, then reads every cell:
+* sequentially, one OCR call per cell (like calling text() on each getCell()), and
+* with OCR.read_all(), which OCRs the cells in parallel on Settings.OcrWorkers threads.
+The OCR cache is disabled so both runs do the full work.
+"""
+import time
+import numpy
+import cv2
+
+from lackey.Ocr import TextOCR, getOcrBackend
+from lackey.SettingsDebug import Settings
+
+ROWS, COLUMNS = 10, 10
+CELL_W, CELL_H = 160, 48
+
+def render_table():
+    table = numpy.full((ROWS * CELL_H, COLUMNS * CELL_W, 3), 255, dtype=numpy.uint8)
+    for row in range(ROWS):
+        for column in range(COLUMNS):
+            cv2.putText(
+                table,
+                "R{}C{}".format(row, column),
+                (column * CELL_W + 20, row * CELL_H + 32),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.8,
+                (0, 0, 0),
+                2)
+    return table
+
+def cells(table):
+    return [
+        table[row*CELL_H:(row+1)*CELL_H, column*CELL_W:(column+1)*CELL_W]
+        for row in range(ROWS)
+        for column in range(COLUMNS)]
+
+def main():
+    Settings.OcrCacheSize = 0
+    images = cells(render_table())
+    for backend in ("pytesseract", "tesserocr"):
+        Settings.OcrBackend = backend
+        start = time.perf_counter()
+        sequential = [TextOCR.read(image).text() for image in images]
+        sequential_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = [result.text() for result in TextOCR.read_all(images)]
+        parallel_time = time.perf_counter() - start
+        assert sequential == parallel
+        print("{:<12} sequential {:7.2f} s   parallel {:7.2f} s   speedup {:4.1f}x".format(
+            getOcrBackend().name, sequential_time, parallel_time, sequential_time / parallel_time))
+
+if __name__ == "__main__":
+    main()